@@ -37,8 +37,11 @@ setup(
     python_requires=">=3.8",
     install_requires=[
         "openai>=1.0.0",
-        "fire>=0.5.0",
     ],
+    extras_require={
+        # numpy 运镜引擎（motion_engine=numpy）
+        "numpy": ["numpy"],
+    },
     entry_points={
         "console_scripts": [
             "txt_images_to_ai_video=txt_images_to_ai_video.cli:main",
@@ -0,0 +1,82 @@
+"""
+测试共用的工具：构造最小的 MP4 文件（只包含 media 模块解析的 box）
+"""
+
+import struct
+
+import pytest
+
+
+# High profile、level 4.0 的 avcC（不含 SPS/PPS 内容，只用于解析 profile 和计算参数集哈希）
+DEFAULT_AVCC = bytes([1, 100, 0, 40, 0xff, 0xe1])
+
+
+def box(kind, payload):
+    return struct.pack('>I', 8 + len(payload)) + kind + payload
+
+
+def full_box(kind, version, payload):
+    return box(kind, bytes([version, 0, 0, 0]) + payload)
+
+
+def table(kind, fmt, rows, version=0):
+    return full_box(kind, version, struct.pack('>I', len(rows)) + b''.join(struct.pack(fmt, *row) for row in rows))
+
+
+def build_mp4(seconds=10.0, fps=30, timescale=15360, gop=60, ctts=None, elst=None, audio=True,
+              avcc=DEFAULT_AVCC, first_sample=b'', size=(1920, 1080)):
+    """
+    构造 MP4：ftyp + mdat（以 first_sample 开头）+ moov（视频轨道，可选 AAC 音频轨道）
+    
+    Args:
+        seconds: 时长（秒）
+        fps / timescale: 视频帧率和时间刻度
+        gop: 关键帧间隔（帧）
+        ctts: ctts 表 [(样本数, 显示偏移)]（可选）
+        elst: 编辑列表第一段的媒体起点（可选，-1 表示空白段）
+        audio: 是否包含音频轨道
+        avcc: avcC box 的内容
+        first_sample: 第一个视频样本的内容（例如 x264 的版本信息 SEI）
+        size: 画面尺寸 (宽, 高)
+    """
+    frames = int(seconds * fps)
+    delta = timescale // fps
+    mdat = box(b'mdat', first_sample + bytes(100))
+    first_offset = len(box(b'ftyp', b'isom' + bytes(4))) + 8
+    
+    def trak(handler, entry, media_timescale, tables, edts=b''):
+        tkhd = full_box(b'tkhd', 0, bytes(80))
+        mdhd = full_box(b'mdhd', 0, struct.pack('>IIII', 0, 0, media_timescale, 0) + bytes(4))
+        hdlr = full_box(b'hdlr', 0, bytes(4) + handler + bytes(12) + b'\0')
+        stsd = full_box(b'stsd', 0, struct.pack('>I', 1) + entry)
+        return box(b'trak', tkhd + edts + box(b'mdia', mdhd + hdlr + box(b'minf', box(b'stbl', stsd + tables))))
+    
+    width, height = size
+    video_entry = box(b'avc1', bytes(6) + struct.pack('>H', 1) + bytes(16) + struct.pack('>HH', width, height)
+                      + bytes(50) + box(b'avcC', avcc))
+    tables = table(b'stts', '>II', [(frames, delta)])
+    tables += table(b'stss', '>I', [(n,) for n in range(1, frames + 1, gop)])
+    if ctts:
+        tables += table(b'ctts', '>II', ctts)
+    tables += full_box(b'stsz', 0, struct.pack('>II', 0, frames)
+                       + struct.pack('>I', len(first_sample) or 1) + struct.pack('>I', 1) * (frames - 1))
+    tables += table(b'stco', '>I', [(first_offset,)])
+    edts = box(b'edts', table(b'elst', '>IiI', [(int(seconds * 1000), elst, 1 << 16)])) if elst is not None else b''
+    traks = trak(b'vide', video_entry, timescale, tables, edts)
+    if audio:
+        esds = full_box(b'esds', 0, bytes([3, 25, 0, 1, 0, 4, 17, 0x40, 0x15]) + bytes(20))
+        audio_entry = box(b'mp4a', bytes(6) + struct.pack('>H', 1) + bytes(8)
+                          + struct.pack('>HHHHI', 2, 16, 0, 0, 44100 << 16) + esds)
+        traks += trak(b'soun', audio_entry, 44100, table(b'stts', '>II', [(int(seconds * 44100 / 1024), 1024)]))
+    mvhd = full_box(b'mvhd', 0, struct.pack('>IIII', 0, 0, 1000, int(seconds * 1000)) + bytes(80))
+    return box(b'ftyp', b'isom' + bytes(4)) + mdat + box(b'moov', mvhd + traks)
+
+
+@pytest.fixture
+def make_mp4(tmp_path):
+    """写入 build_mp4 构造的文件，返回路径"""
+    def make(name='video.mp4', **kwargs):
+        path = tmp_path / name
+        path.write_bytes(build_mp4(**kwargs))
+        return path
+    return make
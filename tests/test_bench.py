@@ -0,0 +1,38 @@
+"""
+基准测试的参数解析、用例标识和基线读取
+"""
+
+import json
+
+import pytest
+
+from txt_images_to_ai_video.bench import case_id, load_baseline, parse_list, parse_resolution
+from txt_images_to_ai_video.profiles import DEFAULT_PROFILE
+
+
+@pytest.mark.parametrize('value, expected', [
+    (None, []),
+    ('1920x1080, 3840x2160,', ['1920x1080', '3840x2160']),
+    (4, ['4']),
+    ((None, 'zoom_in'), ['None', 'zoom_in']),
+])
+def test_parse_list(value, expected):
+    assert parse_list(value) == expected
+
+
+def test_parse_resolution():
+    assert parse_resolution('1920X1080') == (1920, 1080)
+    for value in ('1920', '0x1080', 'axb'):
+        with pytest.raises(ValueError, match='无效的分辨率'):
+            parse_resolution(value)
+
+
+def test_case_id_matches_baseline(tmp_path):
+    identifier = case_id('1920x1080', 4, None, 'segments', 2)
+    assert identifier == '1920x1080-n4-none-segments-w2'
+    assert case_id('1920x1080', 4, None, 'segments', 2, profile=DEFAULT_PROFILE) == identifier
+    assert case_id('1920x1080', 4, 'zoom_in', 'segments', 2, profile='draft').endswith('-zoom_in-segments-w2-draft')
+    
+    path = tmp_path / 'before.json'
+    path.write_text(json.dumps({'cases': [{'id': identifier, 'seconds': 3.5}]}), encoding='utf-8')
+    assert load_baseline(path) == {identifier: {'id': identifier, 'seconds': 3.5}}
@@ -0,0 +1,48 @@
+"""
+缓存：文件缓存的 LRU 淘汰、进程内有界缓存和内容哈希
+"""
+
+import os
+
+from txt_images_to_ai_video import cache, media
+from txt_images_to_ai_video.cache import FileCache, LRUMemo, file_sha256
+
+
+def test_lru_memo_evicts_least_recently_used():
+    memo = LRUMemo(2)
+    memo.put('a', 1)
+    memo.put('b', 2)
+    assert memo.get('a') == 1
+    memo.put('c', 3)
+    assert memo.get('b') is None
+    assert (memo.get('a'), memo.get('c'), len(memo)) == (1, 3, 2)
+
+
+def test_memos_stay_bounded(tmp_path, make_mp4, monkeypatch):
+    monkeypatch.setattr(cache, '_hash_memo', LRUMemo(3))
+    monkeypatch.setattr(media, '_info_memo', LRUMemo(3))
+    for n in range(10):
+        path = tmp_path / f"{n}.txt"
+        path.write_text(str(n))
+        file_sha256(path)
+        media.media_info(make_mp4(f"{n}.mp4"))
+    assert len(cache._hash_memo) == 3
+    assert len(media._info_memo) == 3
+
+
+def test_file_cache_evicts_least_recently_used(tmp_path):
+    source = tmp_path / 'source.bin'
+    source.write_bytes(bytes(400 * 1024))
+    file_cache = FileCache(tmp_path / 'cache', max_size_mb=1, suffix='.bin')
+    for n, key in enumerate(('aa01', 'bb02')):
+        path = file_cache.put(key, source, meta={'n': n})
+        os.utime(path, (n, n))
+    # 读取 aa01 后它成为最近使用的条目，写入第三个条目时淘汰 bb02
+    assert file_cache.get('aa01') is not None
+    file_cache.put('cc03', source)
+    
+    assert file_cache.get('bb02') is None
+    assert file_cache.get_meta('bb02') is None
+    assert file_cache.get('aa01') is not None and file_cache.get('cc03') is not None
+    assert file_cache.stats() == {'hits': 3, 'misses': 1}
+    assert file_cache.evict() == 0
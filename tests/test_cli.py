@@ -0,0 +1,114 @@
+"""
+命令行参数解析、命令分发和启动时的导入
+"""
+
+import os
+
+import pytest
+
+from txt_images_to_ai_video import cli
+from txt_images_to_ai_video.bench import STARTUP_CASES, _startup_env, imported_modules
+from txt_images_to_ai_video.cli import CLI, _parse_args
+
+
+def test_parse_args_forms():
+    kwargs = _parse_args(CLI.generate, [
+        'story.txt', '--input-image=a.png,b.png', '--output_video', 'out.mp4',
+        '--speed=1.25', '--workers', '4', '--keep_audio', '--notts_cache', '--resume', 'False',
+    ])
+    assert kwargs == {
+        'input_txt': 'story.txt', 'input_image': 'a.png,b.png', 'output_video': 'out.mp4',
+        'speed': 1.25, 'workers': 4, 'keep_audio': True, 'tts_cache': False, 'resume': False,
+    }
+
+
+def test_only_numeric_parameters_are_coerced():
+    """纯数字的文件名、语音名称等保持字符串，数值参数按默认值的类型转换"""
+    kwargs = _parse_args(CLI.generate, [
+        '2024', '01.png', '3.mp4', '--voice=007', '--model=1.5', '--speed=2', '--tts_max_chars=400',
+        '--farm_lease=30', '--segment_cache=True', '--tts_cache=1',
+    ])
+    assert kwargs == {
+        'input_txt': '2024', 'input_image': '01.png', 'output_video': '3.mp4', 'voice': '007', 'model': '1.5',
+        'speed': 2.0, 'tts_max_chars': 400, 'farm_lease': 30.0, 'segment_cache': True, 'tts_cache': '1',
+    }
+    assert type(kwargs['speed']) is float
+    assert _parse_args(CLI.merge_video, ['1,2', '3', '4']) == {'input': '1,2', 'output_video': '3', 'workers': 4}
+
+
+@pytest.mark.parametrize('arg', ['--workers=two', '--workers=2.5', '--effect_duration=nan'])
+def test_invalid_numeric_value(arg):
+    with pytest.raises(ValueError, match='参数值应为'):
+        _parse_args(CLI.generate, ['a.txt', 'b.png', 'c.mp4', arg])
+
+
+@pytest.mark.parametrize('args, message', [
+    (['a.mp4,b.mp4', 'out.mp4', '2', 'fade', 'extra'], '多余的参数'),
+    (['--input=a.mp4,b.mp4'], '缺少必需参数'),
+    (['a.mp4,b.mp4', 'out.mp4', '--colour=red'], '未知参数'),
+])
+def test_parse_args_errors(args, message):
+    with pytest.raises(ValueError, match=message):
+        _parse_args(CLI.merge_video, args)
+
+
+def test_main_dispatches_to_command(monkeypatch):
+    calls = []
+    monkeypatch.setattr(CLI, 'merge_video', lambda self, input, output_video, workers=None, transition=None:
+                        calls.append((input, output_video, workers)))
+    cli.main(['merge_video', 'a.mp4,b.mp4', '--output_video=out.mp4', '--workers=2'])
+    assert calls == [('a.mp4,b.mp4', 'out.mp4', 2)]
+
+
+@pytest.mark.parametrize('argv, code', [
+    (['no_such_command'], 2),
+    (['merge_video', '--colour=red'], 2),
+])
+def test_main_usage_errors(argv, code, capsys):
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main(argv)
+    assert exc_info.value.code == code
+    assert '❌' in capsys.readouterr().err
+
+
+def test_command_failure_exit_code(monkeypatch):
+    monkeypatch.setattr(CLI, 'merge_video', lambda self, input, output_video, workers=None, transition=None: False)
+    with pytest.raises(SystemExit) as exc_info:
+        cli.main(['merge_video', 'a.mp4', 'out.mp4'])
+    assert exc_info.value.code == 1
+
+
+@pytest.mark.parametrize('error', [None, RuntimeError('ffmpeg 失败')])
+def test_generate_closes_tts_service(tmp_path, monkeypatch, error):
+    """generate 与 batch/serve 一样，成功和失败时都关闭 TTS 客户端"""
+    from txt_images_to_ai_video import video
+    
+    closed = []
+    
+    class FakeTTS:
+        def close(self):
+            closed.append(True)
+    
+    def create_video(**kwargs):
+        if error:
+            raise error
+    
+    monkeypatch.setattr(cli, '_build_tts_service', lambda *args, **kwargs: FakeTTS())
+    monkeypatch.setattr(video, 'create_video', create_video)
+    (tmp_path / 'story.txt').write_text('旁白', encoding='utf-8')
+    (tmp_path / 'a.png').write_bytes(b'')
+    ok = CLI().generate(str(tmp_path / 'story.txt'), str(tmp_path / 'a.png'), str(tmp_path / 'out.mp4'))
+    assert ok is (error is None)
+    assert closed == [True]
+
+
+@pytest.mark.parametrize('case', ['help', 'merge_video --help', 'merge_video'])
+def test_light_commands_do_not_import_openai(tmp_path, case):
+    """帮助和 merge_video 不导入 openai（用空的 openai 包代替，未安装 openai 时同样能检查）"""
+    (tmp_path / 'openai').mkdir()
+    (tmp_path / 'openai' / '__init__.py').write_text('', encoding='utf-8')
+    env = _startup_env()
+    env['PYTHONPATH'] = os.pathsep.join([env['PYTHONPATH'], str(tmp_path)])
+    modules = imported_modules(STARTUP_CASES[case], env)
+    assert 'txt_images_to_ai_video' in modules
+    assert not [module for module in modules if module == 'openai' or module.startswith('openai.')]
@@ -0,0 +1,58 @@
+"""
+分布式渲染的任务队列：领取、租约过期后重新领取和重试次数
+"""
+
+import os
+
+from txt_images_to_ai_video.farm import WorkQueue
+
+
+def expire(queue, lease):
+    """把租约的最近一次心跳改到租约时长之前"""
+    stale = queue.now('test') - queue.lease_seconds - 1
+    os.utime(lease.path, (stale, stale))
+
+
+def test_claim_is_exclusive_until_lease_expires(tmp_path):
+    queue = WorkQueue(tmp_path, lease_seconds=30, max_attempts=2)
+    task_id = queue.submit({'kind': 'segment', 'image': 'a.png'})
+    assert queue.submit({'kind': 'segment', 'image': 'a.png'}) == task_id
+    
+    first = queue.claim('w1')
+    assert (first.task_id, first.attempt) == (task_id, 1)
+    assert queue.claim('w2') is None
+    assert queue.state(task_id) == ('running', 1)
+    assert first.heartbeat()
+    
+    expire(queue, first)
+    assert queue.state(task_id, now=queue.now('test'))[0] == 'pending'
+    second = queue.claim('w2')
+    assert (second.task_id, second.attempt) == (task_id, 2)
+    # 原持有者心跳时发现租约已被接管
+    assert not first.heartbeat() and first.lost.is_set()
+    
+    second.complete(tmp_path / 'out.mp4')
+    assert queue.state(task_id) == ('done', 2)
+    assert queue.result(task_id)['worker'] == 'w2'
+    assert queue.claim('w3') is None
+
+
+def test_task_fails_after_max_attempts(tmp_path):
+    queue = WorkQueue(tmp_path, lease_seconds=30, max_attempts=2)
+    task_id = queue.submit({'kind': 'chapter', 'title': '第一章'})
+    queue.claim('w1').fail(RuntimeError("编码失败"))
+    assert queue.state(task_id) == ('pending', 1)
+    expire(queue, queue.claim('w1'))
+    assert queue.state(task_id, now=queue.now('test')) == ('failed', 2)
+    assert queue.last_error(task_id) == "租约过期（worker 已退出或失去响应）"
+    assert queue.claim('w2') is None
+    
+    # 重新提交失败的任务时清除之前的尝试
+    assert queue.submit({'kind': 'chapter', 'title': '第一章'}) == task_id
+    assert queue.claim('w2').attempt == 1
+
+
+def test_queue_config_is_shared(tmp_path):
+    WorkQueue(tmp_path, lease_seconds=5, max_attempts=4)
+    worker_side = WorkQueue(tmp_path)
+    assert (worker_side.lease_seconds, worker_side.max_attempts) == (5.0, 4)
@@ -0,0 +1,50 @@
+"""
+任务日志：恢复时校验阶段指纹和输出文件
+"""
+
+import pytest
+
+from txt_images_to_ai_video.journal import JobJournal, atomic_output
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    output = tmp_path / 'segment_001.mp4'
+    output.write_bytes(b'segment')
+    JobJournal(tmp_path).record('segment_001.mp4', 'fp-1', output, duration=2.5)
+    return output
+
+
+def test_resume_reuses_unchanged_stage(tmp_path, recorded):
+    journal = JobJournal(tmp_path, resume=True)
+    entry = journal.completed('segment_001.mp4', 'fp-1', recorded)
+    assert entry['duration'] == 2.5
+    assert journal.is_recorded(recorded)
+    # 不恢复时忽略之前的记录
+    assert JobJournal(tmp_path).completed('segment_001.mp4', 'fp-1', recorded) is None
+
+
+@pytest.mark.parametrize('change', ['fingerprint', 'content', 'size', 'missing'])
+def test_resume_rejects_changed_stage(tmp_path, recorded, change):
+    fingerprint = 'fp-2' if change == 'fingerprint' else 'fp-1'
+    if change == 'content':
+        recorded.write_bytes(b'SEGMENT')
+    elif change == 'size':
+        recorded.write_bytes(b'segment!')
+    elif change == 'missing':
+        recorded.unlink()
+    assert JobJournal(tmp_path, resume=True).completed('segment_001.mp4', fingerprint, recorded) is None
+
+
+def test_corrupt_journal_starts_over(tmp_path, recorded):
+    (tmp_path / 'job.json').write_text('{"version": 1, "stages": ', encoding='utf-8')
+    assert JobJournal(tmp_path, resume=True).stages == {}
+
+
+def test_atomic_output_discards_partial_file(tmp_path):
+    output = tmp_path / 'out.mp4'
+    with pytest.raises(RuntimeError):
+        with atomic_output(output) as partial:
+            partial.write_bytes(b'partial')
+            raise RuntimeError("编码失败")
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,58 @@
+"""
+media 模块：纯 Python 解析 MP4 box 和关键帧时间
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from txt_images_to_ai_video import video
+from txt_images_to_ai_video.media import keyframe_times, media_info, read_keyframe_times, read_media_info
+
+
+def test_mp4_stream_params(make_mp4):
+    info = media_info(make_mp4(seconds=4.0, size=(1280, 720)))
+    assert (info.format_name, info.duration, info.source) == ('mp4', 4.0, 'native')
+    assert {key: info.video[key] for key in ('codec_name', 'profile', 'width', 'height', 'r_frame_rate', 'time_base')} \
+        == {'codec_name': 'h264', 'profile': 'High', 'width': 1280, 'height': 720, 'r_frame_rate': '30/1',
+            'time_base': '1/15360'}
+    assert info.audio == {'codec_name': 'aac', 'sample_rate': '44100', 'channels': 2, 'channel_layout': 'stereo'}
+
+
+def test_mp4_without_audio(make_mp4):
+    info = read_media_info(make_mp4(audio=False))
+    assert info.video['codec_name'] == 'h264'
+    assert info.audio is None
+
+
+def test_unknown_format_is_not_parsed(tmp_path):
+    path = tmp_path / 'clip.bin'
+    path.write_bytes(b'\x00' * 64)
+    assert read_media_info(path) is None
+    assert read_keyframe_times(path) is None
+
+
+@pytest.mark.parametrize('kwargs, expected', [
+    ({}, [0.0, 1.0, 2.0, 3.0]),
+    # B 帧的显示偏移（2 帧）由编辑列表抵消
+    ({'ctts': [(120, 1024)], 'elst': 1024}, [0.0, 1.0, 2.0, 3.0]),
+    ({'ctts': [(120, 1024)]}, [k + 1024 / 15360 for k in (0.0, 1.0, 2.0, 3.0)]),
+    ({'fps': 25, 'timescale': 12800, 'gop': 50}, [0.0, 2.0]),
+])
+def test_keyframe_times(make_mp4, kwargs, expected):
+    assert keyframe_times(make_mp4(seconds=4.0, **{'gop': 30, **kwargs})) == pytest.approx(expected)
+
+
+def test_keyframe_times_falls_back_to_ffprobe(make_mp4, monkeypatch):
+    """以空白段开头的编辑列表无法直接换算，改用 ffprobe 读取数据包"""
+    path = make_mp4(elst=-1)
+    assert read_keyframe_times(path) is None
+    calls = []
+    
+    def run_ffmpeg(cmd, **kwargs):
+        calls.append(cmd)
+        return SimpleNamespace(stdout='0.500000,K_\n0.533333,__\n2.500000,K_\n')
+    
+    monkeypatch.setattr(video, 'run_ffmpeg', run_ffmpeg)
+    assert keyframe_times(path) == [0.5, 2.5]
+    assert calls[0][0] == 'ffprobe'
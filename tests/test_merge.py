@@ -0,0 +1,162 @@
+"""
+合并视频：流参数检查、参数集（SPS/PPS）比较和按参考视频的 x264 参数重新编码
+"""
+
+import hashlib
+from pathlib import Path
+
+import pytest
+
+from txt_images_to_ai_video import video
+from txt_images_to_ai_video.media import media_info, read_encoder_options
+from txt_images_to_ai_video.video import (_reference_video_args, build_reencode_concat_command, merge_with_transitions,
+                                          mux_reencode_size, mux_segments, plan_transitions, probe_stream_params,
+                                          reference_params, x264_params)
+
+
+# x264 medium 预设 + stillimage 调优写入的版本信息（节选）
+X264_SEI = (
+    b'\x00\x00\x00\x10\x06\x05' + bytes(16)
+    + b'x264 - core 164 r3095 baee400 - H.264/MPEG-4 AVC codec - Copyleft 2003-2022 - '
+    + b'http://www.videolan.org/x264.html - options: cabac=1 ref=3 deblock=1:-3:-3 analyse=0x3:0x113 me=hex '
+    + b'subme=7 psy=1 psy_rd=2.00:0.70 mixed_ref=1 me_range=16 chroma_me=1 trellis=1 8x8dct=1 cqm=0 '
+    + b'chroma_qp_offset=-4 interlaced=0 bluray_compat=0 constrained_intra=0 bframes=3 b_pyramid=2 '
+    + b'weightb=1 weightp=2 keyint=250 keyint_min=25 rc=crf mbtree=1 crf=23.0 aq=1:1.20\x00\x80'
+)
+
+
+def test_extradata_hash_matches_avcc(make_mp4):
+    avcc = bytes([1, 100, 0, 40, 0xff, 0xe1, 0, 4, 1, 2, 3, 4])
+    info = media_info(make_mp4(avcc=avcc))
+    assert info.video['extradata_hash'] == f"SHA256:{hashlib.sha256(avcc).hexdigest()}"
+
+
+def test_parameter_sets_are_part_of_the_copy_signature(make_mp4):
+    first = probe_stream_params(make_mp4('a.mp4', avcc=bytes([1, 100, 0, 40, 0xff, 0xe1, 1])))
+    second = probe_stream_params(make_mp4('b.mp4', avcc=bytes([1, 100, 0, 40, 0xff, 0xe1, 2])))
+    assert first['video']['extradata_hash'] != second['video']['extradata_hash']
+    assert {k: v for k, v in first['video'].items() if k != 'extradata_hash'} == \
+        {k: v for k, v in second['video'].items() if k != 'extradata_hash'}
+
+
+def test_read_encoder_options(make_mp4):
+    options = read_encoder_options(make_mp4(first_sample=X264_SEI))
+    assert options['ref'] == '3'
+    assert options['psy_rd'] == '2.00:0.70'
+    assert options['crf'] == '23.0'
+    assert read_encoder_options(make_mp4('plain.mp4')) is None
+
+
+def test_x264_params_restore_parameter_set_options(make_mp4):
+    params = dict(item.split('=') for item in
+                  x264_params(read_encoder_options(make_mp4(first_sample=X264_SEI))).split(':'))
+    assert params['ref'] == '3'
+    assert params['bframes'] == '3'
+    assert params['b-pyramid'] == 'normal'
+    assert params['keyint'] == '250'
+    assert params['crf'] == '23.0'
+    assert params['cqm'] == 'flat'
+    # SEI 中的 -4 已包含 psy-rd (-2) 和 psy-trellis (-2) 的调整
+    assert params['chroma-qp-offset'] == '0'
+    assert params['psy-rd'] == '2.00,0.70'
+
+
+def test_x264_params_unknown_or_unsupported():
+    assert x264_params(None) is None
+    assert x264_params({'interlaced': 'tff', 'rc': 'crf', 'crf': '23.0'}) is None
+    assert x264_params({'rc': '2pass', 'bitrate': '1000'}) is None
+    assert x264_params({'rc': 'crf', 'crf': '23.0', 'cqm': '2'}) is None
+
+
+def test_reference_args_use_x264_params(make_mp4):
+    reference = probe_stream_params(make_mp4())
+    assert '-x264-params' not in _reference_video_args(reference['video'])
+    reference['video']['x264_params'] = 'ref=3'
+    args = _reference_video_args(reference['video'])
+    assert args[args.index('-x264-params') + 1] == 'ref=3'
+
+
+def test_reencode_concat_command(make_mp4):
+    reference = probe_stream_params(make_mp4())
+    cmd = build_reencode_concat_command(['a.mp4', 'b.mp4'], 'out.mp4', reference)
+    graph = cmd[cmd.index('-filter_complex') + 1]
+    assert graph == '[0:v:0][0:a:0][1:v:0][1:a:0]concat=n=2:v=1:a=1[v][a]'
+    assert cmd[-1] == 'out.mp4'
+
+
+@pytest.mark.parametrize('window_avcc, ranges', [
+    (bytes([1, 100, 0, 40, 0xff, 0xe1]), 0),
+    (bytes([1, 100, 0, 40, 0xff, 0xe1, 9]), 2),
+])
+def test_transition_windows_checked_before_copy(make_mp4, monkeypatch, window_avcc, ranges):
+    """转场窗口的参数集与原视频不同时，原视频流复制的范围也重新编码，仍然只拼接一次、不整体重新编码"""
+    calls = []
+    
+    def run_ffmpeg(cmd, **kwargs):
+        calls.append(cmd)
+        make_mp4(Path(cmd[-1]), seconds=2.0, avcc=window_avcc)
+    
+    monkeypatch.setattr(video, 'run_ffmpeg', run_ffmpeg)
+    videos = [make_mp4('a.mp4'), make_mp4('b.mp4')]
+    reference = reference_params([probe_stream_params(path) for path in videos])
+    result = merge_with_transitions(videos, videos[0].parent / 'out.mp4', reference, ('fade', 0.5), workers=1)
+    
+    assert (result['windows'], result['ranges'], result['full_reencode']) == (1, ranges, False)
+    assert result['reencoded_seconds'] == pytest.approx(3.5 if not ranges else 3.5 + 8.0 + 8.0)
+    encoded = calls[:-1]
+    assert len(encoded) == 1 + ranges
+    assert all('xfade' not in cmd[cmd.index('-filter_complex') + 1] for cmd in encoded[1:])
+    final = calls[-1]
+    assert final[final.index('-f') + 1] == 'concat' and 'copy' in final
+
+
+def test_plan_transitions_copies_between_keyframes():
+    keys = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert plan_transitions([10.0, 10.0, 10.0], [keys] * 3, 1.0) == [
+        ('copy', (0, 0.0, 8.0)),
+        ('window', [(0, 8.0, 10.0), (1, 0.0, 2.0)]),
+        ('copy', (1, 2.0, 8.0)),
+        ('window', [(1, 8.0, 10.0), (2, 0.0, 2.0)]),
+        ('copy', (2, 2.0, None)),
+    ]
+
+
+def test_plan_transitions_short_video_joins_window():
+    """中间的视频两端转场之间没有关键帧时整个并入转场窗口"""
+    keys = [0.0, 2.0, 4.0, 6.0, 8.0]
+    assert plan_transitions([10.0, 1.5, 10.0], [keys, [0.0], keys], 0.5) == [
+        ('copy', (0, 0.0, 8.0)),
+        ('window', [(0, 8.0, 10.0), (1, 0.0, 1.5), (2, 0.0, 2.0)]),
+        ('copy', (2, 2.0, None)),
+    ]
+
+
+def test_plan_transitions_rejects_short_video():
+    with pytest.raises(ValueError):
+        plan_transitions([10.0, 0.8, 10.0], [[0.0]] * 3, 0.5)
+
+
+@pytest.mark.parametrize('second_avcc, reencode', [
+    (bytes([1, 100, 0, 40, 0xff, 0xe1]), False),
+    (bytes([1, 100, 0, 40, 0xff, 0xe1, 7]), True),
+])
+def test_mux_segments_checks_parameter_sets(make_mp4, monkeypatch, second_avcc, reencode):
+    """生成视频时拼接片段同样比较参数集，不一致时重新编码而不是流复制（异步流程共用 mux_reencode_size）"""
+    calls = []
+    
+    def run_ffmpeg(cmd, **kwargs):
+        calls.append(cmd)
+        Path(cmd[-1]).write_bytes(b'')
+    
+    monkeypatch.setattr(video, 'run_ffmpeg', run_ffmpeg)
+    segments = [make_mp4('a.mp4', audio=False), make_mp4('b.mp4', audio=False, avcc=second_avcc)]
+    output = segments[0].parent / 'out.mp4'
+    size = mux_reencode_size(segments)
+    assert (size is not None) == reencode
+    assert mux_segments(segments, 'audio.m4a', output) == output
+    cmd = calls[-1]
+    if reencode:
+        assert 'concat=n=2' in cmd[cmd.index('-filter_complex') + 1]
+        assert 'libx264' in cmd
+    else:
+        assert cmd[cmd.index('-f') + 1] == 'concat' and cmd[cmd.index('-c:v') + 1] == 'copy'
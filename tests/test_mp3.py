@@ -0,0 +1,63 @@
+"""
+MP3 帧解析：流式累计时长和完整文件的时长
+"""
+
+import struct
+
+import pytest
+
+from txt_images_to_ai_video.mp3 import MP3DurationCounter, parse_frame_header, read_mp3_info
+
+
+# MPEG 1 Layer III、128 kbps、44100 Hz、立体声，每帧 417 字节、1152 个采样
+HEADER = b'\xff\xfb\x90\x64'
+FRAME = HEADER + bytes(413)
+FRAME_SECONDS = 1152 / 44100
+
+
+def id3v2(size):
+    """ID3v2 标签：长度为 4 个 7 位字节"""
+    return b'ID3\x04\x00\x00' + bytes((size >> shift) & 0x7F for shift in (21, 14, 7, 0)) + bytes(size)
+
+
+def xing_frame(frames):
+    """Xing 信息帧：side information（立体声 32 字节）之后是标签、标志和总帧数"""
+    payload = bytes(32) + b'Xing' + struct.pack('>II', 1, frames)
+    return HEADER + payload + bytes(413 - len(payload))
+
+
+def test_parse_frame_header():
+    assert parse_frame_header(HEADER) == (417, 1152, 44100, 2)
+    assert parse_frame_header(b'\xff\xfb\xf0\x64') is None  # 比特率索引 15 无效
+    assert parse_frame_header(b'ID3\x04') is None
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, 1000, 100000])
+def test_counter_skips_tags_across_chunks(chunk_size):
+    data = id3v2(300) + xing_frame(10) + FRAME * 10
+    counter = MP3DurationCounter()
+    assert counter.duration is None
+    for start in range(0, len(data), chunk_size):
+        counter.feed(data[start:start + chunk_size])
+    assert counter.frames == 10
+    assert counter.duration == pytest.approx(10 * FRAME_SECONDS)
+
+
+def test_counter_resyncs_after_garbage():
+    counter = MP3DurationCounter()
+    counter.feed(FRAME * 2 + b'\x00\x01\x02' + FRAME)
+    assert counter.frames == 3
+
+
+def test_read_mp3_info_uses_xing_frame_count():
+    # 标签中的总帧数优先于文件长度
+    info = read_mp3_info(id3v2(100) + xing_frame(1000) + FRAME * 3)
+    assert info['codec_name'] == 'mp3'
+    assert (info['sample_rate'], info['channels'], info['bit_rate']) == (44100, 2, 128000)
+    assert info['duration'] == pytest.approx(1000 * FRAME_SECONDS)
+
+
+def test_read_mp3_info_cbr_estimate():
+    info = read_mp3_info(FRAME * 100 + b'TAG' + bytes(125))
+    assert info['duration'] == pytest.approx(100 * 417 * 8 / 128000)
+    assert read_mp3_info(b'not an mp3 file' * 10) is None
@@ -0,0 +1,56 @@
+"""
+异步流水线：线程中的阻塞渲染随协程一起取消
+"""
+
+import asyncio
+import threading
+
+from txt_images_to_ai_video.pipeline import _equal_split_on_chunk, _in_thread_cancellable
+
+
+def test_cancelling_coroutine_stops_thread():
+    started = threading.Event()
+    stopped = threading.Event()
+    
+    def render(cancel_event=None):
+        started.set()
+        while not cancel_event.wait(0.01):
+            pass
+        stopped.set()
+        raise RuntimeError("已取消")
+    
+    async def main():
+        task = asyncio.ensure_future(_in_thread_cancellable(render))
+        while not started.is_set():
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # 协程结束时线程已经退出
+        return stopped.is_set()
+    
+    assert asyncio.run(asyncio.wait_for(main(), 5))
+
+
+def test_result_passes_through():
+    async def main():
+        return await _in_thread_cancellable(lambda value, cancel_event=None: value * 2, 21)
+    
+    assert asyncio.run(main()) == 42
+
+
+def test_equal_split_resolves_when_all_chunks_are_known():
+    """所有文本片段的时长确定时即设置各图片片段的时长，不等待 TTS 调用返回"""
+    async def main():
+        loop = asyncio.get_running_loop()
+        durations = [loop.create_future() for _ in range(4)]
+        on_chunk = _equal_split_on_chunk(durations)
+        on_chunk(2, 3.0, 3)
+        on_chunk(0, 2.0, 3)
+        assert not any(future.done() for future in durations)
+        on_chunk(1, 1.0, 3)
+        return [future.result() for future in durations]
+    
+    assert asyncio.run(main()) == [1.5] * 4
@@ -0,0 +1,78 @@
+"""
+TTS 批处理层和文本拆分
+"""
+
+import asyncio
+import threading
+from collections import Counter
+
+import pytest
+
+from txt_images_to_ai_video.tts import BatchingTTS, TTSBackend, TTSResult, split_text
+
+
+class CountingTTS(TTSBackend):
+    """记录每段文本的合成次数，文本在 failing 中时失败"""
+    
+    def __init__(self, failing=(), concurrency=4):
+        self.failing = set(failing)
+        self.concurrency = concurrency
+        self.calls = Counter()
+        self._lock = threading.Lock()
+    
+    def synthesize(self, text, output_path):
+        with self._lock:
+            self.calls[text] += 1
+        if text in self.failing:
+            raise RuntimeError(f"合成失败: {text}")
+        output_path.write_bytes(text.encode('utf-8'))
+        return TTSResult(output_path, 1.0, [text], [1.0])
+    
+    def cache_key(self, text):
+        return text
+
+
+@pytest.mark.parametrize('concurrency', [1, 4])
+def test_synthesize_many_return_exceptions(tmp_path, concurrency):
+    backend = CountingTTS(failing={'b'}, concurrency=concurrency)
+    items = [(text, tmp_path / f"{text}.mp3") for text in 'abc']
+    results = backend.synthesize_many(items, return_exceptions=True)
+    assert [type(result) for result in results] == [TTSResult, RuntimeError, TTSResult]
+    with pytest.raises(RuntimeError):
+        backend.synthesize_many(items)
+
+
+def test_batch_failure_does_not_resynthesize_group(tmp_path):
+    """组内一个请求失败时，其余请求使用自己的结果，不会被重新合成"""
+    backend = CountingTTS(failing={'b'})
+    service = BatchingTTS(backend, max_wait=0.2)
+    try:
+        results = service.synthesize_many([(text, tmp_path / f"{text}.mp3") for text in 'abc'],
+                                          return_exceptions=True)
+    finally:
+        service.close()
+    assert isinstance(results[1], RuntimeError)
+    assert (tmp_path / 'a.mp3').read_bytes() == b'a'
+    assert backend.calls == Counter({'a': 1, 'b': 1, 'c': 1})
+
+
+def test_split_text_packs_sentences_within_limit():
+    text = "第一句。第二句！\n\n第三段？"
+    assert split_text(text, max_chars=800) == ["第一句。第二句！\n第三段？"]
+    assert split_text(text, max_chars=5) == ['第一句。', '第二句！', '第三段？']
+
+
+def test_split_text_long_sentence():
+    """超长句子先按逗号拆分，仍然超长时按长度截断，不丢失文字"""
+    text = "一" * 20 + "，" + "二" * 5 + "。"
+    chunks = split_text(text, max_chars=10)
+    assert all(len(chunk) <= 10 for chunk in chunks)
+    assert ''.join(chunks) == text
+
+
+def test_synthesize_async_reports_chunks(tmp_path):
+    calls = []
+    result = asyncio.run(CountingTTS().synthesize_async('a', tmp_path / 'a.mp3',
+                                                        lambda *args: calls.append(args)))
+    assert calls == [(0, 1.0, 1)]
+    assert result.duration == 1.0
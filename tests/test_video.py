@@ -0,0 +1,87 @@
+"""
+video 模块的 ffmpeg 命令构建测试（只检查命令参数，不运行 ffmpeg）
+"""
+
+import re
+import shutil
+
+import pytest
+
+from txt_images_to_ai_video.media import media_info
+from txt_images_to_ai_video.profiles import PROFILES, EncoderProfile
+from txt_images_to_ai_video.video import build_rawvideo_command, build_segment_commands, run_ffmpeg
+
+
+# 决定参数集（SPS/PPS）的编码参数
+PARAMETER_SET_OPTIONS = ('-c:v', '-preset', '-tune', '-crf', '-g', '-keyint_min', '-bf', '-pix_fmt', '-profile:v',
+                         '-x264-params')
+
+
+def command_fps(cmd):
+    """命令输出的帧率：-framerate 输入参数或 zoompan 滤镜的 fps；流复制命令返回 None"""
+    if '-framerate' in cmd:
+        return int(cmd[cmd.index('-framerate') + 1])
+    if '-vf' in cmd:
+        match = re.search(r'fps=(\d+)', cmd[cmd.index('-vf') + 1])
+        if match:
+            return int(match.group(1))
+    assert 'copy' in cmd, f"无法确定命令的帧率: {cmd}"
+    return None
+
+
+def encoder_options(cmd):
+    """命令中（最后一个输入之后）决定参数集的编码参数；流复制命令返回 None"""
+    if 'copy' in cmd:
+        return None
+    output_args = cmd[len(cmd) - cmd[::-1].index('-i'):]
+    return {option: output_args[output_args.index(option) + 1] for option in PARAMETER_SET_OPTIONS
+            if option in output_args}
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_segment_commands_share_one_frame_rate(profile):
+    """短静态片段、静态快速路径和运镜片段的帧率一致，可以直接流复制拼接"""
+    cases = [
+        (3.0, None),        # 短静态片段：逐帧编码
+        (10.0, None),       # 长静态片段：静态短片段 + 循环复制
+        (3.0, 'zoom_in'),   # 运镜片段
+        (1.0, 'zoom_in'),   # 时长不超过运镜时长：按静态片段编码
+    ]
+    rates = set()
+    for duration, effect in cases:
+        commands, _ = build_segment_commands('a.bmp', duration, 'o.mp4', effect, 1.5, profile=profile)
+        rates.update(command_fps(cmd) for cmd in commands)
+    fps = PROFILES[profile].fps or 30
+    rates.add(command_fps(build_rawvideo_command((64, 36), fps, 'm.mp4', profile=profile)))
+    rates.discard(None)
+    assert rates == {fps}
+
+
+@pytest.mark.parametrize('profile', sorted(PROFILES))
+def test_segment_commands_share_encoder_options(profile):
+    """静态短片段、逐帧编码的静态片段、zoompan 和 numpy 运镜片段使用相同的 GOP 和 B 帧设置"""
+    commands = []
+    for duration, effect in ((10.0, None), (3.0, None), (3.0, 'zoom_in')):
+        commands += build_segment_commands('a.bmp', duration, 'o.mp4', effect, 1.5, profile=profile)[0]
+    commands.append(build_rawvideo_command((64, 36), 30, 'm.mp4', profile=profile))
+    options = [encoder_options(cmd) for cmd in commands]
+    options = [option for option in options if option is not None]
+    assert len(options) == 4
+    assert all(option == options[0] for option in options)
+    assert options[0]['-bf'] == '0'
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason="需要 ffmpeg")
+def test_static_and_motion_segments_share_parameter_sets(tmp_path):
+    """静态片段（短片段循环复制）和运镜片段的参数集相同，可以流复制拼接"""
+    profile = EncoderProfile(name='test', preset='ultrafast', size=(320, 180))
+    image = tmp_path / 'image.png'
+    run_ffmpeg(['ffmpeg', '-f', 'lavfi', '-i', 'testsrc2=size=640x360:rate=1', '-frames:v', '1', '-y', str(image)])
+    hashes = set()
+    for name, duration, effect in (('static', 5.0, None), ('motion', 3.0, 'zoom_in')):
+        output = tmp_path / f"{name}.mp4"
+        commands, _ = build_segment_commands(image, duration, output, effect, 1.5, profile=profile)
+        for cmd in commands:
+            run_ffmpeg(cmd)
+        hashes.add(media_info(output).video['extradata_hash'])
+    assert len(hashes) == 1
@@ -8,7 +8,21 @@ txt_images_to_ai_video - 将图片和旁白转化成视频的工具
 __version__ = "0.1.0"
 __author__ = "Your Name"
 
-from .video import create_video
+__all__ = ["create_video", "create_video_async"]
 
-__all__ = ["create_video"]
+# 公开接口所在的模块，首次访问时才导入（命令行启动时不加载渲染模块）
+_LAZY_ATTRS = {
+    "create_video": "video",
+    "create_video_async": "pipeline",
+}
 
+
+def __getattr__(name):
+    module = _LAZY_ATTRS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    from importlib import import_module
+    
+    value = getattr(import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
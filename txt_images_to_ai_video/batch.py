@@ -0,0 +1,326 @@
+"""
+批量渲染模块
+在一个进程内按清单文件渲染多个章节视频，所有章节共用一个 TTS 客户端和片段渲染线程池
+"""
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+from . import metrics
+from .deps import BuildManifest, deps_path
+from .farm import FarmExecutor, chapter_task
+from .profiles import get_profile
+from .storage import intermediate_dir
+from .video import build_dependencies, create_video, merge_videos_checked, parse_transition
+
+
+# 章节可以单独覆盖的渲染参数（未设置时使用清单顶层的值）
+CHAPTER_OPTIONS = ('voice', 'speed', 'model', 'camera_effect', 'effect_duration', 'engine', 'profile', 'motion_engine')
+
+
+def load_manifest(manifest_path):
+    """
+    读取批量渲染清单（支持 .json / .yaml / .yml / .toml）
+    
+    Args:
+        manifest_path: 清单文件路径
+    
+    Returns:
+        dict: 清单内容
+    """
+    manifest_path = Path(manifest_path)
+    suffix = manifest_path.suffix.lower()
+    
+    if suffix == '.json':
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    elif suffix in ('.yaml', '.yml'):
+        try:
+            import yaml
+        except ImportError:
+            raise ImportError("读取 YAML 清单需要安装 PyYAML: pip install pyyaml")
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = yaml.safe_load(f)
+    elif suffix == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            try:
+                import tomli as tomllib
+            except ImportError:
+                raise ImportError("Python 3.11 以下读取 TOML 清单需要安装 tomli: pip install tomli")
+        with open(manifest_path, 'rb') as f:
+            data = tomllib.load(f)
+    else:
+        raise ValueError(f"不支持的清单格式: {manifest_path}（支持 .json/.yaml/.yml/.toml）")
+    
+    if not isinstance(data, dict) or not data.get('chapters'):
+        raise ValueError(f"清单中没有章节（chapters）: {manifest_path}")
+    return data
+
+
+def parse_chapters(manifest, manifest_dir):
+    """
+    解析清单中的章节列表，并将相对路径转换为实际路径
+    
+    图片和旁白相对于 base_dir（默认清单所在目录），章节输出和合并输出相对于
+    output_dir（默认 base_dir）。
+    
+    Args:
+        manifest: load_manifest 返回的清单内容
+        manifest_dir: 清单文件所在目录
+    
+    Returns:
+        tuple: (章节列表, 合并输出路径或 None)
+    """
+    manifest_dir = Path(manifest_dir)
+    base_dir = manifest_dir / manifest.get('base_dir', '.')
+    output_dir = base_dir / manifest.get('output_dir', '.')
+    defaults = {name: manifest[name] for name in CHAPTER_OPTIONS if name in manifest}
+    
+    chapters = []
+    for i, entry in enumerate(manifest['chapters'], 1):
+        images = entry.get('images') or entry.get('image')
+        if not images or 'script' not in entry or 'output' not in entry:
+            raise ValueError(f"第 {i} 个章节缺少 images、script 或 output")
+        if isinstance(images, str):
+            images = [img.strip() for img in images.split(',')]
+        
+        options = dict(defaults)
+        options.update({name: entry[name] for name in CHAPTER_OPTIONS if name in entry})
+        
+        output = output_dir / entry['output']
+        chapters.append({
+            'title': entry.get('title') or output.stem,
+            'images': [base_dir / img for img in images],
+            'script': base_dir / entry['script'],
+            'output': output,
+            'options': options,
+        })
+    
+    merge_output = manifest.get('merge_output')
+    return chapters, (output_dir / merge_output if merge_output else None)
+
+
+def is_up_to_date(output, inputs):
+    """
+    判断输出文件是否比所有输入文件都新
+    
+    Args:
+        output: 输出文件路径
+        inputs: 输入文件路径列表
+    
+    Returns:
+        bool: 输出存在且不早于任何输入时返回 True
+    """
+    output = Path(output)
+    if not output.exists():
+        return False
+    output_mtime = output.stat().st_mtime
+    return all(Path(p).stat().st_mtime <= output_mtime for p in inputs)
+
+
+def run_batch(manifest_path, tts_service, workers=2, chapter_workers=2, force=False, merge=True,
+              segment_cache=None, temp_dir=None, profile=None, resume=False, incremental=False, storage=None,
+              farm=None):
+    """
+    批量渲染清单中的所有章节
+    
+    多个章节同时进行（TTS 请求与片段编码重叠），所有章节的片段提交到同一个渲染线程池，
+    TTS 请求通过同一个 TTSService 客户端发出。输出比输入新的章节会被跳过；增量模式下改为比较
+    输出旁依赖清单中记录的输入内容哈希和参数，章节内也只重新生成变化的语音和片段。
+    
+    Args:
+        manifest_path: 清单文件路径
+        tts_service: TTS 服务实例（章节的语音参数通过 with_options 派生）
+        workers: 片段渲染线程池大小（所有章节共用）
+        chapter_workers: 同时处理的章节数
+        force: 忽略已有输出，全部重新生成
+        merge: 清单设置了 merge_output 时，是否在最后合并所有章节
+        segment_cache: 片段缓存 FileCache（可选）
+        temp_dir: 临时文件根目录，默认由 storage 决定
+        profile: 编码配置（可选），设置时覆盖清单中所有章节的 profile
+        resume: 需要生成的章节是否从上次中断的位置继续（复用章节临时目录中已完成的阶段）
+        incremental: 增量生成（按依赖清单判断章节和合并输出是否需要重新生成，见 create_video）
+        storage: 中间文件存储位置（'output'：章节输出目录下的 temp 文件夹，默认；'local'、'tmpfs' 或目录路径）
+        farm: 分布式渲染的任务队列 farm.WorkQueue（可选），提供时每个章节作为一个任务由各节点的 worker 生成，
+              本进程等待所有章节完成后合并
+    
+    Returns:
+        dict: 渲染结果汇总（rendered/skipped/failed 章节标题列表，merged 合并输出路径）
+    """
+    manifest_path = Path(manifest_path)
+    manifest = load_manifest(manifest_path)
+    chapters, merge_output = parse_chapters(manifest, manifest_path.parent)
+    
+    # 先检查所有输入和编码配置，避免渲染到一半才发现缺少文件
+    get_profile(profile)
+    for chapter in chapters:
+        for path in [chapter['script']] + chapter['images']:
+            if not path.exists():
+                raise FileNotFoundError(f"章节 {chapter['title']} 的输入文件不存在: {path}")
+        get_profile(chapter['options'].get('profile'))
+    # 合并章节时相邻章节之间的转场（可选）
+    transition = manifest.get('transition')
+    parse_transition(transition)
+    
+    temp_root = Path(temp_dir) if temp_dir else None
+    summary = {'rendered': [], 'skipped': [], 'failed': [], 'merged': None}
+    
+    def chapter_options(chapter):
+        """章节的渲染参数和按语音参数派生的 TTS 服务"""
+        options = dict(chapter['options'])
+        if profile is not None:
+            options['profile'] = profile
+        service = tts_service.with_options(
+            voice=options.pop('voice', None),
+            speed=options.pop('speed', None),
+            model=options.pop('model', None),
+        )
+        return service, options
+    
+    def is_current(chapter):
+        """增量模式下章节的输入和参数与依赖清单一致（与 create_video 的判断相同）"""
+        text = chapter['script'].read_text(encoding='utf-8').strip()
+        if not text:
+            return False
+        service, options = chapter_options(chapter)
+        manifest, fingerprint = build_dependencies(
+            chapter['output'], chapter['script'], chapter['images'], text, service,
+            camera_effect=options.get('camera_effect'),
+            effect_duration=options.get('effect_duration', 1.5),
+            engine=options.get('engine', 'segments'),
+            profile=options.get('profile'),
+            motion_engine=options.get('motion_engine', 'zoompan'),
+        )
+        return manifest.is_current(fingerprint)
+    
+    pending = []
+    for i, chapter in enumerate(chapters, 1):
+        if force:
+            # 删除依赖清单，增量模式下也重新生成（内容未变的中间文件仍会复用）
+            if incremental and deps_path(chapter['output']).exists():
+                deps_path(chapter['output']).unlink()
+            up_to_date = False
+        elif incremental:
+            up_to_date = is_current(chapter)
+        else:
+            up_to_date = is_up_to_date(chapter['output'], [chapter['script']] + chapter['images'])
+        if up_to_date:
+            print(f"⊙ {chapter['title']} 已是最新，跳过生成")
+            summary['skipped'].append(chapter['title'])
+            metrics.add('chapters_skipped')
+        else:
+            pending.append((i, chapter))
+    
+    print(f"\n共 {len(chapters)} 个章节，需要生成 {len(pending)} 个"
+          f"（片段渲染 {workers} 个 worker，同时处理 {chapter_workers} 个章节）")
+    
+    def chapter_temp_name(index, chapter):
+        """章节中间文件目录的名称"""
+        return f"{index:03d}-{chapter['output'].stem}"
+    
+    def chapter_temp_dir(index, chapter):
+        """章节的中间文件目录"""
+        if temp_root is not None:
+            return temp_root / chapter_temp_name(index, chapter)
+        return intermediate_dir(chapter['output'], storage, chapter_temp_name(index, chapter))
+    
+    def render_chapter(index, chapter, segment_pool):
+        service, options = chapter_options(chapter)
+        chapter['output'].parent.mkdir(parents=True, exist_ok=True)
+        with metrics.stage('chapter', title=chapter['title']):
+            return create_video(
+                text_file=chapter['script'],
+                image_files=chapter['images'],
+                output_video=chapter['output'],
+                tts_service=service,
+                temp_dir=chapter_temp_dir(index, chapter),
+                workers=workers,
+                segment_cache=segment_cache,
+                executor=segment_pool,
+                resume=resume,
+                incremental=incremental,
+                **options
+            )
+    
+    def submit_chapter(farm_pool, index, chapter):
+        """章节作为队列任务提交，中间文件目录在 worker 上按 storage 决定（指定 temp_dir 时为其子目录）"""
+        options = dict(chapter['options'])
+        if profile is not None:
+            options['profile'] = profile
+        return farm_pool.submit_task(chapter_task(
+            chapter['title'], chapter['script'], chapter['images'], chapter['output'], options,
+            temp_dir=chapter_temp_dir(index, chapter) if temp_root is not None else None,
+            storage=storage,
+            temp_name=chapter_temp_name(index, chapter),
+            workers=workers,
+            resume=resume,
+            incremental=incremental,
+        ))
+    
+    def collect(futures):
+        for future in as_completed(futures):
+            chapter = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f"✗ {chapter['title']} 生成失败: {e}")
+                summary['failed'].append(chapter['title'])
+                metrics.add('chapters_failed')
+            else:
+                print(f"✓ {chapter['title']} 生成成功")
+                summary['rendered'].append(chapter['title'])
+                metrics.add('chapters_rendered')
+    
+    if farm is not None:
+        print(f"  分布式渲染: 章节任务写入队列 {farm.root}")
+        with FarmExecutor(farm) as farm_pool:
+            collect({submit_chapter(farm_pool, i, chapter): chapter for i, chapter in pending})
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as segment_pool, \
+                ThreadPoolExecutor(max_workers=max(1, chapter_workers)) as chapter_pool:
+            collect({
+                metrics.submit(chapter_pool, render_chapter, i, chapter, segment_pool): chapter
+                for i, chapter in pending
+            })
+    
+    if merge and merge_output is not None and not summary['failed']:
+        outputs = [chapter['output'] for chapter in chapters]
+        if incremental:
+            merge_manifest = BuildManifest(merge_output)
+            merge_fingerprint = merge_manifest.fingerprint(outputs, {'transition': transition} if transition else None)
+            up_to_date = not force and merge_manifest.is_current(merge_fingerprint)
+        else:
+            up_to_date = not force and is_up_to_date(merge_output, outputs)
+        if up_to_date:
+            print(f"⊙ 合并视频已是最新: {merge_output}")
+        else:
+            print(f"\n合并 {len(outputs)} 个章节视频...")
+            merge_output.parent.mkdir(parents=True, exist_ok=True)
+            result = merge_videos_checked(outputs, merge_output, workers=workers, transition=transition)
+            for video, diff in result['reencoded'].items():
+                print(f"  重新编码 {video.name}: {', '.join(diff)}")
+            if result['full_reencode']:
+                print("  重新编码的章节与其余章节的参数集（SPS/PPS）不同，已整体重新编码")
+            if result['transitions'] and result['transitions']['full_reencode']:
+                print(f"  转场 {transition}: 转场窗口之间的参数集（SPS/PPS）不同，已整体重新编码")
+            elif result['transitions']:
+                ranges = result['transitions']['ranges']
+                print(f"  转场 {transition}: 重新编码 {result['transitions']['windows']} 个交界窗口"
+                      + (f"和 {ranges} 段参数集不同的片段" if ranges else "")
+                      + f"，共 {result['transitions']['reencoded_seconds']:.1f} 秒")
+            if incremental:
+                merge_manifest.record(merge_fingerprint)
+            print(f"✅ 最终视频已生成: {merge_output}")
+        summary['merged'] = merge_output
+    
+    for chapter_dir in {chapter_temp_dir(i, chapter).parent for i, chapter in enumerate(chapters, 1)}:
+        try:
+            os.rmdir(chapter_dir)
+        except OSError:
+            pass  # 目录不存在或不为空
+    
+    return summary
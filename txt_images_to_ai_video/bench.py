@@ -0,0 +1,444 @@
+"""
+基准测试模块
+使用合成图片和离线占位 TTS 测量渲染流水线的各阶段耗时，输出可用于对比多次运行的 JSON 结果
+"""
+
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from . import __version__, metrics
+from .profiles import DEFAULT_PROFILE, get_profile
+from .tts import ToneTTSService
+from .video import ENGINES, create_video, run_ffmpeg
+
+
+# 默认测试矩阵
+DEFAULT_RESOLUTIONS = ('1920x1080', '3840x2160')
+DEFAULT_COUNTS = (4,)
+DEFAULT_CAMERA_EFFECTS = (None, 'zoom_in')
+DEFAULT_PROFILES = (DEFAULT_PROFILE,)
+
+# 启动耗时测试用例：名称 -> Python 解释器参数
+STARTUP_CASES = {
+    'help': ['-m', 'txt_images_to_ai_video', '--help'],
+    'generate --help': ['-m', 'txt_images_to_ai_video', 'generate', '--help'],
+    'merge_video --help': ['-m', 'txt_images_to_ai_video', 'merge_video', '--help'],
+    # merge_video 执行时导入的模块（不依赖测试视频和 ffmpeg）
+    'merge_video': ['-c', 'from txt_images_to_ai_video.video import merge_videos_simple'],
+}
+
+# 上述用例不应导入的重量级模块（TTS 客户端、HTTP 服务、异步事件循环、NumPy 等只在需要的命令中导入）
+STARTUP_HEAVY_MODULES = ('openai', 'httpx', 'pydantic', 'fire', 'numpy', 'asyncio', 'http.server')
+
+
+def parse_list(value):
+    """
+    解析逗号分隔的参数（命令行可能传入字符串、数字或元组）
+    
+    Returns:
+        list: 参数列表
+    """
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        items = value
+    else:
+        items = str(value).split(',')
+    return [str(item).strip() for item in items if str(item).strip()]
+
+
+def parse_resolution(value):
+    """
+    解析分辨率字符串
+    
+    Args:
+        value: 形如 1920x1080 的字符串
+    
+    Returns:
+        tuple: (宽, 高)
+    """
+    try:
+        width, height = (int(part) for part in str(value).lower().split('x'))
+    except ValueError:
+        raise ValueError(f"无效的分辨率: {value}（格式: 宽x高，例如 1920x1080）")
+    if width <= 0 or height <= 0:
+        raise ValueError(f"无效的分辨率: {value}")
+    return width, height
+
+
+def make_fixture_images(directory, count, resolution):
+    """
+    生成合成测试图片（ffmpeg testsrc2 图案，每张色调不同），已存在的图片直接复用
+    
+    Args:
+        directory: 输出目录
+        count: 图片数量
+        resolution: 分辨率字符串，例如 1920x1080
+    
+    Returns:
+        List[Path]: 图片路径列表
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    width, height = parse_resolution(resolution)
+    
+    images = []
+    for i in range(1, count + 1):
+        path = directory / f"{width}x{height}_{i:03d}.png"
+        if not path.exists():
+            run_ffmpeg([
+                'ffmpeg',
+                '-f', 'lavfi',
+                '-i', f"testsrc2=size={width}x{height}:rate=1",
+                '-vf', f"hue=h={i * 47 % 360}",
+                '-frames:v', '1',
+                '-y',
+                str(path)
+            ])
+        images.append(path)
+    return images
+
+
+def count_frames(video_path):
+    """
+    统计视频的帧数
+    
+    Returns:
+        int: 视频流的帧数
+    """
+    result = run_ffmpeg([
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-count_packets',
+        '-show_entries', 'stream=nb_read_packets', '-of', 'csv=p=0', str(video_path)
+    ])
+    return int(result.stdout.strip().split(',')[0])
+
+
+def environment_info():
+    """
+    记录运行环境，便于对比不同机器上的结果
+    
+    Returns:
+        dict: 环境信息
+    """
+    try:
+        ffmpeg_version = run_ffmpeg(['ffmpeg', '-version']).stdout.splitlines()[0]
+    except (OSError, IndexError):
+        ffmpeg_version = None
+    return {
+        'package_version': __version__,
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'ffmpeg': ffmpeg_version,
+    }
+
+
+def case_id(resolution, count, camera_effect, engine, workers, profile=DEFAULT_PROFILE):
+    """测试用例的唯一标识，用于和基线结果对应（默认编码配置不出现在标识中）"""
+    identifier = f"{resolution}-n{count}-{camera_effect or 'none'}-{engine}-w{workers}"
+    if profile != DEFAULT_PROFILE:
+        identifier += f"-{profile}"
+    return identifier
+
+
+def run_case(images, text_file, work_dir, tts_service, camera_effect=None, engine='segments', workers=1,
+             repeat=1, verbose=False, profile=None):
+    """
+    运行一个测试用例
+    
+    Args:
+        images: 测试图片列表
+        text_file: 旁白文本文件
+        work_dir: 用例的工作目录
+        tts_service: 占位 TTS 服务
+        camera_effect: 运镜效果
+        engine: 渲染引擎
+        workers: 并行渲染数量
+        repeat: 重复次数，结果取中位数
+        verbose: 是否输出渲染过程日志
+        profile: 编码配置名称
+    
+    Returns:
+        dict: 用例结果（端到端耗时、各阶段耗时、帧率、输出大小等）
+    """
+    work_dir = Path(work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    output_video = work_dir / "output.mp4"
+    
+    runs = []
+    for _ in range(repeat):
+        report = metrics.RunReport('bench')
+        output = io.StringIO()
+        redirect = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(output)
+        with redirect, metrics.activate(report):
+            create_video(
+                text_file=text_file,
+                image_files=images,
+                output_video=output_video,
+                tts_service=tts_service,
+                temp_dir=work_dir / "temp",
+                camera_effect=camera_effect,
+                engine=engine,
+                workers=workers,
+                profile=profile
+            )
+        runs.append(report.finish().summary())
+    
+    # 取端到端耗时为中位数的那次运行的明细
+    runs.sort(key=lambda run: run['wall_seconds'])
+    median = runs[len(runs) // 2]
+    frames = count_frames(output_video)
+    seconds = median['wall_seconds']
+    processes = median['process_totals'].values()
+    return {
+        'seconds': seconds,
+        'all_seconds': [run['wall_seconds'] for run in runs],
+        'stages': {name: round(total['seconds'], 6) for name, total in median['stage_totals'].items()},
+        'ffmpeg_cpu_seconds': round(sum(p['cpu_user'] + p['cpu_system'] for p in processes), 6),
+        'peak_rss_bytes': max((p['peak_rss_bytes'] for p in processes), default=0),
+        'frames': frames,
+        'frames_per_second': round(frames / seconds, 2) if seconds > 0 else None,
+        'output_bytes': output_video.stat().st_size,
+    }
+
+
+def load_baseline(path):
+    """
+    读取之前的基准测试结果
+    
+    Returns:
+        dict: 用例标识 -> 用例结果
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return {case['id']: case for case in data.get('cases', [])}
+
+
+def run_benchmark(output=None, resolutions=DEFAULT_RESOLUTIONS, counts=DEFAULT_COUNTS,
+                  camera_effects=DEFAULT_CAMERA_EFFECTS, engines=ENGINES, duration=10.0, workers=1, repeat=1,
+                  work_dir=None, keep=False, baseline=None, verbose=False, profiles=DEFAULT_PROFILES):
+    """
+    运行基准测试矩阵（分辨率 × 图片数量 × 运镜效果 × 渲染引擎 × 编码配置）
+    
+    每个用例使用合成图片和固定时长的占位语音，不访问网络。
+    
+    Args:
+        output: JSON 结果输出路径（可选）
+        resolutions: 图片分辨率列表，例如 ['1920x1080', '3840x2160']
+        counts: 图片数量列表
+        camera_effects: 运镜效果列表（None 表示无运镜）
+        engines: 渲染引擎列表
+        duration: 占位语音时长（秒）
+        workers: 并行渲染数量
+        repeat: 每个用例的重复次数，结果取中位数
+        work_dir: 工作目录（默认创建临时目录）
+        keep: 保留工作目录中的测试图片和输出视频
+        baseline: 基线结果 JSON 路径（可选），用于计算加速比
+        verbose: 输出渲染过程日志
+        profiles: 编码配置列表
+    
+    Returns:
+        dict: 基准测试结果
+    """
+    repeat = int(repeat)
+    if repeat < 1:
+        raise ValueError(f"repeat 必须大于等于 1: {repeat}")
+    for engine in engines:
+        if engine not in ENGINES:
+            raise ValueError(f"不支持的渲染引擎: {engine}，可选: {', '.join(ENGINES)}")
+    for resolution in resolutions:
+        parse_resolution(resolution)
+    for profile in profiles:
+        get_profile(profile)
+    
+    baseline_cases = load_baseline(baseline) if baseline else {}
+    created_work_dir = work_dir is None
+    work_dir = Path(tempfile.mkdtemp(prefix="txt_images_to_ai_video_bench_") if work_dir is None else work_dir)
+    work_dir.mkdir(parents=True, exist_ok=True)
+    
+    text_file = work_dir / "narration.txt"
+    text_file.write_text("基准测试旁白。", encoding='utf-8')
+    tts_service = ToneTTSService(duration=duration)
+    
+    results = {
+        'environment': environment_info(),
+        'parameters': {
+            'duration': duration,
+            'workers': workers,
+            'repeat': repeat,
+        },
+        'started_at': time.time(),
+        'cases': [],
+    }
+    
+    try:
+        for resolution in resolutions:
+            for count in counts:
+                images = make_fixture_images(work_dir / "images", int(count), resolution)
+                for camera_effect in camera_effects:
+                    for engine in engines:
+                        for profile in profiles:
+                            identifier = case_id(resolution, count, camera_effect, engine, workers, profile)
+                            print(f"▶ {identifier}")
+                            case = {
+                                'id': identifier,
+                                'resolution': resolution,
+                                'images': int(count),
+                                'camera_effect': camera_effect,
+                                'engine': engine,
+                                'workers': workers,
+                                'profile': profile,
+                            }
+                            case.update(run_case(
+                                images, text_file, work_dir / identifier, tts_service,
+                                camera_effect=camera_effect, engine=engine, workers=workers,
+                                repeat=repeat, verbose=verbose, profile=profile
+                            ))
+                            
+                            line = (f"  {case['seconds']:.2f} 秒，{case['frames_per_second']} 帧/秒，"
+                                    f"ffmpeg CPU {case['ffmpeg_cpu_seconds']:.2f} 秒，"
+                                    f"输出 {case['output_bytes'] / 1024 / 1024:.2f} MB")
+                            previous = baseline_cases.get(identifier)
+                            if previous:
+                                case['baseline_seconds'] = previous['seconds']
+                                case['speedup'] = round(previous['seconds'] / case['seconds'], 3)
+                                line += f"，相对基线 {case['speedup']}x"
+                            print(line)
+                            results['cases'].append(case)
+    finally:
+        if created_work_dir and not keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    
+    results['finished_at'] = time.time()
+    if output:
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 基准测试结果已保存: {output}")
+    if keep or not created_work_dir:
+        print(f"工作目录: {work_dir}")
+    return results
+
+
+def _startup_env():
+    """子进程环境：保证导入的是当前目录下的包"""
+    env = dict(os.environ)
+    package_root = str(Path(__file__).resolve().parent.parent)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [package_root, env.get('PYTHONPATH')]))
+    return env
+
+
+def _time_command(args, env):
+    """运行一次 Python 子进程，返回耗时（毫秒）"""
+    start = time.perf_counter()
+    subprocess.run([sys.executable] + args, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                   check=True)
+    return (time.perf_counter() - start) * 1000
+
+
+def imported_modules(args, env=None):
+    """
+    用 -X importtime 运行一次 Python 子进程，返回导入的模块名列表
+    
+    Args:
+        args: Python 解释器参数（例如 ['-m', 'txt_images_to_ai_video', '--help']）
+        env: 子进程环境变量（可选）
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + args, env=env, stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        # 格式: "import time: 自身耗时 | 累计耗时 | 模块名"，跳过表头
+        fields = line[len('import time:'):].split('|')
+        if line.startswith('import time:') and len(fields) == 3 and fields[0].strip().isdigit():
+            modules.append(fields[2].strip())
+    return modules
+
+
+def run_startup_benchmark(output=None, repeat=10, max_overhead_ms=None, cases=None):
+    """
+    测量命令行启动耗时，检查帮助和 merge_video 等轻量命令没有导入重量级依赖
+    
+    每个用例在新的 Python 子进程中运行 repeat 次，取中位数，并减去空解释器（python -c pass）的启动耗时
+    得到本工具的导入开销。导入了 STARTUP_HEAVY_MODULES 中的模块，或设置了 max_overhead_ms 且
+    导入开销超出时视为回归。
+    
+    Args:
+        output: JSON 结果输出路径（可选）
+        repeat: 每个用例的运行次数，结果取中位数
+        max_overhead_ms: 导入开销上限（毫秒，可选）
+        cases: 用例名称列表（默认为 STARTUP_CASES 中的全部用例）
+    
+    Returns:
+        dict: 测试结果，'passed' 表示是否没有回归
+    """
+    repeat = int(repeat)
+    if repeat < 1:
+        raise ValueError(f"repeat 必须大于等于 1: {repeat}")
+    names = list(cases or STARTUP_CASES)
+    for name in names:
+        if name not in STARTUP_CASES:
+            raise ValueError(f"不支持的启动测试用例: {name}，可选: {', '.join(STARTUP_CASES)}")
+    
+    env = _startup_env()
+    
+    def median_ms(args):
+        samples = sorted(_time_command(args, env) for _ in range(repeat))
+        return samples[len(samples) // 2]
+    
+    interpreter_ms = median_ms(['-c', 'pass'])
+    print(f"空解释器启动: {interpreter_ms:.1f} ms")
+    
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'package_version': __version__,
+        },
+        'repeat': repeat,
+        'max_overhead_ms': max_overhead_ms,
+        'interpreter_ms': round(interpreter_ms, 2),
+        'cases': [],
+    }
+    for name in names:
+        args = STARTUP_CASES[name]
+        wall_ms = median_ms(args)
+        modules = imported_modules(args, env)
+        heavy = sorted({
+            heavy for heavy in STARTUP_HEAVY_MODULES
+            for module in modules if module == heavy or module.startswith(heavy + '.')
+        })
+        overhead_ms = max(0.0, wall_ms - interpreter_ms)
+        case = {
+            'name': name,
+            'wall_ms': round(wall_ms, 2),
+            'overhead_ms': round(overhead_ms, 2),
+            'modules': len(modules),
+            'heavy_modules': heavy,
+            'passed': not heavy and (max_overhead_ms is None or overhead_ms <= float(max_overhead_ms)),
+        }
+        line = (f"{'✅' if case['passed'] else '❌'} {name}: {wall_ms:.1f} ms"
+                f"（导入开销 {overhead_ms:.1f} ms，{len(modules)} 个模块）")
+        if heavy:
+            line += f"，导入了 {', '.join(heavy)}"
+        print(line)
+        results['cases'].append(case)
+    
+    results['passed'] = all(case['passed'] for case in results['cases'])
+    if output:
+        output = Path(output)
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n✅ 启动耗时测试结果已保存: {output}")
+    return results
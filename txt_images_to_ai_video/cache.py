@@ -0,0 +1,256 @@
+"""
+缓存模块
+基于内容哈希的本地文件缓存，按总大小上限进行 LRU 淘汰
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+from . import metrics
+
+
+# 默认缓存根目录，可通过环境变量 TXT_IMAGES_TO_AI_VIDEO_CACHE 修改
+DEFAULT_CACHE_ROOT = Path(
+    os.getenv("TXT_IMAGES_TO_AI_VIDEO_CACHE", str(Path.home() / ".cache" / "txt_images_to_ai_video"))
+)
+
+
+class LRUMemo:
+    """进程内的有界结果缓存（线程安全），超过条目上限时淘汰最久未使用的条目"""
+    
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """返回缓存的结果，不存在时返回 None"""
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+    
+    def put(self, key, value):
+        """写入结果并淘汰超出上限的条目"""
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+    
+    def __len__(self):
+        return len(self._items)
+
+
+_hash_memo = LRUMemo(4096)
+
+
+def file_sha256(path):
+    """
+    计算文件内容的 SHA-256，按 (路径, 大小, 修改时间) 缓存结果
+    
+    Args:
+        path: 文件路径
+    
+    Returns:
+        str: 十六进制摘要
+    """
+    path = Path(path)
+    stat = path.stat()
+    memo_key = (str(path.resolve()), stat.st_size, stat.st_mtime_ns)
+    cached = _hash_memo.get(memo_key)
+    if cached is not None:
+        return cached
+    
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    
+    _hash_memo.put(memo_key, digest.hexdigest())
+    return digest.hexdigest()
+
+
+def make_key(*parts):
+    """
+    由任意可 JSON 序列化的参数生成缓存键
+    
+    Returns:
+        str: 十六进制摘要
+    """
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class FileCache:
+    """内容寻址的文件缓存，超过大小上限时淘汰最久未使用的条目"""
+    
+    def __init__(self, directory, max_size_mb=1024, suffix="", name=None):
+        """
+        初始化缓存
+        
+        Args:
+            directory: 缓存目录
+            max_size_mb: 缓存总大小上限（MB）
+            suffix: 缓存文件扩展名（例如 .mp4）
+            name: 缓存名称，用作运行报告中命中计数器的前缀，默认为目录名
+        """
+        self.directory = Path(directory).expanduser()
+        self.name = name or self.directory.name
+        self.max_bytes = int(max_size_mb * 1024 * 1024)
+        self.suffix = suffix
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._total_bytes = None
+        self.directory.mkdir(parents=True, exist_ok=True)
+    
+    def path_for(self, key):
+        """缓存条目的文件路径"""
+        return self.directory / key[:2] / f"{key}{self.suffix}"
+    
+    def _meta_path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+    
+    def get(self, key, output_path=None):
+        """
+        查询缓存
+        
+        Args:
+            key: 缓存键
+            output_path: 命中时复制到该路径（可选）
+        
+        Returns:
+            Path: 命中时返回缓存文件路径（或 output_path），未命中返回 None
+        """
+        path = self.path_for(key)
+        try:
+            # 更新修改时间作为最近使用时间
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            metrics.add(f"{self.name}_cache_misses")
+            return None
+        
+        with self._lock:
+            self.hits += 1
+        metrics.add(f"{self.name}_cache_hits")
+        
+        if output_path is None:
+            return path
+        output_path = Path(output_path)
+        tmp_path = output_path.with_name(f"{output_path.stem}.{uuid.uuid4().hex}.tmp{output_path.suffix}")
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, output_path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        return output_path
+    
+    def get_meta(self, key):
+        """
+        读取缓存条目的附加信息
+        
+        Returns:
+            dict: 附加信息，不存在时返回 None
+        """
+        try:
+            with open(self._meta_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def put(self, key, src_path, meta=None):
+        """
+        写入缓存（先写临时文件再重命名，保证条目完整）
+        
+        Args:
+            key: 缓存键
+            src_path: 要缓存的文件
+            meta: 附加信息字典（可选）
+        
+        Returns:
+            Path: 缓存文件路径
+        """
+        path = self.path_for(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        
+        if meta is not None:
+            meta_path = self._meta_path(key)
+            tmp_meta = meta_path.with_name(f"{meta_path.name}.{uuid.uuid4().hex}.tmp")
+            with open(tmp_meta, 'w', encoding='utf-8') as f:
+                json.dump(meta, f, ensure_ascii=False)
+            os.replace(tmp_meta, meta_path)
+        
+        tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, path)
+        
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += path.stat().st_size
+        self.evict()
+        return path
+    
+    def _entries(self):
+        entries = []
+        for path in self.directory.glob(f"*/*{self.suffix}"):
+            if path.name.endswith('.tmp') or path.suffix == '.json':
+                continue
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+    
+    def evict(self):
+        """
+        淘汰最久未使用的条目，直到总大小不超过上限
+        
+        Returns:
+            int: 被淘汰的条目数
+        """
+        with self._lock:
+            if self._total_bytes is not None and self._total_bytes <= self.max_bytes:
+                return 0
+            
+            entries = self._entries()
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                key = path.name[:len(path.name) - len(self.suffix)]
+                for stale in (path, self._meta_path(key)):
+                    try:
+                        stale.unlink()
+                    except OSError:
+                        pass
+                total -= size
+                removed += 1
+            self._total_bytes = total
+            return removed
+    
+    def stats(self):
+        """
+        缓存命中统计
+        
+        Returns:
+            dict: {'hits': 命中次数, 'misses': 未命中次数}
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses}
@@ -1,12 +1,118 @@
 """
 命令行接口模块
+
+命令的依赖（渲染模块、TTS 客户端、HTTP 服务等）在命令执行时才导入，
+查看帮助和 merge_video 等轻量命令不会加载 openai 和 asyncio。
 """
 
+import os
 import sys
-import fire
-from pathlib import Path
-from .tts import TTSService
-from .video import create_video, merge_videos_simple
+from contextlib import contextmanager
+
+
+# 帮助信息中的命令前缀
+PROG = "python -m txt_images_to_ai_video"
+
+# 可选的 TTS 后端：OpenAI API、本地 espeak 引擎、离线占位音频
+TTS_BACKENDS = ('openai', 'espeak', 'tone')
+
+# 渲染失败后提示可以恢复任务
+_RESUME_HINT = "💡 已完成的语音和片段保留在临时目录中，加上 --resume 重新运行可从中断处继续"
+
+
+def _build_segment_cache(segment_cache, segment_cache_size):
+    """根据命令行参数创建片段缓存，未启用时返回 None"""
+    if not segment_cache:
+        return None
+    from pathlib import Path
+    from .cache import DEFAULT_CACHE_ROOT, FileCache
+    
+    cache_dir = DEFAULT_CACHE_ROOT / "segments" if segment_cache is True else Path(segment_cache)
+    cache = FileCache(cache_dir, max_size_mb=segment_cache_size, suffix=".mp4", name="segment")
+    print(f"  片段缓存: {cache.directory} (上限 {segment_cache_size} MB)")
+    return cache
+
+
+def _build_tts_cache(tts_cache, tts_cache_size):
+    """根据命令行参数创建语音缓存，未启用时返回 None"""
+    if not tts_cache:
+        return None
+    from pathlib import Path
+    from .tts import TTSCache
+    
+    cache = TTSCache(None if tts_cache is True else Path(tts_cache), max_size_mb=tts_cache_size)
+    print(f"  语音缓存: {cache.directory} (上限 {tts_cache_size} MB)")
+    return cache
+
+
+def _build_tts_service(tts, tts_cache=True, tts_cache_size=512, voice=None, speed=None, model=None, batch=False,
+                       **options):
+    """
+    根据命令行参数创建 TTS 后端
+    
+    Args:
+        tts: 后端名称（openai/espeak/tone）
+        tts_cache / tts_cache_size: 语音缓存参数（仅 openai 后端使用）
+        voice / speed / model: 语音参数（可选）
+        batch: 是否包装为 BatchingTTS，合并多个章节/任务的请求
+        **options: 传给 TTSService 的其他参数（仅 openai 后端使用）
+    """
+    from .tts import BatchingTTS, EspeakTTSService, TTSService, ToneTTSService
+    
+    if tts == 'openai':
+        service = TTSService(cache=_build_tts_cache(tts_cache, tts_cache_size), **options)
+    elif tts == 'espeak':
+        print("  TTS 后端: 本地 espeak 引擎（离线）")
+        service = EspeakTTSService()
+    elif tts == 'tone':
+        print("  TTS 后端: 占位音频（离线）")
+        service = ToneTTSService()
+    else:
+        raise ValueError(f"不支持的 TTS 后端: {tts}，可选: {', '.join(TTS_BACKENDS)}")
+    service = service.with_options(voice=voice, speed=speed, model=model)
+    if batch:
+        print("  TTS 批处理: 合并同时到达的请求")
+        service = BatchingTTS(service)
+    return service
+
+
+@contextmanager
+def _shutdown(executor=None):
+    """with 块结束时（包括失败）关闭执行器，未提供时不做任何事"""
+    try:
+        yield executor
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+
+@contextmanager
+def _run_report(command, report=None, prometheus=None):
+    """
+    按命令行参数启用运行报告，结束时（包括失败）写入 JSON 报告和/或 Prometheus 指标文件
+    
+    Args:
+        command: 命令名称
+        report: JSON 报告输出路径（可选）
+        prometheus: Prometheus textfile 输出路径（可选）
+    """
+    if not report and not prometheus:
+        yield None
+        return
+    from . import metrics
+    
+    run_report = metrics.RunReport(command)
+    status = "failed"
+    try:
+        with metrics.activate(run_report):
+            yield run_report
+        status = "ok"
+    finally:
+        run_report.finish(status)
+        if report:
+            print(f"运行报告: {run_report.write_json(report)}")
+        if prometheus:
+            print(f"Prometheus 指标: {run_report.write_prometheus(prometheus)}")
 
 
 class CLI:
@@ -24,7 +130,28 @@ class CLI:
         audio_file=None,
         keep_audio=False,
         camera_effect=None,
-        effect_duration=1.5
+        effect_duration=1.5,
+        workers=1,
+        engine="segments",
+        segment_cache=None,
+        segment_cache_size=2048,
+        tts_cache=True,
+        tts_cache_size=512,
+        tts_max_chars=800,
+        tts_concurrency=4,
+        tts_retries=3,
+        tts="openai",
+        async_pipeline=False,
+        profile=None,
+        resume=False,
+        stream_audio=False,
+        incremental=False,
+        storage="output",
+        motion_engine="zoompan",
+        farm=None,
+        farm_lease=None,
+        report=None,
+        prometheus=None
     ):
         """
         将图片和旁白转化成视频
@@ -36,22 +163,63 @@ class CLI:
             voice: TTS 语音类型（alloy/echo/fable/onyx/nova/shimmer，默认: alloy）
             speed: TTS 语速，范围 0.25-4.0（默认: 1.0）
             model: TTS 模型（默认: tts-1）
-            temp_dir: 临时文件目录（默认: 输出视频所在目录下的 temp 文件夹）
+            temp_dir: 临时文件目录（默认由 storage 决定）
             audio_file: 语音文件路径（可选）：如果文件存在则使用，不存在则生成到该路径
             keep_audio: 保留生成的语音文件（默认: False）
-            camera_effect: 运镜效果类型（zoom_in/zoom_out/pan_right/pan_left，默认: None）
+            camera_effect: 运镜效果类型（zoom_in/zoom_out/pan_right/pan_left，numpy 运镜引擎还支持 kenburns:x,y,w,h:x,y,w,h[:缓动]，默认: None）
             effect_duration: 运镜效果持续时间（秒），默认: 1.5
+            workers: 并行渲染图片片段的数量（默认: 1，即串行）
+            engine: 渲染引擎（segments: 逐片段编码后合并，single_pass: 单次 ffmpeg 调用完成渲染，默认: segments）
+            segment_cache: 片段缓存目录（可选）；设为 True 时使用默认目录 ~/.cache/txt_images_to_ai_video/segments
+            segment_cache_size: 片段缓存大小上限（MB），超出时淘汰最久未使用的片段（默认: 2048）
+            tts_cache: 语音缓存目录；True 使用默认目录 ~/.cache/txt_images_to_ai_video/tts，False 关闭（默认: True）
+            tts_cache_size: 语音缓存大小上限（MB），超出时淘汰最久未使用的语音（默认: 512）
+            tts_max_chars: 长旁白按句子拆分时每段的最大字符数（默认: 800）
+            tts_concurrency: 并发合成的旁白片段数（默认: 4）
+            tts_retries: 单个旁白片段请求失败后的最大重试次数（默认: 3）
+            tts: TTS 后端（openai: OpenAI API；espeak: 本地 espeak 引擎；tone: 占位音频，均为离线，默认: openai）
+            async_pipeline: 使用异步流水线，TTS 请求期间预处理图片，片段时长确定后立即编码（默认: False）
+            profile: 编码配置（draft: 快速预览，720p/15fps/ultrafast；balanced: 默认参数；archive: 高质量 slow/CRF 18，默认: balanced）
+            resume: 从上次中断的位置继续，校验并复用临时目录中已完成的语音和片段（默认: False）
+            stream_audio: 流式合成语音，TTS 响应边接收边编码为 AAC，添加音频时直接流复制（默认: False）
+            incremental: 增量生成，输入和参数未变化时跳过，否则只重新生成变化的语音和片段（默认: False）
+            storage: 中间文件存储位置（output: 输出目录下的 temp 文件夹；local: 本机临时目录；tmpfs: 内存文件系统 /dev/shm；或目录路径，默认: output）
+            motion_engine: 运镜引擎（zoompan: ffmpeg zoompan 滤镜；numpy: NumPy 逐帧裁切缩放后通过管道编码，需要安装 numpy，只支持 segments 引擎，默认: zoompan）
+            farm: 分布式渲染的任务队列目录（可选，各节点挂载在相同路径的共享目录）：本机合成语音后，图片片段作为任务写入队列，由 farm_worker 领取渲染，本机拼接并添加音频；只支持 segments 引擎，中间文件需要放在共享目录（storage 为 output 或目录路径）
+            farm_lease: 分布式渲染的租约时长（秒），worker 超过该时长没有心跳时任务由其他 worker 重试（默认: 60）
+            report: 运行报告 JSON 输出路径（可选），记录各阶段耗时、ffmpeg CPU 时间/峰值内存和缓存命中
+            prometheus: Prometheus textfile 指标输出路径（可选），供 node_exporter textfile collector 采集
         
         示例:
             python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png --output_video=output.mp4
             python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png --output_video=output.mp4 --voice=nova --speed=1.2
             python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png --output_video=output.mp4 --camera_effect=zoom_in
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=output.mp4 --workers=4
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=output.mp4 --engine=single_pass
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=output.mp4 --segment_cache=True
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=output.mp4 --report=report.json
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=preview.mp4 --profile=draft
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=output.mp4 --resume
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=output.mp4 --incremental
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=/mnt/nas/output.mp4 --storage=tmpfs
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png --output_video=output.mp4 --camera_effect=zoom_in --motion_engine=numpy
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png --output_video=output.mp4 --camera_effect=kenburns:0,0,0.5,0.5:0.25,0.25,0.75,0.75 --motion_engine=numpy
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=scratch.mp4 --tts=espeak
+            python -m txt_images_to_ai_video generate --input_txt=script.txt --input_image=1.png,2.png,3.png --output_video=/mnt/shared/output.mp4 --farm=/mnt/shared/queue
         
         环境变量:
-            OPENAI_API_KEY     OpenAI API密钥（必需）
+            OPENAI_API_KEY     OpenAI API密钥（tts=openai 时必需）
             OPENAI_BASE_URL    OpenAI API基础URL（可选）
         """
         try:
+            import asyncio
+            from pathlib import Path
+            from .pipeline import create_video_async
+            from .profiles import DEFAULT_PROFILE
+            from .video import create_video
+            
+            profile = profile or DEFAULT_PROFILE
+            
             # 验证输入文件
             text_file = Path(input_txt)
             if not text_file.exists():
@@ -84,6 +252,18 @@ class CLI:
             print(f"  模型: {model}")
             if camera_effect:
                 print(f"  运镜效果: {camera_effect} ({effect_duration}秒)")
+            print(f"  渲染引擎: {engine}")
+            print(f"  编码配置: {profile}")
+            if resume:
+                print(f"  恢复任务: 复用临时目录中已完成的阶段")
+            if storage != "output" and not temp_dir:
+                print(f"  中间文件: {storage}")
+            if camera_effect and motion_engine != "zoompan":
+                print(f"  运镜引擎: {motion_engine}")
+            if workers > 1:
+                print(f"  并行渲染: {workers} 个 worker")
+            if farm:
+                print(f"  分布式渲染: 片段任务写入队列 {farm}")
             if audio_file:
                 audio_path = Path(audio_file)
                 if audio_path.exists():
@@ -91,30 +271,536 @@ class CLI:
                 else:
                     print(f"  语音文件: {audio_file} (将生成到此)")
             
-            tts_service = TTSService(
+            cache = _build_segment_cache(segment_cache, segment_cache_size)
+            
+            if async_pipeline and engine != "segments":
+                print(f"❌ 错误: 异步流水线只支持 segments 引擎", file=sys.stderr)
+                return False
+            
+            if farm:
+                if async_pipeline or engine != "segments":
+                    print("❌ 错误: 分布式渲染只支持 segments 引擎（不支持异步流水线）", file=sys.stderr)
+                    return False
+                if not temp_dir and storage in ("local", "tmpfs"):
+                    print("❌ 错误: 分布式渲染的中间文件需要放在各节点都能访问的目录（storage 为 output 或共享目录路径）",
+                          file=sys.stderr)
+                    return False
+            
+            # 参数检查完成后再创建 TTS 客户端，成功和失败时都关闭
+            tts_service = _build_tts_service(
+                tts,
+                tts_cache,
+                tts_cache_size,
                 voice=voice,
                 speed=speed,
-                model=model
+                model=model,
+                max_chars=tts_max_chars,
+                concurrency=tts_concurrency,
+                max_retries=tts_retries
             )
             
-            # 生成视频
-            create_video(
-                text_file=text_file,
-                image_files=image_files,
-                output_video=output_video_path,
-                tts_service=tts_service,
-                temp_dir=temp_dir,
-                audio_file=audio_file,
-                keep_audio=keep_audio,
-                camera_effect=camera_effect,
-                effect_duration=effect_duration
+            try:
+                executor = None
+                if farm:
+                    from .farm import FarmExecutor, WorkQueue
+                    
+                    executor = FarmExecutor(WorkQueue(farm, lease_seconds=farm_lease))
+                
+                # 生成视频
+                with _run_report("generate", report, prometheus), _shutdown(executor):
+                    if async_pipeline:
+                        asyncio.run(create_video_async(
+                            text_file=text_file,
+                            image_files=image_files,
+                            output_video=output_video_path,
+                            tts_service=tts_service,
+                            temp_dir=temp_dir,
+                            audio_file=audio_file,
+                            keep_audio=keep_audio,
+                            camera_effect=camera_effect,
+                            effect_duration=effect_duration,
+                            workers=workers,
+                            segment_cache=cache,
+                            profile=profile,
+                            resume=resume,
+                            stream_audio=stream_audio,
+                            incremental=incremental,
+                            storage=storage,
+                            motion_engine=motion_engine
+                        ))
+                    else:
+                        create_video(
+                            text_file=text_file,
+                            image_files=image_files,
+                            output_video=output_video_path,
+                            tts_service=tts_service,
+                            temp_dir=temp_dir,
+                            audio_file=audio_file,
+                            keep_audio=keep_audio,
+                            camera_effect=camera_effect,
+                            effect_duration=effect_duration,
+                            workers=workers,
+                            engine=engine,
+                            segment_cache=cache,
+                            profile=profile,
+                            resume=resume,
+                            stream_audio=stream_audio,
+                            incremental=incremental,
+                            storage=storage,
+                            motion_engine=motion_engine,
+                            executor=executor
+                        )
+            finally:
+                tts_service.close()
+            
+            print("\n" + "=" * 60)
+            print("✅ 处理完成！")
+            print("=" * 60)
+            return True
+        
+        except KeyboardInterrupt:
+            print("\n\n⚠️  用户中断操作", file=sys.stderr)
+            print(_RESUME_HINT, file=sys.stderr)
+            return False
+        except Exception as e:
+            print(f"\n❌ 错误: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            print(_RESUME_HINT, file=sys.stderr)
+            return False
+    
+    def batch(
+        self,
+        manifest,
+        workers=2,
+        chapter_workers=2,
+        tts_requests=4,
+        force=False,
+        merge=True,
+        temp_dir=None,
+        segment_cache=None,
+        segment_cache_size=2048,
+        tts_cache=True,
+        tts_cache_size=512,
+        tts_max_chars=800,
+        tts_concurrency=4,
+        tts_retries=3,
+        tts="openai",
+        tts_batch=False,
+        profile=None,
+        resume=False,
+        incremental=False,
+        storage="output",
+        farm=None,
+        farm_lease=None,
+        report=None,
+        prometheus=None
+    ):
+        """
+        按清单文件在一个进程内批量生成多个章节视频，并可在最后合并为完整视频
+        
+        清单支持 JSON / YAML / TOML 格式，顶层的 voice、speed、model、camera_effect、
+        effect_duration、engine、profile、motion_engine 作为所有章节的默认值，章节中可以单独覆盖。
+        
+        Args:
+            manifest: 清单文件路径
+            workers: 片段渲染线程池大小，所有章节共用（默认: 2）
+            chapter_workers: 同时处理的章节数（默认: 2）
+            tts_requests: 同时进行的 TTS API 请求数上限（默认: 4）
+            force: 忽略已有输出，全部重新生成（默认: False）
+            merge: 清单设置了 merge_output 时在最后合并所有章节（默认: True）
+            temp_dir: 临时文件根目录（默认由 storage 决定）
+            segment_cache: 片段缓存目录（可选）；设为 True 时使用默认目录
+            segment_cache_size: 片段缓存大小上限（MB）（默认: 2048）
+            tts_cache: 语音缓存目录；True 使用默认目录，False 关闭（默认: True）
+            tts_cache_size: 语音缓存大小上限（MB）（默认: 512）
+            tts_max_chars: 长旁白按句子拆分时每段的最大字符数（默认: 800）
+            tts_concurrency: 单个章节并发合成的旁白片段数（默认: 4）
+            tts_retries: 单个旁白片段请求失败后的最大重试次数（默认: 3）
+            tts: TTS 后端（openai/espeak/tone，后两者离线，默认: openai）
+            tts_batch: 合并各章节同时发出的 TTS 请求，相同的旁白只合成一次（默认: False）
+            profile: 编码配置（draft/balanced/archive，可选），设置时覆盖清单中的 profile
+            resume: 未完成的章节从上次中断的位置继续（默认: False）
+            incremental: 增量生成，按输出旁的依赖清单（输入内容哈希和参数）判断章节和合并输出是否需要重新生成（默认: False）
+            storage: 中间文件存储位置（output/local/tmpfs 或目录路径，见 generate，默认: output）
+            farm: 分布式渲染的任务队列目录（可选）：每个需要生成的章节作为一个任务写入队列，由各节点的 farm_worker 领取生成（语音、片段和拼接都在 worker 上完成），全部完成后本机合并；清单中的路径需要在各节点相同
+            farm_lease: 分布式渲染的租约时长（秒，默认: 60）
+            report: 运行报告 JSON 输出路径（可选）
+            prometheus: Prometheus textfile 指标输出路径（可选）
+        
+        示例:
+            python -m txt_images_to_ai_video batch --manifest=course.yaml
+            python -m txt_images_to_ai_video batch --manifest=course.yaml --workers=4 --chapter_workers=3
+            python -m txt_images_to_ai_video batch --manifest=course.yaml --prometheus=/var/lib/node_exporter/textfile/course.prom
+            python -m txt_images_to_ai_video batch --manifest=course.yaml --tts=tone --tts_batch
+            python -m txt_images_to_ai_video batch --manifest=course.yaml --incremental
+            python -m txt_images_to_ai_video batch --manifest=/mnt/shared/course.yaml --farm=/mnt/shared/queue
+        
+        环境变量:
+            OPENAI_API_KEY     OpenAI API密钥（tts=openai 时必需）
+            OPENAI_BASE_URL    OpenAI API基础URL（可选）
+        """
+        try:
+            from pathlib import Path
+            from .batch import run_batch
+            from .farm import WorkQueue
+            
+            manifest_path = Path(manifest)
+            if not manifest_path.exists():
+                print(f"❌ 错误: 清单文件不存在: {manifest_path}", file=sys.stderr)
+                return False
+            
+            print("=" * 60)
+            print("txt_images_to_ai_video - 批量生成")
+            print("=" * 60)
+            print(f"\n配置:")
+            print(f"  清单文件: {manifest_path}")
+            
+            cache = _build_segment_cache(segment_cache, segment_cache_size)
+            
+            # 所有章节共用一个 TTS 客户端
+            tts_service = _build_tts_service(
+                tts,
+                tts_cache,
+                tts_cache_size,
+                batch=tts_batch,
+                max_chars=tts_max_chars,
+                concurrency=tts_concurrency,
+                max_retries=tts_retries,
+                max_requests=tts_requests
             )
             
+            try:
+                with _run_report("batch", report, prometheus):
+                    summary = run_batch(
+                        manifest_path,
+                        tts_service,
+                        workers=workers,
+                        chapter_workers=chapter_workers,
+                        force=force,
+                        merge=merge,
+                        segment_cache=cache,
+                        temp_dir=temp_dir,
+                        profile=profile,
+                        resume=resume,
+                        incremental=incremental,
+                        storage=storage,
+                        farm=WorkQueue(farm, lease_seconds=farm_lease) if farm else None
+                    )
+            finally:
+                tts_service.close()
+            
             print("\n" + "=" * 60)
+            print(f"生成 {len(summary['rendered'])} 个，跳过 {len(summary['skipped'])} 个，"
+                  f"失败 {len(summary['failed'])} 个")
+            if summary['failed']:
+                print(f"❌ 失败章节: {', '.join(summary['failed'])}", file=sys.stderr)
+                print(_RESUME_HINT, file=sys.stderr)
+                return False
             print("✅ 处理完成！")
             print("=" * 60)
             return True
+        
+        except KeyboardInterrupt:
+            print("\n\n⚠️  用户中断操作", file=sys.stderr)
+            return False
+        except Exception as e:
+            print(f"\n❌ 错误: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    def farm_worker(
+        self,
+        queue,
+        workers=1,
+        worker_id=None,
+        idle_exit=None,
+        max_tasks=None,
+        segment_cache=None,
+        segment_cache_size=2048,
+        tts="openai",
+        tts_cache=True,
+        tts_cache_size=512,
+        tts_max_chars=800,
+        tts_concurrency=4,
+        tts_retries=3,
+        report=None,
+        prometheus=None
+    ):
+        """
+        分布式渲染 worker：从共享目录中的任务队列领取 generate/batch --farm 提交的片段和章节任务并执行
+        
+        可以在多台机器上同时运行（队列目录、输入和输出需要挂载在各节点相同的路径），也可以在一台机器上运行多个进程。
+        执行中的任务定期为租约心跳，worker 退出或失去响应后租约过期，任务由其他 worker 重试；结果原子发布。
+        
+        Args:
+            queue: 任务队列目录
+            workers: 同时执行的任务数（默认: 1），编码线程数按 CPU 核数平均分配
+            worker_id: worker 名称（默认: 主机名-进程号）
+            idle_exit: 连续这么多秒没有可领取的任务时退出（默认: 一直运行）
+            max_tasks: 领取这么多个任务后退出（可选）
+            segment_cache: 本节点的片段缓存目录（可选）；设为 True 时使用默认目录
+            segment_cache_size: 片段缓存大小上限（MB）（默认: 2048）
+            tts: 章节任务使用的 TTS 后端（openai/espeak/tone，默认: openai）
+            tts_cache: 语音缓存目录；True 使用默认目录，False 关闭（默认: True）
+            tts_cache_size: 语音缓存大小上限（MB）（默认: 512）
+            tts_max_chars: 长旁白按句子拆分时每段的最大字符数（默认: 800）
+            tts_concurrency: 并发合成的旁白片段数（默认: 4）
+            tts_retries: 单个旁白片段请求失败后的最大重试次数（默认: 3）
+            report: 运行报告 JSON 输出路径（可选）
+            prometheus: Prometheus textfile 指标输出路径（可选）
+        
+        示例:
+            python -m txt_images_to_ai_video farm_worker --queue=/mnt/shared/queue
+            python -m txt_images_to_ai_video farm_worker --queue=/mnt/shared/queue --workers=2 --segment_cache=True
+            python -m txt_images_to_ai_video farm_worker --queue=./queue --idle_exit=30
+        
+        环境变量:
+            OPENAI_API_KEY     OpenAI API密钥（执行章节任务且 tts=openai 时必需）
+            OPENAI_BASE_URL    OpenAI API基础URL（可选）
+        """
+        try:
+            from .farm import run_worker
+            
+            cache = _build_segment_cache(segment_cache, segment_cache_size)
+            
+            def tts_factory():
+                return _build_tts_service(
+                    tts,
+                    tts_cache,
+                    tts_cache_size,
+                    max_chars=tts_max_chars,
+                    concurrency=tts_concurrency,
+                    max_retries=tts_retries
+                )
+            
+            with _run_report("farm_worker", report, prometheus):
+                summary = run_worker(
+                    queue,
+                    workers=workers,
+                    worker_id=worker_id,
+                    tts_factory=tts_factory,
+                    segment_cache=cache,
+                    idle_exit=idle_exit,
+                    max_tasks=max_tasks
+                )
+            
+            print(f"\nworker 退出: 完成 {summary['completed']} 个任务，失败 {summary['failed']} 个")
+            return summary['failed'] == 0
+        
+        except KeyboardInterrupt:
+            print("\n\n⚠️  用户中断操作，执行中的任务已交还队列", file=sys.stderr)
+            return False
+        except Exception as e:
+            print(f"\n❌ 错误: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    def serve(
+        self,
+        host="127.0.0.1",
+        port=8000,
+        workers=2,
+        ffmpeg_workers=None,
+        tts_requests=4,
+        max_queue=100,
+        jobs_dir="jobs",
+        tts="openai",
+        tts_batch=False,
+        segment_cache=None,
+        segment_cache_size=2048,
+        tts_cache=True,
+        tts_cache_size=512,
+        tts_max_chars=800,
+        tts_concurrency=4,
+        tts_retries=3,
+        storage="output"
+    ):
+        """
+        以常驻服务方式运行：提供本地 HTTP 接口接收渲染任务，任务在进程内排队渲染
+        
+        所有任务共用一个 TTS 客户端和片段渲染线程池，避免每个视频重复启动进程和创建客户端。
+        等待队列已满时提交接口返回 503，调用方应稍后重试。
+        
+        接口:
+            POST /jobs               提交任务，JSON 字段: text 或 script、images、output（可选）、
+                                     voice、speed、model、camera_effect、effect_duration、engine、profile、motion_engine、stream_audio（可选）
+            GET  /jobs/<id>          查询任务状态（queued/running/done/failed）
+            GET  /jobs/<id>/output   下载输出视频
+            GET  /health             服务状态
+        
+        Args:
+            host: 监听地址（默认: 127.0.0.1）
+            port: 监听端口（默认: 8000）
+            workers: 同时渲染的任务数（默认: 2）
+            ffmpeg_workers: 同时编码片段的 ffmpeg 进程数上限，所有任务共用（默认: CPU 核数）
+            tts_requests: 同时进行的 TTS API 请求数上限（默认: 4）
+            max_queue: 等待队列长度上限（默认: 100）
+            jobs_dir: 任务目录，存放提交的旁白、临时文件和默认输出（默认: jobs）
+            tts: TTS 后端（openai/espeak/tone，后两者离线，可用于本地测试，默认: openai）
+            tts_batch: 合并各任务同时发出的 TTS 请求，相同的旁白只合成一次（默认: False）
+            segment_cache: 片段缓存目录（可选）；设为 True 时使用默认目录
+            segment_cache_size: 片段缓存大小上限（MB）（默认: 2048）
+            tts_cache: 语音缓存目录；True 使用默认目录，False 关闭（默认: True）
+            tts_cache_size: 语音缓存大小上限（MB）（默认: 512）
+            tts_max_chars: 长旁白按句子拆分时每段的最大字符数（默认: 800）
+            tts_concurrency: 单个任务并发合成的旁白片段数（默认: 4）
+            tts_retries: 单个旁白片段请求失败后的最大重试次数（默认: 3）
+            storage: 中间文件存储位置（output: 任务目录下的 temp 文件夹；local/tmpfs 或目录路径，见 generate，默认: output）
+        
+        示例:
+            python -m txt_images_to_ai_video serve --port=8000 --workers=4
+            python -m txt_images_to_ai_video serve --tts=tone
+            curl -X POST localhost:8000/jobs -d '{"text": "你好", "images": ["1.png"]}'
+        
+        环境变量:
+            OPENAI_API_KEY     OpenAI API密钥（tts=openai 时必需）
+            OPENAI_BASE_URL    OpenAI API基础URL（可选）
+        """
+        try:
+            from .server import RenderServer, serve
+            
+            print("=" * 60)
+            print("txt_images_to_ai_video - 渲染服务")
+            print("=" * 60)
+            print(f"\n配置:")
+            print(f"  任务目录: {jobs_dir}")
+            print(f"  渲染 worker: {workers}，等待队列上限: {max_queue}")
+            
+            cache = _build_segment_cache(segment_cache, segment_cache_size)
+            tts_service = _build_tts_service(
+                tts,
+                tts_cache,
+                tts_cache_size,
+                batch=tts_batch,
+                max_chars=tts_max_chars,
+                concurrency=tts_concurrency,
+                max_retries=tts_retries,
+                max_requests=tts_requests
+            )
+            
+            render_server = RenderServer(
+                tts_service,
+                jobs_dir=jobs_dir,
+                workers=workers,
+                ffmpeg_workers=ffmpeg_workers or os.cpu_count() or 1,
+                max_queue=max_queue,
+                segment_cache=cache,
+                storage=storage
+            )
+            try:
+                serve(render_server, host=host, port=port)
+            finally:
+                tts_service.close()
+            return True
+        
+        except KeyboardInterrupt:
+            print("\n\n⚠️  渲染服务已停止", file=sys.stderr)
+            return True
+        except Exception as e:
+            print(f"\n❌ 错误: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    def bench(
+        self,
+        output="bench.json",
+        resolutions=None,
+        counts=None,
+        camera_effects=None,
+        engines="segments,single_pass",
+        duration=10.0,
+        workers=1,
+        repeat=1,
+        work_dir=None,
+        keep=False,
+        baseline=None,
+        verbose=False,
+        profiles=None
+    ):
+        """
+        运行渲染基准测试：使用合成图片和离线占位语音（不调用 TTS API），
+        输出每种分辨率、图片数量、运镜效果和渲染引擎组合的端到端耗时、各阶段耗时、帧率和输出大小
+        
+        Args:
+            output: JSON 结果输出路径（默认: bench.json）
+            resolutions: 图片分辨率，多个用逗号分隔（默认: 1920x1080,3840x2160）
+            counts: 图片数量，多个用逗号分隔（默认: 4）
+            camera_effects: 运镜效果，多个用逗号分隔，none 表示无运镜（默认: none,zoom_in）
+            engines: 渲染引擎，多个用逗号分隔（默认: segments,single_pass）
+            duration: 占位语音时长（秒）（默认: 10）
+            workers: 并行渲染图片片段的数量（默认: 1）
+            repeat: 每个用例的重复次数，结果取中位数（默认: 1）
+            work_dir: 工作目录（默认: 临时目录，结束后删除）
+            keep: 保留测试图片和输出视频（默认: False）
+            baseline: 之前的基准测试结果 JSON（可选），输出相对基线的加速比
+            verbose: 输出渲染过程日志（默认: False）
+            profiles: 编码配置，多个用逗号分隔（默认: balanced）
+        
+        示例:
+            python -m txt_images_to_ai_video bench
+            python -m txt_images_to_ai_video bench --resolutions=3840x2160 --counts=4,16 --engines=segments --workers=4
+            python -m txt_images_to_ai_video bench --output=after.json --baseline=before.json
+            python -m txt_images_to_ai_video bench --profiles=draft,balanced,archive
+        """
+        try:
+            from .bench import (DEFAULT_CAMERA_EFFECTS, DEFAULT_COUNTS, DEFAULT_PROFILES, DEFAULT_RESOLUTIONS,
+                                parse_list, run_benchmark)
+            
+            if camera_effects is None:
+                effects = list(DEFAULT_CAMERA_EFFECTS)
+            else:
+                effects = [None if effect.lower() == "none" else effect for effect in parse_list(camera_effects)]
+            run_benchmark(
+                output=output,
+                resolutions=parse_list(resolutions) or list(DEFAULT_RESOLUTIONS),
+                counts=[int(count) for count in parse_list(counts) or DEFAULT_COUNTS],
+                camera_effects=effects,
+                engines=parse_list(engines),
+                duration=float(duration),
+                workers=int(workers),
+                repeat=repeat,
+                work_dir=work_dir,
+                keep=keep,
+                baseline=baseline,
+                verbose=verbose,
+                profiles=parse_list(profiles) or list(DEFAULT_PROFILES)
+            )
+            return True
+        except KeyboardInterrupt:
+            print("\n\n⚠️  用户中断操作", file=sys.stderr)
+            return False
+        except Exception as e:
+            print(f"\n❌ 错误: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    def bench_startup(self, output=None, repeat=10, max_overhead_ms=None):
+        """
+        测量命令行启动耗时，检查帮助和 merge_video 等轻量路径没有导入重量级依赖
+        
+        测试用例为帮助信息、generate/merge_video 帮助以及 merge_video 导入的模块，这些路径不应导入
+        openai、asyncio、http.server 等。每个用例在新的 Python 进程中运行 repeat 次取中位数，并减去空解释器的启动耗时得到导入开销。
+        导入了重量级依赖或导入开销超过 max_overhead_ms 时以退出码 1 结束，可用于 CI 回归检查。
+        
+        Args:
+            output: JSON 结果输出路径（可选）
+            repeat: 每个用例的运行次数（默认: 10）
+            max_overhead_ms: 导入开销上限（毫秒，可选）
+        
+        示例:
+            python -m txt_images_to_ai_video bench_startup
+            python -m txt_images_to_ai_video bench_startup --repeat=20 --max_overhead_ms=50 --output=startup.json
+        """
+        try:
+            from .bench import run_startup_benchmark
             
+            results = run_startup_benchmark(output=output, repeat=repeat, max_overhead_ms=max_overhead_ms)
+            return results['passed']
         except KeyboardInterrupt:
             print("\n\n⚠️  用户中断操作", file=sys.stderr)
             return False
@@ -124,20 +810,27 @@ class CLI:
             traceback.print_exc()
             return False
     
-    def merge_video(self, input, output_video):
+    def merge_video(self, input, output_video, workers=None, transition=None):
         """
         合并多个视频文件为一个视频
         
+        输入的分辨率、帧率、时间基、SAR 或音频参数不一致时，只重新编码不一致的输入，其余直接流复制。
+        
         Args:
             input: 视频文件路径，多个视频用逗号分隔（例如: a.mp4,b.mp4,c.mp4）
             output_video: 输出视频路径
+            workers: 并行读取和重新编码的数量（默认: CPU 核数）
+            transition: 相邻视频之间的转场，格式为 效果[:时长]（crossfade/fadeblack/fadewhite/wipeleft/wiperight/slideleft/slideright，时长默认 0.5 秒）；只重新编码交界处关键帧之间的短窗口，音频同步淡入淡出（默认: 无，直接硬切）
         
         示例:
             python -m txt_images_to_ai_video merge_video --input=a.mp4,b.mp4 --output_video=output.mp4
             python -m txt_images_to_ai_video merge_video --input=video1.mp4,video2.mp4,video3.mp4 --output_video=final.mp4
+            python -m txt_images_to_ai_video merge_video --input=ch1.mp4,ch2.mp4 --output_video=course.mp4 --transition=crossfade:0.5
         """
         try:
-            merge_videos_simple(input, output_video)
+            from .video import merge_videos_simple
+            
+            merge_videos_simple(input, output_video, workers=workers, transition=transition)
             return True
         except KeyboardInterrupt:
             print("\n\n⚠️  用户中断操作", file=sys.stderr)
@@ -149,7 +842,169 @@ class CLI:
             return False
 
 
-def main():
-    """主函数入口"""
-    fire.Fire(CLI)
+def _commands():
+    """CLI 的命令名称（按定义顺序）"""
+    return [name for name, value in vars(CLI).items() if not name.startswith('_') and callable(value)]
+
+
+def _cleandoc(doc):
+    """去掉文档字符串的公共缩进（同 inspect.cleandoc，避免为此导入 inspect）"""
+    lines = (doc or '').expandtabs().splitlines()
+    if not lines:
+        return ''
+    margin = min((len(line) - len(line.lstrip()) for line in lines[1:] if line.strip()), default=0)
+    lines = [lines[0].strip()] + [line[margin:].rstrip() for line in lines[1:]]
+    return '\n'.join(lines).strip('\n')
+
+
+def _parameters(func):
+    """
+    命令的参数名、默认值和必需参数（直接读取函数的代码对象，不导入 inspect）
+    
+    Returns:
+        tuple: (参数名列表, {参数名: 默认值}, 必需参数名列表)
+    """
+    code = func.__code__
+    names = list(code.co_varnames[1:code.co_argcount])  # 去掉 self
+    defaults = func.__defaults__ or ()
+    split = len(names) - len(defaults)
+    return names, dict(zip(names[split:], defaults)), names[:split]
+
+
+# 默认值为 None 的数值参数及其类型（其余参数按默认值的类型解析）
+NUMERIC_PARAMETERS = {
+    'workers': int,
+    'farm_lease': float,
+    'idle_exit': float,
+    'max_tasks': int,
+    'ffmpeg_workers': int,
+    'max_overhead_ms': float,
+}
+
+
+def _value_type(name, defaults):
+    """参数值的数值类型：默认值为整数或浮点数（不含布尔值）时为默认值的类型，其余参数为 None（保持字符串）"""
+    default = defaults.get(name)
+    if isinstance(default, (int, float)) and not isinstance(default, bool):
+        return type(default)
+    return NUMERIC_PARAMETERS.get(name) if default is None else None
+
+
+def _parse_value(text, kind=None):
+    """
+    解析参数值：True/False/None 转为对应值；kind 为 int/float 时转为数值，
+    其余保持字符串（如逗号分隔的列表、纯数字的文件名或语音名称）
+    
+    Raises:
+        ValueError: 数值参数的值无效
+    """
+    if text in ('True', 'False', 'None'):
+        return {'True': True, 'False': False, 'None': None}[text]
+    if kind is None:
+        return text
+    try:
+        value = kind(text)
+    except ValueError:
+        value = None
+    # nan、inf 等不是有效的参数值
+    if value is None or value != value or abs(value) == float('inf'):
+        raise ValueError(f"参数值应为{'整数' if kind is int else '数字'}: {text}")
+    return value
+
+
+def _parse_args(func, args):
+    """
+    解析命令参数
+    
+    支持 --name=value、--name value、按顺序的位置参数，布尔参数可以写作 --name / --noname，
+    默认值不是布尔值的参数单独写 --name（后面没有值）时为 True；参数名中的 - 等同于 _。
+    只有数值参数（默认值为整数或浮点数，或在 NUMERIC_PARAMETERS 中）的值转为数值，其余参数保持字符串。
+    
+    Returns:
+        dict: 参数名 -> 值
+    
+    Raises:
+        ValueError: 未知参数、多余的位置参数或缺少必需参数
+    """
+    names, defaults, required = _parameters(func)
+    kwargs = {}
+    positional = []
+    args = list(args)
+    while args:
+        arg = args.pop(0)
+        if not arg.startswith('--'):
+            positional.append(arg)
+            continue
+        name, has_value, value = arg[2:].partition('=')
+        name = name.replace('-', '_')
+        if has_value:
+            value = _parse_value(value, _value_type(name, defaults))
+        elif name not in names and name.startswith('no') and isinstance(defaults.get(name[2:]), bool):
+            name, value = name[2:], False
+        elif isinstance(defaults.get(name), bool):
+            value = _parse_value(args.pop(0)) if args and args[0] in ('True', 'False') else True
+        elif args and not args[0].startswith('--'):
+            value = _parse_value(args.pop(0), _value_type(name, defaults))
+        else:
+            value = True
+        if name not in names:
+            raise ValueError(f"未知参数: --{name}")
+        kwargs[name] = value
+    
+    remaining = [name for name in names if name not in kwargs]
+    if len(positional) > len(remaining):
+        raise ValueError(f"多余的参数: {' '.join(positional[len(remaining):])}")
+    for name, value in zip(remaining, positional):
+        kwargs[name] = _parse_value(value, _value_type(name, defaults))
+    missing = [name for name in required if name not in kwargs]
+    if missing:
+        raise ValueError(f"缺少必需参数: {', '.join('--' + name for name in missing)}")
+    return kwargs
+
+
+def _print_help(command=None):
+    """输出命令列表，或单个命令的用法和参数说明"""
+    if command is None:
+        print(f"{_cleandoc(CLI.__doc__)}\n\n用法: {PROG} <命令> [--参数=值 ...]\n\n命令:")
+        for name in _commands():
+            summary = _cleandoc(getattr(CLI, name).__doc__).splitlines()[0].rstrip('，：')
+            print(f"  {name:<15}{summary}")
+        print(f"\n查看命令参数: {PROG} <命令> --help")
+        return
+    func = getattr(CLI, command)
+    _, _, required = _parameters(func)
+    usage = ' '.join(f"--{name}=..." for name in required)
+    print(f"用法: {PROG} {command} {usage} [--参数=值 ...]\n")
+    print(_cleandoc(func.__doc__))
+
+
+def main(argv=None):
+    """
+    主函数入口：解析命令和参数并调用 CLI 的对应方法
+    
+    命令返回 False（失败）时以退出码 1 结束，参数错误时以退出码 2 结束。
+    
+    Args:
+        argv: 命令行参数（默认为 sys.argv[1:]）
+    """
+    args = sys.argv[1:] if argv is None else list(argv)
+    if not args or args[0] in ('-h', '--help'):
+        _print_help()
+        return
+    command, args = args[0], args[1:]
+    if command not in _commands():
+        print(f"❌ 错误: 未知命令: {command}，可选: {', '.join(_commands())}", file=sys.stderr)
+        sys.exit(2)
+    if '-h' in args or '--help' in args:
+        _print_help(command)
+        return
+    
+    try:
+        kwargs = _parse_args(getattr(CLI, command), args)
+    except ValueError as e:
+        print(f"❌ 错误: {e}", file=sys.stderr)
+        print(f"查看命令参数: {PROG} {command} --help", file=sys.stderr)
+        sys.exit(2)
+    if getattr(CLI(), command)(**kwargs) is False:
+        sys.exit(1)
 
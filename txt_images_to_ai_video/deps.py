@@ -0,0 +1,155 @@
+"""
+构建依赖模块
+在输出文件旁记录生成它的输入文件内容哈希和渲染参数（<输出文件名>.deps.json），
+输入和参数都没有变化、输出文件也未被修改时跳过重新生成
+"""
+
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+
+from .cache import file_sha256, make_key
+
+
+# 依赖清单文件后缀（位于输出文件旁）
+DEPS_SUFFIX = ".deps.json"
+DEPS_VERSION = 1
+
+
+def deps_path(output_path):
+    """输出文件对应的依赖清单路径"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + DEPS_SUFFIX)
+
+
+class BuildManifest:
+    """
+    一个输出文件的依赖清单
+    
+    输入文件的 SHA-256 连同大小和修改时间一起记录，下次检查时大小和修改时间未变的文件
+    直接复用记录的哈希，不必重新读取，未修改的章节几乎不产生 I/O。
+    
+    示例:
+        manifest = BuildManifest(output)
+        fingerprint = manifest.fingerprint([script, image], {'voice': 'nova'})
+        if not manifest.is_current(fingerprint):
+            render(...)
+            manifest.record(fingerprint)
+    """
+    
+    def __init__(self, output_path):
+        """
+        初始化依赖清单（读取上次生成时的记录）
+        
+        Args:
+            output_path: 输出文件路径
+        """
+        self.output_path = Path(output_path)
+        self.path = deps_path(output_path)
+        self.previous = self._load()
+        self.inputs = {}
+        self.params = {}
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != DEPS_VERSION:
+            return {}
+        return data
+    
+    def hash_input(self, path):
+        """
+        计算输入文件的 SHA-256，大小和修改时间与上次记录一致时复用记录的哈希
+        
+        Args:
+            path: 输入文件路径
+        
+        Returns:
+            str: 十六进制摘要
+        """
+        path = Path(path)
+        name = str(path.resolve())
+        stat = path.stat()
+        previous = (self.previous.get('inputs') or {}).get(name) or {}
+        if previous.get('size') == stat.st_size and previous.get('mtime_ns') == stat.st_mtime_ns:
+            digest = previous['sha256']
+        else:
+            digest = file_sha256(path)
+        self.inputs[name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': digest}
+        return digest
+    
+    def fingerprint(self, inputs, params=None):
+        """
+        计算输入文件（按顺序）和参数的指纹
+        
+        Args:
+            inputs: 输入文件路径列表
+            params: 影响输出的参数字典（可序列化为 JSON）
+        
+        Returns:
+            str: 指纹
+        """
+        # 经过一次 JSON 序列化，与从清单中读出的参数可以直接比较
+        self.params = json.loads(json.dumps(params or {}, ensure_ascii=False, default=str))
+        digests = [self.hash_input(path) for path in inputs]
+        return make_key('build', DEPS_VERSION, digests, self.params)
+    
+    def is_current(self, fingerprint):
+        """上次生成时的指纹与 fingerprint 一致，且输出文件存在、之后未被修改"""
+        if self.previous.get('fingerprint') != fingerprint:
+            return False
+        try:
+            stat = self.output_path.stat()
+        except OSError:
+            return False
+        output = self.previous.get('output') or {}
+        return output.get('size') == stat.st_size and output.get('mtime_ns') == stat.st_mtime_ns
+    
+    def changes(self):
+        """
+        与上次生成相比的变化（需先调用 fingerprint），用于提示重新生成的原因
+        
+        Returns:
+            List[str]: 变化说明，没有上次的记录时返回 ['首次生成']
+        """
+        if not self.previous:
+            return ["首次生成"]
+        changes = []
+        previous_inputs = self.previous.get('inputs') or {}
+        for name, entry in self.inputs.items():
+            if name not in previous_inputs:
+                changes.append(f"新增输入 {Path(name).name}")
+            elif previous_inputs[name].get('sha256') != entry['sha256']:
+                changes.append(f"{Path(name).name} 已修改")
+        for name in previous_inputs:
+            if name not in self.inputs:
+                changes.append(f"移除输入 {Path(name).name}")
+        previous_params = self.previous.get('params') or {}
+        for name in sorted(set(self.params) | set(previous_params)):
+            if self.params.get(name) != previous_params.get(name):
+                changes.append(f"参数 {name} 已修改")
+        if not changes:
+            changes.append("输出文件缺失或已被修改")
+        return changes
+    
+    def record(self, fingerprint):
+        """输出生成完成后写入依赖清单（先写临时文件再重命名）"""
+        stat = self.output_path.stat()
+        data = {
+            'version': DEPS_VERSION,
+            'fingerprint': fingerprint,
+            'output': {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns},
+            'inputs': self.inputs,
+            'params': self.params,
+            'built_at': time.time(),
+        }
+        tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+        self.previous = data
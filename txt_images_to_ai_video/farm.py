@@ -0,0 +1,666 @@
+"""
+分布式渲染模块
+协调者把片段或章节任务写入共享目录中的任务队列，各节点上的 worker 通过租约文件领取任务：
+租约靠心跳续期，持有者停止心跳（进程或节点退出）超过租约时长后由其他 worker 重新领取；
+渲染结果写入临时文件后重命名发布，协调者读取结果后完成拼接或合并
+"""
+
+import contextvars
+import json
+import os
+import socket
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from . import metrics
+from .cache import file_sha256, make_key
+from .journal import atomic_output
+from .profiles import EncoderProfile, get_profile
+from .storage import STORAGE_BACKENDS, intermediate_dir
+from .video import create_image_video, create_video
+
+
+# 租约时长（秒）：持有者超过该时长没有心跳时，任务可以被其他 worker 重新领取
+LEASE_SECONDS = 60
+
+# 每个任务的最大尝试次数（含租约过期后的重试）
+MAX_ATTEMPTS = 3
+
+# worker 和协调者轮询队列的间隔（秒）
+POLL_SECONDS = 1.0
+
+# 队列目录下的子目录
+QUEUE_DIRS = ('tasks', 'leases', 'results', 'errors', 'workers')
+
+# 队列参数（租约时长、最大尝试次数），由协调者写入，worker 读取
+CONFIG_NAME = 'queue.json'
+
+
+class TaskFailed(RuntimeError):
+    """任务的所有尝试均失败"""
+
+
+def _write_json(path, data):
+    """原子写入 JSON 文件，其他节点不会读到不完整的内容"""
+    with atomic_output(path) as tmp_path:
+        tmp_path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+    return path
+
+
+def _read_json(path):
+    """读取 JSON 文件，不存在时返回 None，内容不完整时返回空字典"""
+    try:
+        text = Path(path).read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {}
+
+
+def _is_record(name):
+    """队列目录中的记录文件（排除 atomic_output 的临时文件）"""
+    return name.endswith('.json') and '.tmp' not in name
+
+
+class WorkQueue:
+    """
+    共享目录中的任务队列
+    
+    目录结构:
+        queue.json               租约时长、最大尝试次数
+        tasks/<任务>.json         任务内容（协调者写入）
+        leases/<任务>.<n>.json    第 n 次尝试的租约（worker 独占创建，修改时间即最近一次心跳）
+        results/<任务>.json       成功结果（原子发布）
+        errors/<任务>.<n>.json    第 n 次尝试的错误信息
+        workers/<名称>            各节点的存活标记，同时用于读取共享文件系统的当前时间
+    
+    任务 ID 由任务内容决定，重复提交同一任务时复用已有结果。
+    """
+    
+    def __init__(self, root, lease_seconds=None, max_attempts=None):
+        """
+        打开（或创建）任务队列
+        
+        Args:
+            root: 队列目录（各节点挂载在相同路径的共享目录）
+            lease_seconds: 租约时长（秒），指定时写入队列参数，默认读取队列参数或使用 LEASE_SECONDS
+            max_attempts: 每个任务的最大尝试次数，指定时写入队列参数，默认读取队列参数或使用 MAX_ATTEMPTS
+        """
+        self.root = Path(root).absolute()
+        for name in QUEUE_DIRS:
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+        
+        config = _read_json(self.root / CONFIG_NAME) or {}
+        if lease_seconds is not None or max_attempts is not None:
+            config = {
+                'lease_seconds': float(lease_seconds or config.get('lease_seconds', LEASE_SECONDS)),
+                'max_attempts': int(max_attempts or config.get('max_attempts', MAX_ATTEMPTS)),
+            }
+            _write_json(self.root / CONFIG_NAME, config)
+        self.lease_seconds = float(config.get('lease_seconds', LEASE_SECONDS))
+        self.max_attempts = int(config.get('max_attempts', MAX_ATTEMPTS))
+        if self.lease_seconds <= 0 or self.max_attempts < 1:
+            raise ValueError(f"租约时长必须大于 0、最大尝试次数必须大于等于 1: {config}")
+    
+    def _path(self, kind, task_id, attempt=None):
+        name = task_id if attempt is None else f"{task_id}.{attempt}"
+        return self.root / kind / f"{name}.json"
+    
+    def _attempts(self, kind, task_id):
+        """leases/errors 中某个任务的 (尝试次序, 路径) 列表，按尝试次序排列"""
+        found = []
+        for path in (self.root / kind).glob(f"{task_id}.*.json"):
+            attempt = path.name[len(task_id) + 1:-len('.json')]
+            if attempt.isdigit():
+                found.append((int(attempt), path))
+        return sorted(found)
+    
+    def _snapshot(self):
+        """一次列出租约、错误和结果，判断多个任务的状态时不必逐个扫描目录"""
+        leases, errors = {}, set()
+        for kind in ('leases', 'errors'):
+            for entry in os.scandir(self.root / kind):
+                if not _is_record(entry.name):
+                    continue
+                task_id, _, attempt = entry.name[:-len('.json')].rpartition('.')
+                if not attempt.isdigit():
+                    continue
+                if kind == 'leases':
+                    leases.setdefault(task_id, []).append((int(attempt), Path(entry.path)))
+                else:
+                    errors.add((task_id, int(attempt)))
+        for found in leases.values():
+            found.sort()
+        results = {entry.name[:-len('.json')] for entry in os.scandir(self.root / 'results')
+                   if _is_record(entry.name)}
+        return leases, errors, results
+    
+    def now(self, name):
+        """
+        共享文件系统的当前时间：更新 workers/<name> 的修改时间后读取，
+        与租约的心跳时间来自同一个时钟，各节点的系统时间不一致时也能正确判断租约是否过期
+        """
+        marker = self.root / 'workers' / name
+        marker.touch()
+        return marker.stat().st_mtime
+    
+    def submit(self, task):
+        """
+        提交任务
+        
+        已有成功结果且输出文件仍存在时直接复用；之前所有尝试都失败的任务清除记录后重新排队。
+        
+        Args:
+            task: 任务字典（kind 为 'segment' 或 'chapter'，其余字段可序列化为 JSON）
+        
+        Returns:
+            str: 任务 ID
+        """
+        task_id = f"{task['kind']}-{make_key('farm', task)[:16]}"
+        state, _ = self.state(task_id)
+        result = self.result(task_id)
+        if state == 'failed' or (result is not None and not Path(result.get('output', '')).exists()):
+            self._clear(task_id)
+        task_path = self._path('tasks', task_id)
+        if not task_path.exists():
+            _write_json(task_path, dict(task, id=task_id))
+        return task_id
+    
+    def withdraw(self, task_id):
+        """撤回尚未领取的任务（已领取的任务会继续执行完）"""
+        try:
+            self._path('tasks', task_id).unlink()
+        except FileNotFoundError:
+            pass
+    
+    def remove(self, task_id):
+        """删除任务及其租约、结果和错误记录"""
+        self.withdraw(task_id)
+        self._clear(task_id)
+    
+    def _clear(self, task_id):
+        """删除任务的租约、结果和错误记录（保留任务内容）"""
+        paths = [path for _, path in self._attempts('leases', task_id) + self._attempts('errors', task_id)]
+        for path in paths + [self._path('results', task_id)]:
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+    
+    def result(self, task_id):
+        """任务的成功结果，尚未完成时返回 None"""
+        return _read_json(self._path('results', task_id))
+    
+    def last_error(self, task_id):
+        """任务最近一次尝试的错误信息"""
+        leases = self._attempts('leases', task_id)
+        error = _read_json(self._path('errors', task_id, leases[-1][0])) if leases else None
+        if error is None:
+            return "租约过期（worker 已退出或失去响应）"
+        return error.get('error', '未知错误')
+    
+    def _expired(self, lease_path, now):
+        """租约超过租约时长没有心跳"""
+        try:
+            return now - lease_path.stat().st_mtime > self.lease_seconds
+        except FileNotFoundError:
+            return True
+    
+    def state(self, task_id, now=None, snapshot=None):
+        """
+        任务状态
+        
+        Args:
+            task_id: 任务 ID
+            now: 共享文件系统的当前时间（见 now()），默认为本机时间
+            snapshot: _snapshot() 的结果（可选），同时判断多个任务时复用
+        
+        Returns:
+            tuple: (状态, 已开始的尝试次数)，状态为 'done'（已完成）、'running'（租约有效）、
+            'pending'（等待领取或重试）或 'failed'（所有尝试均失败）
+        """
+        leases, errors, results = snapshot or self._snapshot()
+        leases = leases.get(task_id, [])
+        attempt = leases[-1][0] if leases else 0
+        if task_id in results:
+            return 'done', attempt
+        if not leases:
+            return 'pending', 0
+        if now is None:
+            now = time.time()
+        if (task_id, attempt) not in errors and not self._expired(leases[-1][1], now):
+            return 'running', attempt
+        if attempt >= self.max_attempts:
+            return 'failed', attempt
+        return 'pending', attempt
+    
+    def claim(self, worker):
+        """
+        领取一个任务（按提交顺序）：独占创建下一次尝试的租约文件，同一次尝试只有一个 worker 能创建成功
+        
+        Args:
+            worker: worker 名称
+        
+        Returns:
+            Lease: 领取到的租约，没有可领取的任务时返回 None
+        """
+        now = self.now(worker)
+        tasks = []
+        for entry in os.scandir(self.root / 'tasks'):
+            if _is_record(entry.name):
+                try:
+                    tasks.append((entry.stat().st_mtime, entry.name[:-len('.json')]))
+                except FileNotFoundError:
+                    pass
+        
+        snapshot = self._snapshot()
+        for _, task_id in sorted(tasks):
+            state, attempt = self.state(task_id, now, snapshot)
+            if state != 'pending':
+                continue
+            lease_path = self._path('leases', task_id, attempt + 1)
+            try:
+                fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+            except FileExistsError:
+                continue
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'worker': worker, 'host': socket.gethostname(), 'pid': os.getpid(),
+                           'attempt': attempt + 1}, f, ensure_ascii=False)
+            task = _read_json(self._path('tasks', task_id))
+            if not task:
+                # 任务已被撤回
+                lease_path.unlink()
+                continue
+            return Lease(self, task, attempt + 1, lease_path, worker)
+        return None
+
+
+class Lease:
+    """已领取任务的租约：keepalive() 期间定期心跳，complete()/fail() 发布结果或错误"""
+    
+    def __init__(self, queue, task, attempt, path, worker):
+        self.queue = queue
+        self.task = task
+        self.task_id = task['id']
+        self.attempt = attempt
+        self.path = path
+        self.worker = worker
+        # 租约被接管或任务已由其他 worker 完成时设置，用于终止本次渲染
+        self.lost = threading.Event()
+    
+    def heartbeat(self):
+        """续期租约；租约已被更新的尝试接管或任务已完成时设置 lost 并返回 False"""
+        leases = self.queue._attempts('leases', self.task_id)
+        if not leases or leases[-1][0] != self.attempt or self.queue.result(self.task_id) is not None:
+            self.lost.set()
+            return False
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            self.lost.set()
+            return False
+        return True
+    
+    @contextmanager
+    def keepalive(self):
+        """with 块内每隔四分之一租约时长心跳一次，返回 lost 事件"""
+        stop = threading.Event()
+        
+        def beat():
+            while not stop.wait(self.queue.lease_seconds / 4):
+                if not self.heartbeat():
+                    return
+        
+        thread = threading.Thread(target=beat, name=f"lease-{self.task_id}", daemon=True)
+        thread.start()
+        try:
+            yield self.lost
+        finally:
+            stop.set()
+            thread.join()
+    
+    def complete(self, output, **fields):
+        """发布成功结果"""
+        _write_json(self.queue._path('results', self.task_id), dict(
+            fields, id=self.task_id, output=str(output), worker=self.worker, attempt=self.attempt,
+            finished_at=time.time(),
+        ))
+    
+    def fail(self, error):
+        """记录本次尝试失败，尝试次数未用完时任务重新等待领取"""
+        _write_json(self.queue._path('errors', self.task_id, self.attempt), {
+            'id': self.task_id, 'error': str(error), 'worker': self.worker, 'attempt': self.attempt,
+        })
+
+
+def _profile_dict(profile):
+    """编码配置的可序列化表示"""
+    return get_profile(profile)._asdict()
+
+
+def _load_profile(data):
+    """_profile_dict 的逆操作"""
+    if not isinstance(data, dict):
+        return get_profile(data)
+    size = data.get('size')
+    return EncoderProfile(**dict(data, size=tuple(size) if size else None))
+
+
+def segment_task(image_path, duration, output_path, camera_effect=None, effect_duration=1.5, prepare_dir=None,
+                 profile=None, motion_engine='zoompan', **local_options):
+    """
+    create_image_video 参数对应的 segment 任务
+    
+    任务包含图片的内容哈希，图片修改后不会复用之前的结果；编码线程数、取消事件、片段缓存和任务日志
+    只在本机有效，不写入任务（由 worker 自行决定）。
+    
+    Returns:
+        dict: 任务字典
+    """
+    return {
+        'kind': 'segment',
+        'title': Path(image_path).name,
+        'inputs': [file_sha256(image_path)],
+        'args': {
+            'image_path': str(Path(image_path).absolute()),
+            'duration': duration,
+            'output_path': str(Path(output_path).absolute()),
+            'camera_effect': camera_effect,
+            'effect_duration': effect_duration,
+            'prepare_dir': str(Path(prepare_dir).absolute()) if prepare_dir else None,
+            'profile': _profile_dict(profile),
+            'motion_engine': motion_engine,
+        },
+    }
+
+
+def chapter_task(title, text_file, image_files, output_video, options=None, temp_dir=None, storage=None,
+                 temp_name=None, workers=1, resume=False, incremental=False):
+    """
+    create_video 参数对应的 chapter 任务：语音合成、片段渲染和拼接都在领取任务的节点上完成，
+    任务包含旁白和图片的内容哈希
+    
+    Args:
+        title: 章节标题
+        text_file / image_files / output_video: 旁白、图片和输出路径（各节点都能访问的共享路径）
+        options: 章节的渲染参数（voice/speed/model 由 worker 的 TTS 服务派生，其余传给 create_video）
+        temp_dir: 中间文件目录（可选），默认在 worker 上按 storage 和 temp_name 决定
+        storage / temp_name: 见 storage.intermediate_dir
+        workers: 章节内并行渲染的片段数
+        resume / incremental: 见 create_video
+    
+    Returns:
+        dict: 任务字典
+    """
+    if storage not in (None,) + STORAGE_BACKENDS:
+        storage = str(Path(storage).absolute())
+    return {
+        'kind': 'chapter',
+        'title': title,
+        'inputs': [file_sha256(path) for path in [text_file] + list(image_files)],
+        'text_file': str(Path(text_file).absolute()),
+        'image_files': [str(Path(image).absolute()) for image in image_files],
+        'output_video': str(Path(output_video).absolute()),
+        'options': dict(options or {}),
+        'temp_dir': str(Path(temp_dir).absolute()) if temp_dir else None,
+        'storage': storage,
+        'temp_name': temp_name,
+        'workers': workers,
+        'resume': resume,
+        'incremental': incremental,
+    }
+
+
+def run_task(task, tts_service=None, cancel_event=None, threads=None, segment_cache=None):
+    """
+    执行一个队列任务
+    
+    Args:
+        task: 任务字典（segment_task / chapter_task 的结果）
+        tts_service: TTS 服务（章节任务需要），按章节的语音参数派生
+        cancel_event: threading.Event（可选），被设置时终止片段编码
+        threads: 片段编码线程数（可选）
+        segment_cache: 本节点的片段缓存 FileCache（可选）
+    
+    Returns:
+        Path: 输出路径
+    """
+    if task['kind'] == 'segment':
+        args = dict(task['args'], profile=_load_profile(task['args'].get('profile')))
+        return create_image_video(threads=threads, cancel_event=cancel_event, cache=segment_cache, **args)
+    if task['kind'] == 'chapter':
+        if tts_service is None:
+            raise ValueError("章节任务需要 TTS 服务")
+        options = dict(task['options'])
+        service = tts_service.with_options(
+            voice=options.pop('voice', None),
+            speed=options.pop('speed', None),
+            model=options.pop('model', None),
+        )
+        output_video = Path(task['output_video'])
+        output_video.parent.mkdir(parents=True, exist_ok=True)
+        temp_dir = task.get('temp_dir') or intermediate_dir(output_video, task.get('storage'), task.get('temp_name'))
+        with metrics.stage('chapter', title=task['title']):
+            return create_video(
+                text_file=Path(task['text_file']),
+                image_files=[Path(image) for image in task['image_files']],
+                output_video=output_video,
+                tts_service=service,
+                temp_dir=temp_dir,
+                workers=task.get('workers', 1),
+                segment_cache=segment_cache,
+                resume=task.get('resume', False),
+                incremental=task.get('incremental', False),
+                **options
+            )
+    raise ValueError(f"未知的任务类型: {task['kind']}")
+
+
+def run_worker(queue_dir, workers=1, worker_id=None, tts_factory=None, segment_cache=None, idle_exit=None,
+               max_tasks=None, poll=POLL_SECONDS):
+    """
+    worker 主循环：从队列领取任务并执行，最多同时执行 workers 个任务
+    
+    执行期间定期为租约心跳；任务失败时记录错误，由其他 worker（或本 worker）在尝试次数内重试。
+    中断（Ctrl+C）时终止正在进行的编码并记录错误，任务立即可以被其他 worker 领取。
+    
+    Args:
+        queue_dir: 队列目录
+        workers: 同时执行的任务数
+        worker_id: worker 名称（默认为 主机名-进程号）
+        tts_factory: 创建 TTS 服务的函数（可选），第一次执行章节任务时调用
+        segment_cache: 本节点的片段缓存 FileCache（可选）
+        idle_exit: 连续这么多秒没有可领取的任务时退出（默认一直运行）
+        max_tasks: 领取这么多个任务后退出（可选）
+        poll: 没有任务时的轮询间隔（秒）
+    
+    Returns:
+        dict: {'completed': 成功的任务数, 'failed': 失败的任务数}
+    """
+    queue = WorkQueue(queue_dir)
+    worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    workers = max(1, int(workers))
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    summary = {'completed': 0, 'failed': 0}
+    tts_lock = threading.Lock()
+    tts_services = []
+    
+    def tts_service():
+        with tts_lock:
+            if not tts_services and tts_factory is not None:
+                tts_services.append(tts_factory())
+            return tts_services[0] if tts_services else None
+    
+    def execute(lease):
+        task = lease.task
+        print(f"▶ {task['id']}（第 {lease.attempt} 次尝试）: {task.get('title', '')}")
+        started = time.monotonic()
+        try:
+            with lease.keepalive() as lost:
+                service = tts_service() if task['kind'] == 'chapter' else None
+                output = run_task(task, service, cancel_event=lost, threads=threads, segment_cache=segment_cache)
+            lease.complete(output, seconds=round(time.monotonic() - started, 3))
+        except Exception as e:
+            lease.fail(e)
+            print(f"✗ {task['id']} 失败: {e}")
+            return False
+        print(f"✓ {task['id']} 完成（{time.monotonic() - started:.1f} 秒）")
+        return True
+    
+    print(f"worker {worker_id}: 队列 {queue.root}，同时执行 {workers} 个任务"
+          f"（租约 {queue.lease_seconds:g} 秒，最多尝试 {queue.max_attempts} 次）")
+    running = {}
+    claimed = 0
+    idle_since = time.monotonic()
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            try:
+                while True:
+                    for future in [future for future in running if future.done()]:
+                        running.pop(future)
+                        summary['completed' if future.result() else 'failed'] += 1
+                    
+                    exhausted = max_tasks is not None and claimed >= max_tasks
+                    lease = queue.claim(worker_id) if len(running) < workers and not exhausted else None
+                    if lease is not None:
+                        claimed += 1
+                        running[metrics.submit(executor, execute, lease)] = lease
+                        continue
+                    
+                    if running:
+                        idle_since = time.monotonic()
+                    elif exhausted or (idle_exit is not None and time.monotonic() - idle_since >= idle_exit):
+                        break
+                    time.sleep(poll)
+            except BaseException:
+                # 终止正在进行的编码，租约记录为失败，其他 worker 可以立即重试
+                for lease in running.values():
+                    lease.lost.set()
+                raise
+    finally:
+        for service in tts_services:
+            service.close()
+    return summary
+
+
+class FarmExecutor:
+    """
+    把任务提交到共享队列的执行器
+    
+    可以代替 ThreadPoolExecutor 作为 create_video / render_segments 的 executor 参数：
+    提交的 create_image_video 调用作为 segment 任务由各节点的 worker 执行。返回的 Future
+    由后台线程轮询队列完成，任务的所有尝试均失败时抛出 TaskFailed。
+    """
+    
+    def __init__(self, queue, poll=POLL_SECONDS, name=None):
+        """
+        Args:
+            queue: WorkQueue
+            poll: 轮询结果的间隔（秒）
+            name: 协调者名称（默认为 coordinator-主机名-进程号）
+        """
+        self.queue = queue
+        self.poll = poll
+        self.name = name or f"coordinator-{socket.gethostname()}-{os.getpid()}"
+        self._pending = {}
+        self._completed = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._hinted = False
+        self._thread = threading.Thread(target=self._watch, name="farm-watch", daemon=True)
+        self._thread.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.shutdown()
+    
+    def submit(self, fn, *args, **kwargs):
+        """提交 create_image_video 调用（metrics.submit 包装的调用同样支持）"""
+        if isinstance(getattr(fn, '__self__', None), contextvars.Context):
+            fn, args = args[0], args[1:]
+        if fn is not create_image_video or args:
+            raise ValueError("分布式渲染只支持以关键字参数提交 create_image_video")
+        return self.submit_task(segment_task(**kwargs))
+    
+    def submit_task(self, task):
+        """
+        提交任务字典（segment_task / chapter_task 的结果）
+        
+        Returns:
+            Future: 结果为输出路径
+        """
+        task_id = self.queue.submit(task)
+        future = Future()
+        with self._lock:
+            self._pending[task_id] = future
+        metrics.add('farm_tasks')
+        if not self._hinted:
+            self._hinted = True
+            print(f"  任务已写入队列 {self.queue.root}，"
+                  f"由 worker 领取: python -m txt_images_to_ai_video farm_worker --queue={self.queue.root}")
+        return future
+    
+    def _watch(self):
+        while not self._stop.wait(self.poll):
+            try:
+                self.check()
+            except OSError as e:
+                print(f"⚠️  读取任务队列失败: {e}")
+    
+    def check(self):
+        """检查所有未完成任务的状态，完成对应的 Future"""
+        with self._lock:
+            pending = list(self._pending.items())
+        if not pending:
+            return
+        now = self.queue.now(self.name)
+        snapshot = self.queue._snapshot()
+        for task_id, future in pending:
+            if future.cancelled():
+                # 通知等待者（concurrent.futures.wait 只把已通知的取消视为完成）
+                future.set_running_or_notify_cancel()
+                self.queue.withdraw(task_id)
+            else:
+                state, attempt = self.queue.state(task_id, now, snapshot)
+                if state == 'done':
+                    if future.set_running_or_notify_cancel():
+                        future.set_result(Path(self.queue.result(task_id)['output']))
+                        self._completed.append(task_id)
+                    else:
+                        self.queue.withdraw(task_id)
+                elif state == 'failed':
+                    error = TaskFailed(f"任务 {task_id} 的 {attempt} 次尝试均失败: {self.queue.last_error(task_id)}")
+                    if future.set_running_or_notify_cancel():
+                        future.set_exception(error)
+                else:
+                    continue
+            with self._lock:
+                self._pending.pop(task_id, None)
+    
+    def shutdown(self, wait=True):
+        """
+        停止轮询并撤回未完成的任务
+        
+        已完成任务的记录在输出仍存在时保留（中断后重新运行可以直接复用），输出已被清理时删除；
+        失败任务的记录保留，便于排查。
+        """
+        self._stop.set()
+        if wait:
+            self._thread.join()
+        with self._lock:
+            pending, self._pending = list(self._pending.items()), {}
+        for task_id, future in pending:
+            if future.cancel():
+                future.set_running_or_notify_cancel()
+            self.queue.withdraw(task_id)
+        for task_id in self._completed:
+            result = self.queue.result(task_id) or {}
+            if not Path(result.get('output', '')).exists():
+                self.queue.remove(task_id)
@@ -0,0 +1,139 @@
+"""
+任务日志模块
+在临时目录中记录已完成的渲染阶段及其输入指纹，渲染中断后可以校验并复用已完成的中间文件
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from .cache import file_sha256
+
+
+# 任务日志文件名（位于临时目录中）
+JOURNAL_NAME = "job.json"
+JOURNAL_VERSION = 1
+
+
+@contextmanager
+def atomic_output(output_path):
+    """
+    原子写入输出文件：with 块内写入同目录下的临时文件（保留扩展名，ffmpeg 据此选择格式），
+    正常结束时重命名为 output_path，出错时删除临时文件，output_path 不会出现不完整的内容
+    
+    示例:
+        with atomic_output(output_path) as tmp_path:
+            run_ffmpeg([..., str(tmp_path)])
+    """
+    output_path = Path(output_path)
+    tmp_path = output_path.with_name(f"{output_path.stem}.{uuid.uuid4().hex}.tmp{output_path.suffix}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, output_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class JobJournal:
+    """
+    渲染任务日志
+    
+    每个已完成的阶段记录输入指纹和输出文件的大小、SHA-256。恢复时只有指纹一致、
+    输出文件存在且内容未变的阶段才会被复用，其余阶段重新执行。
+    """
+    
+    def __init__(self, directory, resume=False):
+        """
+        初始化任务日志
+        
+        Args:
+            directory: 任务的临时目录
+            resume: 是否读取已有的任务日志；为 False 时忽略之前的记录，从头开始
+        """
+        self.path = Path(directory) / JOURNAL_NAME
+        self.resume = resume
+        self.stages = {}
+        self._lock = threading.Lock()
+        if resume:
+            self.stages = self._load()
+    
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != JOURNAL_VERSION:
+            return {}
+        return dict(data.get('stages') or {})
+    
+    def _save(self):
+        """先写临时文件再重命名，进程在写入时中断也不会损坏已有的日志"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(f".{self.path.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': JOURNAL_VERSION, 'stages': self.stages}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+    
+    def completed(self, name, fingerprint, output_path=None):
+        """
+        查询已完成且仍然有效的阶段
+        
+        Args:
+            name: 阶段名称（例如 segment_001.mp4）
+            fingerprint: 阶段输入的指纹
+            output_path: 阶段的输出文件（可选），提供时校验文件大小和内容
+        
+        Returns:
+            dict: 阶段记录（包含记录时附加的字段），无效或未完成时返回 None
+        """
+        with self._lock:
+            entry = self.stages.get(name)
+        if entry is None or entry.get('fingerprint') != fingerprint:
+            return None
+        if output_path is not None:
+            output_path = Path(output_path)
+            try:
+                if output_path.stat().st_size != entry.get('size'):
+                    return None
+            except OSError:
+                return None
+            if file_sha256(output_path) != entry.get('sha256'):
+                return None
+        return entry
+    
+    def record(self, name, fingerprint, output_path=None, **fields):
+        """
+        记录一个已完成的阶段并立即写入日志文件
+        
+        Args:
+            name: 阶段名称
+            fingerprint: 阶段输入的指纹
+            output_path: 阶段的输出文件（可选）
+            **fields: 附加字段（例如音频时长），需可序列化为 JSON
+        """
+        entry = dict(fields, fingerprint=fingerprint, finished_at=time.time())
+        if output_path is not None:
+            output_path = Path(output_path)
+            entry.update(output=output_path.name, size=output_path.stat().st_size, sha256=file_sha256(output_path))
+        with self._lock:
+            self.stages[name] = entry
+            self._save()
+    
+    def is_recorded(self, output_path):
+        """输出文件是否属于已记录的阶段（失败时保留这些文件供恢复使用）"""
+        name = Path(output_path).name
+        with self._lock:
+            return any(entry.get('output') == name for entry in self.stages.values())
+    
+    def remove(self):
+        """任务完成后删除日志文件"""
+        with self._lock:
+            self.stages = {}
+            if self.path.exists():
+                self.path.unlink()
@@ -0,0 +1,669 @@
+"""
+媒体信息模块
+用纯 Python 解析 MP3 帧头（含 Xing/VBRI 标签）、WAV 文件头和 MP4 的 moov/mvhd/tkhd/stsd 等 box，
+得到时长、编码格式、分辨率、帧率、时间基和关键帧时间，无法解析的格式才调用 ffprobe；
+结果按 (路径, 大小, 修改时间) 缓存
+"""
+
+import hashlib
+import json
+import mmap
+import struct
+from math import gcd
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+from . import metrics
+from .cache import LRUMemo
+from .mp3 import read_mp3_info
+
+
+class MediaInfo(NamedTuple):
+    """
+    媒体文件信息
+    
+    video / audio 为第一个视频流和第一个音频流的参数，字段名和取值格式与 ffprobe 的 JSON 输出一致：
+    视频 codec_name、profile、width、height、pix_fmt、sample_aspect_ratio、r_frame_rate（如 '30/1'）、
+    time_base（如 '1/15360'）、extradata_hash（解码配置 avcC/hvcC 即参数集 SPS/PPS 的哈希，如 'SHA256:...'，
+    参数集只在码流中时没有该字段）；音频 codec_name、sample_rate（字符串）、channels、channel_layout。
+    """
+    format_name: str
+    duration: Optional[float]
+    video: Optional[dict] = None
+    audio: Optional[dict] = None
+    source: str = 'native'
+
+
+# 进程内缓存的条目上限（批量处理大量文件时淘汰最久未使用的条目）
+_info_memo = LRUMemo(4096)
+_keyframe_memo = LRUMemo(1024)
+
+# 声道数对应的声道布局名称（与 ffprobe 一致），其他声道数交给 ffprobe
+CHANNEL_LAYOUTS = {1: 'mono', 2: 'stereo'}
+
+# MP4/MOV 文件开头可能出现的 box 类型
+MP4_FIRST_BOXES = (b'ftyp', b'moov', b'free', b'wide', b'mdat')
+
+
+def _memo_key(path):
+    """缓存键：(绝对路径, 大小, 修改时间)"""
+    stat = path.stat()
+    return str(path.resolve()), stat.st_size, stat.st_mtime_ns
+
+
+def media_info(path):
+    """
+    读取媒体文件信息：先用纯 Python 解析，不支持的格式调用 ffprobe
+    
+    结果按 (路径, 大小, 修改时间) 缓存，同一文件重复读取时不再解析。
+    
+    Args:
+        path: 媒体文件路径
+    
+    Returns:
+        MediaInfo: 媒体信息
+    """
+    path = Path(path)
+    memo_key = _memo_key(path)
+    cached = _info_memo.get(memo_key)
+    if cached is not None:
+        metrics.add('ffprobe_avoided')
+        return cached
+    
+    info = read_media_info(path)
+    if info is None:
+        from .video import run_ffmpeg
+        
+        with metrics.stage('ffprobe', file=path.name):
+            info = parse_probe_output(run_ffmpeg(build_probe_command(path)).stdout)
+    else:
+        metrics.add('ffprobe_avoided')
+    
+    _info_memo.put(memo_key, info)
+    return info
+
+
+async def media_info_async(path):
+    """
+    读取媒体文件信息（异步版本）：纯 Python 解析只读取文件头，直接在事件循环中进行，ffprobe 使用异步子进程
+    
+    Args:
+        path: 媒体文件路径
+    
+    Returns:
+        MediaInfo: 媒体信息
+    """
+    path = Path(path)
+    memo_key = _memo_key(path)
+    cached = _info_memo.get(memo_key)
+    if cached is not None:
+        metrics.add('ffprobe_avoided')
+        return cached
+    
+    info = read_media_info(path)
+    if info is None:
+        from .video import run_ffmpeg_async
+        
+        with metrics.stage('ffprobe', file=path.name):
+            info = parse_probe_output((await run_ffmpeg_async(build_probe_command(path))).stdout)
+    else:
+        metrics.add('ffprobe_avoided')
+    
+    _info_memo.put(memo_key, info)
+    return info
+
+
+def build_probe_command(path):
+    """构建读取时长和流参数的 ffprobe 命令（JSON 输出）"""
+    fields = ('codec_type,codec_name,profile,width,height,pix_fmt,sample_aspect_ratio,r_frame_rate,time_base,'
+              'extradata_hash,sample_rate,channels,channel_layout')
+    return ['ffprobe', '-v', 'error', '-show_data_hash', 'SHA256',
+            '-show_entries', f'format=format_name,duration:stream={fields}', '-of', 'json', str(path)]
+
+
+def parse_probe_output(output):
+    """
+    解析 build_probe_command 的输出
+    
+    Returns:
+        MediaInfo: 媒体信息（source 为 'ffprobe'）
+    """
+    data = json.loads(output or '{}')
+    streams = {}
+    for stream in data.get('streams', []):
+        kind = stream.pop('codec_type', None)
+        if kind in ('video', 'audio'):
+            streams.setdefault(kind, stream)
+    fmt = data.get('format', {})
+    duration = fmt.get('duration')
+    return MediaInfo(
+        format_name=fmt.get('format_name', ''),
+        duration=float(duration) if duration not in (None, 'N/A') else None,
+        video=streams.get('video'),
+        audio=streams.get('audio'),
+        source='ffprobe',
+    )
+
+
+def read_media_info(path):
+    """
+    用纯 Python 读取 MP3、WAV、MP4（含 M4A/MOV）文件的信息，通过内存映射只读取需要的部分
+    
+    Args:
+        path: 媒体文件路径
+    
+    Returns:
+        MediaInfo: 媒体信息，格式不支持或有无法确定的参数时返回 None（由调用方改用 ffprobe）
+    """
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空文件无法映射
+            return None
+        with data:
+            try:
+                if data[:4] == b'RIFF' and data[8:12] == b'WAVE':
+                    return _read_wav(data)
+                if data[4:8] in MP4_FIRST_BOXES:
+                    return _read_mp4(data)
+                if data[:3] == b'ID3' or data[:1] == b'\xff':
+                    return _read_mp3(data)
+            except (struct.error, IndexError, KeyError, ZeroDivisionError):
+                # 文件头损坏或被截断
+                return None
+    return None
+
+
+def _read_mp3(data):
+    """MP3：时长来自 Xing/VBRI 标签或首帧比特率"""
+    mp3 = read_mp3_info(data)
+    if mp3 is None or mp3['channels'] not in CHANNEL_LAYOUTS:
+        return None
+    return MediaInfo(
+        format_name='mp3',
+        duration=mp3['duration'],
+        audio={
+            'codec_name': mp3['codec_name'],
+            'sample_rate': str(mp3['sample_rate']),
+            'channels': mp3['channels'],
+            'channel_layout': CHANNEL_LAYOUTS[mp3['channels']],
+        },
+    )
+
+
+# WAV 的 (格式标签, 位深) 对应的 ffprobe 编码名称；0xFFFE（WAVE_FORMAT_EXTENSIBLE）按子格式处理
+WAV_CODECS = {
+    (1, 8): 'pcm_u8',
+    (1, 16): 'pcm_s16le',
+    (1, 24): 'pcm_s24le',
+    (1, 32): 'pcm_s32le',
+    (3, 32): 'pcm_f32le',
+    (3, 64): 'pcm_f64le',
+    (6, 8): 'pcm_alaw',
+    (7, 8): 'pcm_mulaw',
+}
+
+
+def _read_wav(data):
+    """WAV：fmt 块给出编码参数，时长为 data 块长度除以字节率"""
+    fmt = None
+    pos = 12
+    while pos + 8 <= len(data):
+        chunk, size = struct.unpack_from('<4sI', data, pos)
+        start = pos + 8
+        if chunk == b'fmt ':
+            fmt = struct.unpack_from('<HHIIHH', data, start)
+            if fmt[0] == 0xFFFE and size >= 40:
+                # 子格式 GUID 的前两个字节为实际的格式标签
+                fmt = (struct.unpack_from('<H', data, start + 24)[0],) + fmt[1:]
+        elif chunk == b'data' and fmt is not None:
+            tag, channels, sample_rate, byte_rate, _, bits = fmt
+            codec = WAV_CODECS.get((tag, bits))
+            if codec is None or channels not in CHANNEL_LAYOUTS or not byte_rate:
+                return None
+            # 流式写入的 WAV 可能没有回填 data 块长度
+            if size == 0xFFFFFFFF or start + size > len(data):
+                size = len(data) - start
+            return MediaInfo(
+                format_name='wav',
+                duration=size / byte_rate,
+                audio={
+                    'codec_name': codec,
+                    'sample_rate': str(sample_rate),
+                    'channels': channels,
+                    'channel_layout': CHANNEL_LAYOUTS[channels],
+                },
+            )
+        pos = start + size + (size & 1)
+    return None
+
+
+def _boxes(data, start, end):
+    """遍历 [start, end) 范围内的 MP4 box，生成 (类型, 内容起点, 终点)"""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from('>I4s', data, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from('>Q', data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _child(data, start, end, *path):
+    """按类型路径查找子 box，返回 (内容起点, 终点)，找不到时返回 None"""
+    for kind in path:
+        found = next(((s, e) for k, s, e in _boxes(data, start, end) if k == kind), None)
+        if found is None:
+            return None
+        start, end = found
+    return start, end
+
+
+def _full_box_times(data, start):
+    """mvhd/mdhd 的 (时间刻度, 时长)，按 box 版本读取 32 位或 64 位字段"""
+    if data[start] == 1:
+        return struct.unpack_from('>IQ', data, start + 20)
+    return struct.unpack_from('>II', data, start + 12)
+
+
+def _fraction(num, den, separator='/'):
+    """约分后的分数字符串"""
+    divisor = gcd(num, den) or 1
+    return f"{num // divisor}{separator}{den // divisor}"
+
+
+# H.264 profile_idc 对应的 ffprobe 名称，这些 profile 只允许 8 位 4:2:0（像素格式确定为 yuv420p）
+H264_PROFILES = {66: 'Baseline', 77: 'Main', 88: 'Extended', 100: 'High'}
+
+# HEVC general_profile_idc 对应的 ffprobe 名称
+HEVC_PROFILES = {1: 'Main', 2: 'Main 10', 3: 'Main Still Picture'}
+
+# HEVC (chroma_format_idc, 亮度位深) 对应的像素格式
+HEVC_PIX_FMTS = {(1, 8): 'yuv420p', (1, 10): 'yuv420p10le'}
+
+# MP4 音频 esds 中的 objectTypeIndication 对应的编码名称
+MP4_AUDIO_CODECS = {0x40: 'aac', 0x66: 'aac', 0x67: 'aac', 0x68: 'aac', 0x69: 'mp3', 0x6B: 'mp3'}
+
+
+def _read_mp4(data):
+    """MP4：时长来自 mvhd，流参数来自各 trak 的 tkhd/mdhd/hdlr/stsd/stts"""
+    moov = _child(data, 0, len(data), b'moov')
+    if moov is None:
+        return None
+    mvhd = _child(data, *moov, b'mvhd')
+    if mvhd is None:
+        return None
+    timescale, duration = _full_box_times(data, mvhd[0])
+    if not timescale or not duration:
+        # 分片 MP4 的时长不在 mvhd 中
+        return None
+    
+    streams = {}
+    for kind, start, end in _boxes(data, *moov):
+        if kind != b'trak':
+            continue
+        reader = {b'vide': ('video', _read_video_track), b'soun': ('audio', _read_audio_track)}.get(
+            _handler(data, start, end))
+        if reader is None or reader[0] in streams:
+            continue
+        stream = reader[1](data, start, end)
+        if stream is None:
+            return None
+        streams[reader[0]] = stream
+    if not streams:
+        return None
+    return MediaInfo(
+        format_name='mp4',
+        duration=duration / timescale,
+        video=streams.get('video'),
+        audio=streams.get('audio'),
+    )
+
+
+def _handler(data, trak_start, trak_end):
+    """trak 的媒体类型（hdlr 中的 vide/soun 等），没有 hdlr 时返回 None"""
+    hdlr = _child(data, trak_start, trak_end, b'mdia', b'hdlr')
+    return data[hdlr[0] + 8:hdlr[0] + 12] if hdlr else None
+
+
+def _table(data, start, fmt):
+    """stts/stss/ctts/elst 等表格 box：版本和标志之后是条目数和按 fmt 排列的各条目"""
+    count, = struct.unpack_from('>I', data, start + 4)
+    size = struct.calcsize(fmt)
+    return [struct.unpack_from(fmt, data, start + 8 + i * size) for i in range(count)]
+
+
+def _sample_entry(data, trak_start, trak_end):
+    """trak 的 mdhd 时间刻度和 stsd 中第一个样本描述 (类型, 内容起点, 终点)"""
+    mdhd = _child(data, trak_start, trak_end, b'mdia', b'mdhd')
+    stbl = _child(data, trak_start, trak_end, b'mdia', b'minf', b'stbl')
+    if mdhd is None or stbl is None:
+        return None, None, None
+    stsd = _child(data, *stbl, b'stsd')
+    if stsd is None:
+        return None, None, None
+    entry = next(_boxes(data, stsd[0] + 8, stsd[1]), None)
+    return _full_box_times(data, mdhd[0])[0], stbl, entry
+
+
+def _read_video_track(data, trak_start, trak_end):
+    """视频轨道参数，编码格式、profile 或像素格式无法确定时返回 None"""
+    timescale, stbl, entry = _sample_entry(data, trak_start, trak_end)
+    if entry is None or not timescale:
+        return None
+    kind, start, end = entry
+    width, height = struct.unpack_from('>HH', data, start + 24)
+    # VisualSampleEntry 的固定字段共 78 字节，之后是 avcC/hvcC/pasp/colr 等子 box
+    children = {k: (s, e) for k, s, e in _boxes(data, start + 78, end)}
+    
+    if kind in (b'avc1', b'avc3') and b'avcC' in children:
+        config, config_end = children[b'avcC']
+        profile_idc, compatibility = data[config + 1], data[config + 2]
+        profile = H264_PROFILES.get(profile_idc)
+        if profile is None:
+            return None
+        # constraint_set1_flag 表示 Constrained Baseline
+        if profile_idc == 66 and compatibility & 0x40:
+            profile = 'Constrained Baseline'
+        codec, pix_fmt = 'h264', 'yuv420p'
+    elif kind in (b'hvc1', b'hev1') and b'hvcC' in children:
+        config, config_end = children[b'hvcC']
+        profile = HEVC_PROFILES.get(data[config + 1] & 0x1F)
+        pix_fmt = HEVC_PIX_FMTS.get((data[config + 16] & 0x03, (data[config + 17] & 0x07) + 8))
+        if profile is None or pix_fmt is None:
+            return None
+        codec = 'hevc'
+    else:
+        return None
+    
+    colr = children.get(b'colr')
+    if colr and data[colr[0]:colr[0] + 4] == b'nclx' and data[colr[0] + 10] & 0x80:
+        # 全范围（JPEG 色彩范围）时 ffprobe 报告 yuvj420p 等，交给 ffprobe
+        return None
+    pasp = children.get(b'pasp')
+    sample_aspect_ratio = _fraction(*struct.unpack_from('>II', data, pasp[0]), separator=':') if pasp else '1:1'
+    
+    # 帧率取 stts 中样本数最多的帧间隔
+    stts = _child(data, *stbl, b'stts')
+    if stts is None:
+        return None
+    deltas = _table(data, stts[0], '>II')
+    if not deltas:
+        return None
+    _, delta = max(deltas)
+    if not delta:
+        return None
+    return {
+        'codec_name': codec,
+        'profile': profile,
+        'width': width,
+        'height': height,
+        'pix_fmt': pix_fmt,
+        'sample_aspect_ratio': sample_aspect_ratio,
+        'r_frame_rate': _fraction(timescale, delta),
+        'time_base': f"1/{timescale}",
+        # 与 ffprobe -show_data_hash SHA256 的 extradata_hash 一致（extradata 即 avcC/hvcC 的内容）
+        'extradata_hash': f"SHA256:{hashlib.sha256(data[config:config_end]).hexdigest()}",
+    }
+
+
+def _esds_object_type(data, start, end):
+    """esds 中 DecoderConfigDescriptor 的 objectTypeIndication"""
+    pos = start + 4  # version/flags
+    
+    def descriptor(pos):
+        tag = data[pos]
+        pos += 1
+        size = 0
+        for _ in range(4):
+            byte = data[pos]
+            pos += 1
+            size = (size << 7) | (byte & 0x7F)
+            if not byte & 0x80:
+                break
+        return tag, pos, size
+    
+    tag, pos, _ = descriptor(pos)
+    if tag != 0x03:
+        return None
+    flags = data[pos + 2]
+    pos += 3
+    if flags & 0x80:
+        pos += 2
+    if flags & 0x40:
+        pos += 1 + data[pos]
+    if flags & 0x20:
+        pos += 2
+    tag, pos, _ = descriptor(pos)
+    if tag != 0x04 or pos >= end:
+        return None
+    return data[pos]
+
+
+def _read_audio_track(data, trak_start, trak_end):
+    """音频轨道参数，编码格式或声道布局无法确定时返回 None"""
+    timescale, _, entry = _sample_entry(data, trak_start, trak_end)
+    if entry is None:
+        return None
+    kind, start, end = entry
+    version, = struct.unpack_from('>H', data, start + 8)
+    if kind != b'mp4a' or version != 0:
+        # QuickTime v1/v2 音频描述的字段布局不同
+        return None
+    channels, = struct.unpack_from('>H', data, start + 16)
+    sample_rate = struct.unpack_from('>I', data, start + 24)[0] >> 16 or timescale
+    # AudioSampleEntry 的固定字段共 28 字节，之后是 esds 子 box
+    esds = _child(data, start + 28, end, b'esds')
+    codec = MP4_AUDIO_CODECS.get(_esds_object_type(data, *esds)) if esds else None
+    if codec is None or channels not in CHANNEL_LAYOUTS:
+        return None
+    return {
+        'codec_name': codec,
+        'sample_rate': str(sample_rate),
+        'channels': channels,
+        'channel_layout': CHANNEL_LAYOUTS[channels],
+    }
+
+
+def keyframe_times(path):
+    """
+    视频流关键帧的显示时间：MP4 直接读取 stss/stts/ctts/elst，其他格式调用 ffprobe 读取数据包标志
+    
+    结果与 media_info 一样按 (路径, 大小, 修改时间) 缓存。
+    
+    Args:
+        path: 视频文件路径
+    
+    Returns:
+        list: 关键帧时间（秒，升序）
+    """
+    path = Path(path)
+    memo_key = _memo_key(path)
+    cached = _keyframe_memo.get(memo_key)
+    if cached is not None:
+        return cached
+    
+    times = read_keyframe_times(path)
+    if times is None:
+        from .video import run_ffmpeg
+        
+        with metrics.stage('ffprobe', file=path.name):
+            times = parse_keyframe_output(run_ffmpeg(build_keyframe_probe_command(path)).stdout)
+    else:
+        metrics.add('ffprobe_avoided')
+    
+    _keyframe_memo.put(memo_key, times)
+    return times
+
+
+def build_keyframe_probe_command(path):
+    """构建列出第一个视频流各数据包显示时间和标志的 ffprobe 命令（只读取数据包，不解码）"""
+    return ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+            '-of', 'csv=p=0', str(path)]
+
+
+def parse_keyframe_output(output):
+    """解析 build_keyframe_probe_command 的输出，返回关键帧时间（秒，升序）"""
+    times = []
+    for line in (output or '').splitlines():
+        pts_time, _, flags = line.strip().partition(',')
+        if 'K' in flags and pts_time not in ('', 'N/A'):
+            times.append(float(pts_time))
+    return sorted(times)
+
+
+def read_keyframe_times(path):
+    """
+    用纯 Python 读取 MP4（含 MOV）第一个视频轨道的关键帧时间
+    
+    Returns:
+        list: 关键帧时间（秒，升序），不是 MP4 或无法确定时返回 None（由调用方改用 ffprobe）
+    """
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+        with data:
+            if data[4:8] not in MP4_FIRST_BOXES:
+                return None
+            try:
+                return _mp4_keyframes(data)
+            except (struct.error, IndexError):
+                return None
+
+
+def _mp4_keyframes(data):
+    """关键帧显示时间 = 解码时间（stts）+ 显示偏移（ctts）- 编辑列表起点（elst）"""
+    trak = _video_trak(data)
+    if trak is None:
+        return None
+    mdhd = _child(data, *trak, b'mdia', b'mdhd')
+    stbl = _child(data, *trak, b'mdia', b'minf', b'stbl')
+    stts = _child(data, *stbl, b'stts') if stbl else None
+    if mdhd is None or stts is None:
+        return None
+    timescale = _full_box_times(data, mdhd[0])[0]
+    shift = _edit_start(data, *trak)
+    if not timescale or shift is None:
+        return None
+    
+    decode = _table(data, stts[0], '>II')
+    sample_count = sum(count for count, _ in decode)
+    stss = _child(data, *stbl, b'stss')
+    # 没有 stss 时所有样本都是关键帧
+    numbers = [number for number, in _table(data, stss[0], '>I')] if stss else list(range(1, sample_count + 1))
+    ctts = _child(data, *stbl, b'ctts')
+    offsets = _table(data, ctts[0], '>Ii' if data[ctts[0]] == 1 else '>II') if ctts else [(sample_count, 0)]
+    
+    decode_times = _run_values(decode, numbers, accumulate=True)
+    composition_offsets = _run_values(offsets, numbers, accumulate=False)
+    if not numbers or len(decode_times) != len(numbers) or len(composition_offsets) != len(numbers):
+        return None
+    return sorted((dts + offset - shift) / timescale for dts, offset in zip(decode_times, composition_offsets))
+
+
+def _video_trak(data):
+    """第一个视频 trak 的 (内容起点, 终点)，找不到时返回 None"""
+    moov = _child(data, 0, len(data), b'moov')
+    if moov is None:
+        return None
+    return next(((s, e) for k, s, e in _boxes(data, *moov) if k == b'trak' and _handler(data, s, e) == b'vide'),
+                None)
+
+
+def _edit_start(data, trak_start, trak_end):
+    """编辑列表中第一段媒体的起点（媒体时间刻度），以空白段开头（延迟显示）时返回 None"""
+    elst = _child(data, trak_start, trak_end, b'edts', b'elst')
+    if elst is None:
+        return 0
+    entries = _table(data, elst[0], '>QqI' if data[elst[0]] == 1 else '>IiI')
+    if not entries:
+        return 0
+    media_time = entries[0][1]
+    return None if media_time < 0 else media_time
+
+
+def _run_values(entries, numbers, accumulate):
+    """
+    按 stts/ctts 的 (样本数, 值) 游程表求各样本（序号从 1 开始，升序）对应的值
+    
+    accumulate 为 True 时为之前所有样本的值之和（stts 的解码时间），否则为样本所在条目的值（ctts 的显示偏移）。
+    样本序号超出表格范围时返回的列表比 numbers 短。
+    """
+    values = []
+    numbers = iter(numbers)
+    number = next(numbers, None)
+    first, total = 1, 0
+    for count, value in entries:
+        while number is not None and number < first + count:
+            values.append(total + (number - first) * value if accumulate else value)
+            number = next(numbers, None)
+        first += count
+        total += count * value
+    return values
+
+
+def read_encoder_options(path):
+    """
+    读取 MP4 第一个视频样本中 x264 写入的版本信息 SEI（"x264 - core ... - options: cabac=1 ref=3 ..."），
+    得到编码时的参数（重新编码时用于生成相同的参数集，见 video.x264_params）
+    
+    Args:
+        path: 视频文件路径
+    
+    Returns:
+        dict: {参数名: 值}（值均为字符串），不是 MP4、不是 x264 编码或找不到 SEI 时返回 None
+    """
+    with open(path, 'rb') as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            return None
+        with data:
+            if data[4:8] not in MP4_FIRST_BOXES:
+                return None
+            try:
+                sample = _first_video_sample(data)
+            except (struct.error, IndexError):
+                return None
+    if sample is None:
+        return None
+    start = sample.find(b'x264 - core')
+    if start < 0:
+        return None
+    options = sample.find(b'options: ', start)
+    end = sample.find(b'\x00', start)
+    if options < 0:
+        return None
+    text = sample[options + len(b'options: '):end if end > options else len(sample)].decode('ascii', 'replace')
+    return dict(item.partition('=')[::2] for item in text.split())
+
+
+def _first_video_sample(data):
+    """第一个视频轨道第一个样本的内容（第一个块的起点，大小来自 stsz）"""
+    trak = _video_trak(data)
+    stbl = _child(data, *trak, b'mdia', b'minf', b'stbl') if trak else None
+    if stbl is None:
+        return None
+    stsz = _child(data, *stbl, b'stsz')
+    stco = _child(data, *stbl, b'stco')
+    chunks = stco or _child(data, *stbl, b'co64')
+    if stsz is None or chunks is None:
+        return None
+    size, count = struct.unpack_from('>II', data, stsz[0] + 4)
+    if not count:
+        return None
+    if not size:
+        size, = struct.unpack_from('>I', data, stsz[0] + 12)
+    if not struct.unpack_from('>I', data, chunks[0] + 4)[0]:
+        return None
+    offset, = struct.unpack_from('>I' if stco else '>Q', data, chunks[0] + 8)
+    return bytes(data[offset:offset + size])
@@ -0,0 +1,262 @@
+"""
+运行指标模块
+记录各阶段耗时、ffmpeg 子进程的 CPU 时间和峰值内存、临时文件写入量，
+并输出 JSON 报告或 Prometheus textfile 格式的指标文件
+"""
+
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+
+# 当前生效的运行报告；线程池任务通过 submit 继承，asyncio 任务自动继承
+_current_report = contextvars.ContextVar('txt_images_to_ai_video_report', default=None)
+
+# Prometheus 指标名前缀
+METRIC_PREFIX = "txt_images_to_ai_video"
+
+
+class RunReport:
+    """一次运行的指标记录"""
+    
+    def __init__(self, command="generate", labels=None):
+        """
+        初始化运行报告
+        
+        Args:
+            command: 命令名称（generate/batch 等），作为报告和指标的标签
+            labels: 额外的标签字典（可选），例如 {'host': 'render-01'}
+        """
+        import socket  # 只在启用运行报告时需要，不在模块导入时加载
+        
+        self.command = command
+        self.labels = dict(labels or {})
+        self.labels.setdefault('host', socket.gethostname())
+        self.started_at = time.time()
+        self.finished_at = None
+        self.status = None
+        self.stages = []
+        self.processes = []
+        self.counters = {}
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+    
+    def record_stage(self, name, seconds, **fields):
+        """记录一个阶段的耗时及附加字段"""
+        entry = {'stage': name, 'seconds': round(seconds, 6)}
+        entry.update(fields)
+        with self._lock:
+            self.stages.append(entry)
+    
+    def record_process(self, cmd, seconds, returncode, cpu_user=None, cpu_system=None, max_rss_bytes=None):
+        """记录一个子进程的耗时和资源占用（平台不支持时 CPU/内存为 None）"""
+        entry = {
+            'program': Path(str(cmd[0])).name,
+            'seconds': round(seconds, 6),
+            'returncode': returncode,
+            'cpu_user': cpu_user,
+            'cpu_system': cpu_system,
+            'max_rss_bytes': max_rss_bytes,
+        }
+        with self._lock:
+            self.processes.append(entry)
+    
+    def add(self, name, value=1):
+        """累加计数器"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def finish(self, status="ok"):
+        """标记运行结束，status 为 ok 或 failed"""
+        if self.finished_at is None:
+            self.status = status
+            self.finished_at = time.time()
+            self.wall_seconds = time.perf_counter() - self._start
+        return self
+    
+    def summary(self):
+        """
+        汇总报告
+        
+        Returns:
+            dict: 可序列化为 JSON 的报告内容
+        """
+        with self._lock:
+            stages = list(self.stages)
+            processes = list(self.processes)
+            counters = dict(self.counters)
+        
+        stage_totals = {}
+        for entry in stages:
+            total = stage_totals.setdefault(entry['stage'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+            total['count'] += 1
+            total['seconds'] += entry['seconds']
+            total['max_seconds'] = max(total['max_seconds'], entry['seconds'])
+        
+        process_totals = {}
+        for entry in processes:
+            total = process_totals.setdefault(entry['program'], {
+                'count': 0, 'seconds': 0.0, 'cpu_user': 0.0, 'cpu_system': 0.0, 'peak_rss_bytes': 0,
+            })
+            total['count'] += 1
+            total['seconds'] += entry['seconds']
+            total['cpu_user'] += entry['cpu_user'] or 0.0
+            total['cpu_system'] += entry['cpu_system'] or 0.0
+            total['peak_rss_bytes'] = max(total['peak_rss_bytes'], entry['max_rss_bytes'] or 0)
+        
+        wall_seconds = getattr(self, 'wall_seconds', time.perf_counter() - self._start)
+        return {
+            'command': self.command,
+            'labels': self.labels,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'wall_seconds': round(wall_seconds, 6),
+            'stage_totals': stage_totals,
+            'process_totals': process_totals,
+            'counters': counters,
+            'stages': stages,
+            'processes': processes,
+        }
+    
+    def write_json(self, path):
+        """写入 JSON 报告"""
+        _write_atomic(path, json.dumps(self.summary(), ensure_ascii=False, indent=2))
+        return Path(path)
+    
+    def write_prometheus(self, path):
+        """写入 Prometheus textfile collector 格式的指标文件"""
+        summary = self.summary()
+        base_labels = dict(self.labels, command=self.command)
+        lines = []
+        
+        def metric(name, help_text, samples):
+            lines.append(f"# HELP {METRIC_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+            for labels, value in samples:
+                lines.append(f"{METRIC_PREFIX}_{name}{{{_format_labels(dict(base_labels, **labels))}}} {value}")
+        
+        metric('run_seconds', 'Wall time of the last run.', [({}, summary['wall_seconds'])])
+        metric('run_success', 'Whether the last run succeeded (1) or failed (0).',
+               [({}, 1 if summary['status'] == 'ok' else 0)])
+        metric('run_finished_timestamp_seconds', 'Unix time the last run finished.',
+               [({}, summary['finished_at'] or time.time())])
+        metric('stage_seconds', 'Total time spent in each stage.',
+               [({'stage': name}, total['seconds']) for name, total in summary['stage_totals'].items()])
+        metric('stage_count', 'Number of times each stage ran.',
+               [({'stage': name}, total['count']) for name, total in summary['stage_totals'].items()])
+        metric('process_cpu_seconds', 'CPU time of child processes.',
+               [({'program': name, 'mode': mode}, total[f'cpu_{mode}'])
+                for name, total in summary['process_totals'].items() for mode in ('user', 'system')])
+        metric('process_peak_rss_bytes', 'Peak resident set size of child processes.',
+               [({'program': name}, total['peak_rss_bytes']) for name, total in summary['process_totals'].items()])
+        metric('counter', 'Run counters (cache hits, bytes written, ...).',
+               [({'name': name}, value) for name, value in summary['counters'].items()])
+        
+        _write_atomic(path, '\n'.join(lines) + '\n')
+        return Path(path)
+
+
+def _format_labels(labels):
+    escaped = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        escaped.append(f'{key}="{value}"')
+    return ','.join(escaped)
+
+
+def _write_atomic(path, content):
+    """先写临时文件再重命名，避免采集方读到不完整的文件"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def current():
+    """
+    当前生效的运行报告
+    
+    Returns:
+        RunReport: 未启用指标记录时返回 None
+    """
+    return _current_report.get()
+
+
+@contextmanager
+def activate(report):
+    """在 with 块内启用运行报告"""
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+
+
+@contextmanager
+def stage(name, **fields):
+    """
+    记录 with 块的耗时；块内可以通过返回的字典补充字段
+    
+    示例:
+        with metrics.stage('segment', image='1.png') as info:
+            info['cache_hit'] = True
+    """
+    report = _current_report.get()
+    info = dict(fields)
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        if report is not None:
+            report.record_stage(name, time.perf_counter() - start, **info)
+
+
+def add(name, value=1):
+    """累加当前运行报告的计数器（未启用时忽略）"""
+    report = _current_report.get()
+    if report is not None:
+        report.add(name, value)
+
+
+def record_process(cmd, seconds, returncode, rusage=None):
+    """记录子进程资源占用（未启用时忽略）"""
+    report = _current_report.get()
+    if report is None:
+        return
+    if rusage is None:
+        report.record_process(cmd, seconds, returncode)
+        return
+    # Linux 上 ru_maxrss 单位为 KB，macOS 上为字节
+    max_rss = rusage.ru_maxrss if sys.platform == 'darwin' else rusage.ru_maxrss * 1024
+    report.record_process(cmd, seconds, returncode, rusage.ru_utime, rusage.ru_stime, max_rss)
+
+
+def submit(executor, func, *args, **kwargs):
+    """向线程池提交任务，任务在提交方的上下文（含当前运行报告）中执行"""
+    return executor.submit(contextvars.copy_context().run, func, *args, **kwargs)
+
+
+def directory_size(path):
+    """
+    统计目录下所有文件的总大小
+    
+    Returns:
+        int: 字节数，目录不存在时为 0
+    """
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
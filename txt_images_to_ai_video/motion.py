@@ -0,0 +1,319 @@
+"""
+运镜模块
+用 NumPy 逐帧计算裁剪窗口（亚像素精度、缓动曲线）并双线性缩放，生成运镜部分的原始帧，
+由调用方通过管道送入 ffmpeg 编码，替代 zoompan 表达式
+"""
+
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+
+# 内置运镜效果的缩放倍数（与 video.EFFECT_MAX_ZOOM 一致）
+DEFAULT_ZOOM = 1.2
+
+# 可选的运镜引擎：ffmpeg zoompan 滤镜（默认）或 NumPy 逐帧生成
+MOTION_ENGINES = ('zoompan', 'numpy')
+
+# 自定义 Ken Burns 效果的写法：kenburns:x,y,w,h:x,y,w,h[:缓动曲线]
+KENBURNS_PREFIX = "kenburns:"
+
+# 帧生成算法版本，修改采样方式时递增，使片段缓存失效
+MOTION_VERSION = 1
+
+# 缓动曲线：输入为 0~1 的进度数组，返回调整后的进度
+EASINGS = {
+    'linear': lambda t: t,
+    'ease_in': lambda t: t * t,
+    'ease_out': lambda t: 1 - (1 - t) * (1 - t),
+    'ease_in_out': lambda t: t * t * (3 - 2 * t),
+}
+
+
+class MotionPath(NamedTuple):
+    """
+    运镜路径：裁剪窗口从 start 移动到 end
+    
+    矩形为 (x, y, w, h)，取值为画布宽高的比例（0~1）；宽高比与输出不一致时按输出宽高比
+    以中心向外扩展，超出画布时缩小并移回画布内。
+    """
+    start: Tuple[float, float, float, float]
+    end: Tuple[float, float, float, float]
+    easing: str = 'ease_in_out'
+    
+    def describe(self):
+        """运镜路径的文本表示，用于片段缓存键"""
+        return f"motion{MOTION_VERSION}:{list(self.start)}:{list(self.end)}:{self.easing}"
+
+
+def _zoom_rect(zoom, x=0.5, y=0.5):
+    """按缩放倍数得到的裁剪窗口，x/y 为窗口在可移动范围内的位置（0.5 为居中）"""
+    size = 1 / zoom
+    return ((1 - size) * x, (1 - size) * y, size, size)
+
+
+_FULL = (0.0, 0.0, 1.0, 1.0)
+
+# 内置运镜效果（与 zoompan 实现的方向一致：zoom_in 从 1.2 倍缩放到 1 倍，zoom_out 相反）
+MOTIONS = {
+    'zoom_in': MotionPath(_zoom_rect(DEFAULT_ZOOM), _FULL),
+    'zoom_out': MotionPath(_FULL, _zoom_rect(DEFAULT_ZOOM)),
+    'pan_right': MotionPath(_zoom_rect(DEFAULT_ZOOM, x=0), _zoom_rect(DEFAULT_ZOOM, x=1)),
+    'pan_left': MotionPath(_zoom_rect(DEFAULT_ZOOM, x=1), _zoom_rect(DEFAULT_ZOOM, x=0)),
+}
+
+
+def register_motion(name, start, end, easing='ease_in_out'):
+    """
+    注册自定义运镜效果，之后可以作为 camera_effect 使用（numpy 运镜引擎）
+    
+    Args:
+        name: 效果名称
+        start / end: 起止裁剪窗口 (x, y, w, h)，取值为画布宽高的比例
+        easing: 缓动曲线（linear/ease_in/ease_out/ease_in_out）
+    
+    Returns:
+        MotionPath: 注册的运镜路径
+    """
+    path = _validate(MotionPath(tuple(start), tuple(end), easing))
+    MOTIONS[name] = path
+    return path
+
+
+def _validate(path):
+    if path.easing not in EASINGS:
+        raise ValueError(f"不支持的缓动曲线: {path.easing}，可选: {', '.join(EASINGS)}")
+    for rect in (path.start, path.end):
+        if len(rect) != 4:
+            raise ValueError(f"裁剪窗口需要 4 个值 (x, y, w, h): {rect}")
+        x, y, w, h = rect
+        if not (w > 0 and h > 0 and 0 <= x and 0 <= y and x + w <= 1 + 1e-9 and y + h <= 1 + 1e-9):
+            raise ValueError(f"裁剪窗口超出画布（取值为画布宽高的比例）: {rect}")
+    return path
+
+
+def get_motion(camera_effect):
+    """
+    获取运镜路径
+    
+    Args:
+        camera_effect: 效果名称，或 kenburns:x,y,w,h:x,y,w,h[:缓动曲线]
+    
+    Returns:
+        MotionPath: 运镜路径，不是运镜效果时返回 None
+    """
+    if not isinstance(camera_effect, str):
+        return None
+    if camera_effect in MOTIONS:
+        return MOTIONS[camera_effect]
+    if not camera_effect.startswith(KENBURNS_PREFIX):
+        return None
+    parts = camera_effect[len(KENBURNS_PREFIX):].split(':')
+    if len(parts) not in (2, 3):
+        raise ValueError(f"Ken Burns 效果格式应为 kenburns:x,y,w,h:x,y,w,h[:缓动曲线]: {camera_effect}")
+    try:
+        start, end = (tuple(float(value) for value in part.split(',')) for part in parts[:2])
+    except ValueError:
+        raise ValueError(f"Ken Burns 裁剪窗口应为逗号分隔的数字: {camera_effect}")
+    return _validate(MotionPath(start, end, *parts[2:]))
+
+
+def motion_available():
+    """是否已安装 NumPy"""
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _require_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError("numpy 运镜引擎需要安装 NumPy: pip install 'txt_images_to_ai_video[numpy]'")
+    return numpy
+
+
+def load_image(image_path):
+    """
+    读取图片为 RGB 数组
+    
+    直接解析未压缩的 BMP（预处理图片）和 PPM（P6），其他格式返回 None，由调用方先转换。
+    
+    Args:
+        image_path: 图片路径
+    
+    Returns:
+        numpy.ndarray: (高, 宽, 3) 的 uint8 数组，格式不支持时返回 None
+    """
+    np = _require_numpy()
+    data = Path(image_path).read_bytes()
+    if data[:2] == b'BM':
+        return _parse_bmp(np, data)
+    if data[:2] == b'P6':
+        return _parse_ppm(np, data)
+    return None
+
+
+def _parse_bmp(np, data):
+    """解析 BI_RGB 24 位或 32 位（BGRA/BGRX）BMP"""
+    offset = int.from_bytes(data[10:14], 'little')
+    width = int.from_bytes(data[18:22], 'little', signed=True)
+    height = int.from_bytes(data[22:26], 'little', signed=True)
+    bits = int.from_bytes(data[28:30], 'little')
+    compression = int.from_bytes(data[30:34], 'little')
+    if bits not in (24, 32) or compression not in (0, 3) or width <= 0 or height == 0:
+        return None
+    if compression == 3 and data[54:66] != b'\x00\x00\xff\x00\x00\xff\x00\x00\xff\x00\x00\x00':
+        return None  # 通道顺序不是 BGRA
+    channels = bits // 8
+    stride = (width * channels + 3) // 4 * 4
+    rows = np.frombuffer(data, dtype=np.uint8, count=stride * abs(height), offset=offset)
+    pixels = rows.reshape(abs(height), stride)[:, :width * channels].reshape(abs(height), width, channels)
+    if height > 0:
+        pixels = pixels[::-1]  # 高度为正时行从下到上存储
+    return np.ascontiguousarray(pixels[:, :, 2::-1])
+
+
+def _parse_ppm(np, data):
+    """解析 8 位 P6 PPM（头部不含注释）"""
+    fields = data.split(maxsplit=4)
+    if len(fields) < 5 or int(fields[3]) != 255:
+        return None
+    width, height = int(fields[1]), int(fields[2])
+    pixels = np.frombuffer(data, dtype=np.uint8, count=width * height * 3, offset=len(data) - width * height * 3)
+    return pixels.reshape(height, width, 3)
+
+
+def write_ppm(frame, path):
+    """将 RGB 帧写为 PPM 图片（ffmpeg 可以直接作为 -loop 1 输入）"""
+    height, width = frame.shape[:2]
+    with open(path, 'wb') as f:
+        f.write(f"P6\n{width} {height}\n255\n".encode('ascii'))
+        f.write(frame.tobytes())
+    return Path(path)
+
+
+class MotionRenderer:
+    """
+    按裁剪窗口从同一张图片生成输出帧
+    
+    图片只转换一次为浮点数组，中间结果和输出帧使用预先分配的缓冲区，每帧复用，不重新分配内存。
+    返回的帧在下一次调用 render 时被覆盖，需在此之前写出。
+    
+    示例:
+        renderer = MotionRenderer(image, (1920, 1080))
+        for rect in motion_rects(MOTIONS['zoom_in'], 45, (image.shape[1], image.shape[0]), (1920, 1080)):
+            pipe.write(renderer.render(rect))
+    """
+    
+    def __init__(self, image, size):
+        """
+        初始化帧生成器
+        
+        Args:
+            image: (高, 宽, 3) 的 uint8 RGB 数组（画布）
+            size: 输出分辨率 (宽, 高)
+        """
+        np = _require_numpy()
+        self._np = np
+        self.image = image.astype(np.float32)
+        self.width, self.height = size
+        source_height, source_width = image.shape[:2]
+        self._max_x = source_width - 1
+        self._max_y = source_height - 1
+        # 输出像素中心在裁剪窗口中的相对位置
+        self._x_steps = (np.arange(self.width, dtype=np.float64) + 0.5) / self.width
+        self._y_steps = (np.arange(self.height, dtype=np.float64) + 0.5) / self.height
+        self._top = np.empty((self.height, source_width, 3), dtype=np.float32)
+        self._bottom = np.empty_like(self._top)
+        self._left = np.empty((self.height, self.width, 3), dtype=np.float32)
+        self._right = np.empty_like(self._left)
+        self._frame = np.empty((self.height, self.width, 3), dtype=np.uint8)
+    
+    def _sample(self, start, length, steps, limit):
+        """一个方向上的采样位置：两侧的像素下标和插值权重"""
+        np = self._np
+        positions = np.clip(start + steps * length - 0.5, 0, limit)
+        lower = np.floor(positions).astype(np.intp)
+        upper = np.minimum(lower + 1, limit)
+        return lower, upper, (positions - lower).astype(np.float32)
+    
+    def render(self, rect):
+        """
+        生成一帧：裁剪窗口 rect = (x, y, w, h)（画布像素坐标，可以是小数）双线性缩放到输出分辨率
+        
+        Returns:
+            numpy.ndarray: (高, 宽, 3) 的 uint8 帧（内部缓冲区）
+        """
+        np = self._np
+        x, y, w, h = rect
+        top_rows, bottom_rows, y_weight = self._sample(y, h, self._y_steps, self._max_y)
+        left_cols, right_cols, x_weight = self._sample(x, w, self._x_steps, self._max_x)
+        
+        # 先在垂直方向插值（只处理用到的行），再在水平方向插值
+        np.take(self.image, top_rows, axis=0, out=self._top)
+        np.take(self.image, bottom_rows, axis=0, out=self._bottom)
+        self._bottom -= self._top
+        self._bottom *= y_weight[:, None, None]
+        self._top += self._bottom
+        
+        np.take(self._top, left_cols, axis=1, out=self._left)
+        np.take(self._top, right_cols, axis=1, out=self._right)
+        self._right -= self._left
+        self._right *= x_weight[None, :, None]
+        self._left += self._right
+        
+        self._left += 0.5  # 四舍五入
+        np.copyto(self._frame, self._left, casting='unsafe')
+        return self._frame
+
+
+def fit_rect(rect, canvas_size, aspect):
+    """
+    将比例矩形转换为画布像素坐标，并按输出宽高比以中心向外扩展、限制在画布内
+    
+    Returns:
+        tuple: (x, y, w, h) 画布像素坐标
+    """
+    canvas_width, canvas_height = canvas_size
+    x, y, w, h = rect
+    x, y, w, h = x * canvas_width, y * canvas_height, w * canvas_width, h * canvas_height
+    center_x, center_y = x + w / 2, y + h / 2
+    if w / h < aspect:
+        w = h * aspect
+    else:
+        h = w / aspect
+    scale = min(1.0, canvas_width / w, canvas_height / h)
+    w, h = w * scale, h * scale
+    x = min(max(center_x - w / 2, 0.0), canvas_width - w)
+    y = min(max(center_y - h / 2, 0.0), canvas_height - h)
+    return x, y, w, h
+
+
+def motion_rects(path, frames, canvas_size, size):
+    """
+    运镜部分每一帧的裁剪窗口（按缓动曲线插值，向量化计算）
+    
+    第 i 帧的进度为 i / frames，运镜结束后的画面（进度 1）由 final_rect 给出。
+    
+    Args:
+        path: MotionPath
+        frames: 运镜帧数
+        canvas_size: 画布尺寸 (宽, 高)
+        size: 输出分辨率 (宽, 高)
+    
+    Returns:
+        numpy.ndarray: (frames, 4) 的裁剪窗口数组（画布像素坐标）
+    """
+    np = _require_numpy()
+    aspect = size[0] / size[1]
+    start = np.array(fit_rect(path.start, canvas_size, aspect))
+    end = np.array(fit_rect(path.end, canvas_size, aspect))
+    progress = EASINGS[path.easing](np.arange(frames, dtype=np.float64) / frames)
+    return start + (end - start) * progress[:, None]
+
+
+def final_rect(path, canvas_size, size):
+    """运镜结束时的裁剪窗口（画布像素坐标）"""
+    return fit_rect(path.end, canvas_size, size[0] / size[1])
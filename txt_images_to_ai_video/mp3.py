@@ -0,0 +1,227 @@
+"""
+MP3 帧解析模块
+按 MPEG 音频帧头增量累计 MP3 数据流的时长，TTS 响应流接收完成时即可得到音频时长，无需再调用 ffprobe；
+完整的 MP3 文件由 Xing/Info、VBRI 标签或首帧比特率直接得到时长
+"""
+
+import struct
+
+
+# 比特率表（kbps），按 (MPEG 版本是否为 1, 层) 索引，下标为帧头中的比特率索引
+_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+
+# 采样率表，按帧头中的版本位索引（0: MPEG 2.5，2: MPEG 2，3: MPEG 1）
+_SAMPLE_RATES = {
+    0: (11025, 12000, 8000),
+    2: (22050, 24000, 16000),
+    3: (44100, 48000, 32000),
+}
+
+
+def parse_frame_header(header):
+    """
+    解析 4 字节的 MPEG 音频帧头
+    
+    Args:
+        header: 帧头字节
+    
+    Returns:
+        tuple: (帧长度（字节）, 每帧采样数, 采样率, 声道数)，不是有效帧头时返回 None
+    """
+    if len(header) < 4 or header[0] != 0xFF or header[1] & 0xE0 != 0xE0:
+        return None
+    version = (header[1] >> 3) & 0x03
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    bitrate_index = header[2] >> 4
+    rate_index = (header[2] >> 2) & 0x03
+    # 保留值和自由格式比特率（无法从帧头得到帧长度）视为无效帧头
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    
+    mpeg1 = version == 3
+    bitrate = _BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (header[2] >> 1) & 0x01
+    channels = 1 if header[3] >> 6 == 3 else 2
+    
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if mpeg1 or layer == 2 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return length, samples, sample_rate, channels
+
+
+def _frame_layout(header):
+    """有效帧头的 (是否为 MPEG 1, 层, 比特率)"""
+    mpeg1 = (header[1] >> 3) & 0x03 == 3
+    layer = 4 - ((header[1] >> 1) & 0x03)
+    return mpeg1, layer, _BITRATES[(mpeg1, layer)][header[2] >> 4] * 1000
+
+
+def _side_info_size(mpeg1, channels):
+    """Layer III 帧头之后的 side information 长度，Xing/Info 标签紧随其后"""
+    if mpeg1:
+        return 17 if channels == 1 else 32
+    return 9 if channels == 1 else 17
+
+
+class MP3DurationCounter:
+    """
+    增量累计 MP3 数据流的帧数和时长
+    
+    跳过开头的 ID3v2 标签和编码器写入的 Xing/Info 信息帧（不含音频），
+    遇到无法识别的数据时逐字节重新同步。
+    
+    示例:
+        counter = MP3DurationCounter()
+        for data in response.iter_bytes():
+            counter.feed(data)
+        counter.duration
+    """
+    
+    def __init__(self):
+        self.frames = 0
+        self.samples = 0
+        self.sample_rate = None
+        self._buffer = b''
+        self._skip = 0
+        self._at_start = True
+    
+    def feed(self, data):
+        """输入下一段数据"""
+        buffer = self._buffer + data
+        pos = 0
+        while True:
+            if self._skip:
+                step = min(self._skip, len(buffer) - pos)
+                pos += step
+                self._skip -= step
+                if self._skip:
+                    break
+            
+            available = len(buffer) - pos
+            if self._at_start and buffer[pos:pos + 3] == b'ID3'[:available]:
+                if available < 10:
+                    break
+                # ID3v2 标签长度为 4 个 7 位字节（syncsafe），设置了 footer 标志时另有 10 字节
+                size = 0
+                for byte in buffer[pos + 6:pos + 10]:
+                    size = (size << 7) | (byte & 0x7F)
+                self._skip = 10 + size + (10 if buffer[pos + 5] & 0x10 else 0)
+                continue
+            if available < 4:
+                break
+            
+            frame = parse_frame_header(buffer[pos:pos + 4])
+            if frame is None:
+                pos += 1
+                continue
+            length, samples, sample_rate, channels = frame
+            
+            if self._at_start:
+                # 第一帧可能是 Xing/Info 信息帧，需要读到标签位置才能判断
+                offset = 4 + _side_info_size(sample_rate >= 32000, channels)
+                if available < min(length, offset + 4):
+                    break
+                self._at_start = False
+                if buffer[pos + offset:pos + offset + 4] in (b'Xing', b'Info'):
+                    self._skip = length
+                    continue
+            
+            self.frames += 1
+            self.samples += samples
+            self.sample_rate = sample_rate
+            self._skip = length
+        self._buffer = buffer[pos:]
+    
+    @property
+    def duration(self):
+        """
+        已接收音频的时长
+        
+        Returns:
+            float: 时长（秒），尚未识别到音频帧时返回 None
+        """
+        if not self.sample_rate:
+            return None
+        return self.samples / self.sample_rate
+
+
+# 查找第一帧时最多扫描的字节数（跳过 ID3v2 标签之后）
+_SYNC_SEARCH_BYTES = 64 * 1024
+
+
+def _id3v2_size(data):
+    """开头 ID3v2 标签的总长度，没有标签时为 0"""
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    return 10 + size + (10 if data[5] & 0x10 else 0)
+
+
+def _first_frame(data, start):
+    """查找第一个有效帧（其后紧跟另一个有效帧或文件结束），返回 (位置, 帧信息)"""
+    end = min(len(data) - 4, start + _SYNC_SEARCH_BYTES)
+    pos = data.find(b'\xff', start, end + 1)
+    while 0 <= pos <= end:
+        frame = parse_frame_header(data[pos:pos + 4])
+        if frame is not None:
+            following = pos + frame[0]
+            if following >= len(data) - 128 or parse_frame_header(data[following:following + 4]) is not None:
+                return pos, frame
+        pos = data.find(b'\xff', pos + 1, end + 1)
+    return None, None
+
+
+def read_mp3_info(data):
+    """
+    读取完整 MP3 文件的时长和流参数，不逐帧扫描
+    
+    有 Xing/Info 或 VBRI 标签时按标签中的总帧数计算时长（与 ffprobe 相同），
+    否则按首帧比特率估算（CBR 文件）。
+    
+    Args:
+        data: 文件内容（bytes 或 mmap）
+    
+    Returns:
+        dict: codec_name、duration、sample_rate、channels、bit_rate，不是 MP3 数据时返回 None
+    """
+    pos, frame = _first_frame(data, _id3v2_size(data))
+    if frame is None:
+        return None
+    length, samples, sample_rate, channels = frame
+    mpeg1, layer, bitrate = _frame_layout(data[pos:pos + 4])
+    
+    frames = None
+    xing = pos + 4 + _side_info_size(mpeg1, channels)
+    if data[xing:xing + 4] in (b'Xing', b'Info') and len(data) >= xing + 12:
+        flags, count = struct.unpack_from('>II', data, xing + 4)
+        if flags & 0x01:
+            frames = count
+    elif data[pos + 36:pos + 40] == b'VBRI' and len(data) >= pos + 54:
+        frames = struct.unpack_from('>I', data, pos + 50)[0]
+    
+    if frames:
+        duration = frames * samples / sample_rate
+    else:
+        # 没有帧数标签时按 CBR 估算，排除结尾的 ID3v1 标签
+        end = len(data) - (128 if len(data) >= 128 and data[-128:-125] == b'TAG' else 0)
+        duration = (end - pos) * 8 / bitrate
+    return {
+        'codec_name': ('mp1', 'mp2', 'mp3')[layer - 1],
+        'duration': duration,
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'bit_rate': bitrate,
+    }
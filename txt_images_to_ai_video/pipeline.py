@@ -0,0 +1,486 @@
+"""
+异步渲染流水线
+TTS 网络请求与图片预处理、片段编码重叠进行
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from pathlib import Path
+
+from . import metrics
+from .cache import make_key
+from .journal import JobJournal, atomic_output
+from .video import (
+    build_concat_command,
+    build_dependencies,
+    build_mux_command,
+    build_mux_reencode_command,
+    build_segment_commands,
+    build_prepare_image_command,
+    check_motion_engine,
+    estimate_section_durations,
+    get_audio_duration_async,
+    has_camera_effect,
+    merge_bytes_saved,
+    mux_reencode_size,
+    prepared_image_path,
+    prune_intermediates,
+    render_motion_segment,
+    run_ffmpeg_async,
+    section_part_paths,
+    sections_key,
+    segment_cache_key,
+    segment_filter,
+    split_sections,
+    use_static_clip,
+    uses_motion_engine,
+    write_concat_list,
+)
+from .profiles import get_profile
+from .storage import intermediate_dir
+
+
+async def _in_thread(func, *args, **kwargs):
+    """在默认线程池中执行阻塞函数（文件哈希、缓存复制等），函数在当前上下文中执行"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(None, functools.partial(context.run, func, *args, **kwargs))
+
+
+async def _in_thread_cancellable(func, *args, **kwargs):
+    """
+    在线程中执行接受 cancel_event 参数的阻塞函数（numpy 运镜渲染等）
+    
+    取消协程不会停止线程：协程被取消时设置 cancel_event，等待线程退出（函数终止 ffmpeg 后抛出 RenderCancelled）
+    再继续抛出 CancelledError，之后清理临时文件时线程已不再写入。
+    """
+    cancel_event = threading.Event()
+    future = asyncio.ensure_future(_in_thread(func, *args, cancel_event=cancel_event, **kwargs))
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        cancel_event.set()
+        await asyncio.gather(future, return_exceptions=True)
+        raise
+
+
+async def prepare_image_async(image_path, directory, camera_effect=None, profile=None):
+    """
+    prepare_image 的异步版本：解码一次源图片，缩放到渲染所需的尺寸并保存为 BMP
+    
+    Args:
+        image_path: 源图片路径
+        directory: 预处理图片的存放目录
+        camera_effect: 运镜效果（None 表示无运镜）
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        Path: 预处理后的图片路径
+    """
+    output_path = await _in_thread(prepared_image_path, image_path, directory, camera_effect, profile)
+    with metrics.stage('prepare_image', image=Path(image_path).name) as info:
+        info['cache_hit'] = output_path.exists()
+        if not info['cache_hit']:
+            with atomic_output(output_path) as tmp_path:
+                await run_ffmpeg_async(build_prepare_image_command(image_path, tmp_path, camera_effect, profile))
+    return output_path
+
+
+async def _render_segment_async(task, prepared, duration, semaphore, cache, journal=None):
+    """
+    等待图片预处理完成和片段时长确定后编码片段
+    
+    Args:
+        task: 片段任务字典（image_path、output_path、camera_effect、effect_duration、threads、profile、motion_engine）
+        prepared: 图片预处理任务
+        duration: 片段时长 Future
+        semaphore: 限制同时运行的 ffmpeg 数量
+        cache: 片段缓存 FileCache（可选）
+        journal: 任务日志 JobJournal（可选）
+    
+    Returns:
+        Path: 片段输出路径
+    """
+    prepared_path = await prepared
+    duration = await duration
+    output_path = Path(task['output_path'])
+    camera_effect = task.get('camera_effect')
+    effect_duration = task.get('effect_duration', 1.5)
+    profile = get_profile(task.get('profile'))
+    motion_engine = task.get('motion_engine', 'zoompan')
+    
+    # 图片在时长确定前按运镜效果预处理；片段太短不应用运镜时改为按无运镜重新预处理
+    # （numpy 引擎的预处理图片本来就不带运镜余量）
+    if camera_effect and motion_engine != 'numpy' and not has_camera_effect(camera_effect, duration, effect_duration):
+        prepared_path = await prepare_image_async(task['image_path'], prepared_path.parent, profile=profile)
+    
+    static_clip = use_static_clip(duration, camera_effect, effect_duration)
+    with metrics.stage('create_image_video', image=Path(task['image_path']).name, duration=duration,
+                       static_clip=static_clip) as info:
+        if cache is not None or journal is not None:
+            # 缓存键使用源图片内容，与同步渲染共享缓存
+            video_filter = segment_filter(duration, camera_effect, effect_duration, profile, motion_engine)
+            cache_key = await _in_thread(
+                segment_cache_key, task['image_path'], duration, video_filter, static_clip, profile
+            )
+        if journal is not None:
+            info['resumed'] = await _in_thread(journal.completed, output_path.name, cache_key, output_path) is not None
+            if info['resumed']:
+                print(f"  ✅ 复用已完成的片段: {output_path.name}")
+                metrics.add('segments_resumed')
+                return output_path
+        if cache is not None:
+            info['cache_hit'] = await _in_thread(cache.get, cache_key, output_path) is not None
+            if info['cache_hit']:
+                if journal is not None:
+                    await _in_thread(journal.record, output_path.name, cache_key, output_path)
+                return output_path
+        
+        with atomic_output(output_path) as tmp_path:
+            if uses_motion_engine(camera_effect, duration, effect_duration, motion_engine):
+                # 逐帧计算和管道写入在线程中进行，失败或中断时通知线程停止
+                async with semaphore:
+                    await _in_thread_cancellable(render_motion_segment, prepared_path, duration, tmp_path,
+                                                 camera_effect, effect_duration, task.get('threads'), profile=profile)
+                commands, intermediates = [], []
+            else:
+                commands, intermediates = build_segment_commands(
+                    prepared_path, duration, tmp_path, camera_effect, effect_duration, task.get('threads'), profile
+                )
+            try:
+                async with semaphore:
+                    for cmd in commands:
+                        await run_ffmpeg_async(cmd)
+            finally:
+                for path in intermediates:
+                    if path.exists():
+                        path.unlink()
+    
+    if journal is not None:
+        await _in_thread(journal.record, output_path.name, cache_key, output_path)
+    if cache is not None:
+        await _in_thread(cache.put, cache_key, output_path)
+    return output_path
+
+
+def _equal_split_on_chunk(durations):
+    """
+    synthesize_async 的 on_chunk 回调：所有文本片段的语音时长都确定时（拼接片段音频、编码 AAC 之前）
+    按图片数平均分配并设置各片段的时长，片段编码与语音的拼接和编码同时进行
+    
+    Args:
+        durations: 各图片片段时长的 Future 列表
+    """
+    known = {}
+    
+    def on_chunk(index, chunk_duration, count):
+        known[index] = chunk_duration
+        if len(known) == count:
+            share = sum(known.values()) / len(durations)
+            for future in durations:
+                if not future.done():
+                    future.set_result(share)
+    
+    return on_chunk
+
+
+async def _synthesize_sections_async(tts_service, sections, output_path, audio_bitrate=None, durations=None):
+    """
+    synthesize_sections 的异步版本：各段并发合成（最多 tts_service.concurrency 个），
+    每段完成时立即设置 durations 中对应的 Future，该图片的片段不必等待其余段落
+    
+    Returns:
+        List[float]: 各段语音的时长（秒）
+    """
+    output_path = Path(output_path)
+    part_paths = section_part_paths(output_path, len(sections))
+    semaphore = asyncio.Semaphore(max(1, getattr(tts_service, 'concurrency', 1)))
+    
+    async def run_section(index, section, part_path):
+        async with semaphore:
+            result = await tts_service.synthesize_async(section, part_path)
+        if durations is not None:
+            durations[index].set_result(result.duration)
+        return result.duration
+    
+    tasks = [
+        asyncio.ensure_future(run_section(i, section, part_path))
+        for i, (section, part_path) in enumerate(zip(sections, part_paths))
+    ]
+    try:
+        try:
+            section_durations = list(await asyncio.gather(*tasks))
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        list_file = write_concat_list(part_paths, output_path)
+        try:
+            with metrics.stage('concat_sections', sections=len(sections)), atomic_output(output_path) as tmp_path:
+                await run_ffmpeg_async(build_concat_command(list_file, tmp_path, audio_bitrate))
+        finally:
+            list_file.unlink()
+    finally:
+        for part_path in part_paths:
+            if part_path.exists():
+                part_path.unlink()
+    return section_durations
+
+
+async def create_video_async(text_file, image_files, output_video, tts_service, temp_dir=None, audio_file=None,
+                             keep_audio=False, camera_effect=None, effect_duration=1.5, workers=2,
+                             segment_cache=None, profile=None, resume=False, stream_audio=False, incremental=False,
+                             storage=None, motion_engine='zoompan'):
+    """
+    创建视频的异步版本
+    
+    图片预处理在 TTS 请求期间就开始进行；每个片段在时长确定后立即开始编码，
+    最多同时运行 workers 个 ffmpeg。TTS 使用 AsyncOpenAI，ffmpeg 使用 asyncio 子进程。
+    任务日志与 create_video 相同，resume=True 时复用上次中断前已完成的语音和片段。
+    旁白用 --- 分段时各段并发合成，每段语音完成后对应图片的片段立即开始编码；不分段时所有文本片段的
+    语音完成后（拼接片段音频、编码 AAC 之前）即按平均分配的时长开始编码。
+    
+    Args:
+        text_file: 旁白文本文件路径
+        image_files: 图片文件路径列表
+        output_video: 输出视频路径
+        tts_service: TTS 服务实例（需要提供 synthesize_async 和 cache_key）
+        temp_dir: 临时文件目录，默认由 storage 决定
+        audio_file: 已有的语音文件路径（可选），如果提供则跳过TTS生成
+        keep_audio: 是否保留生成的语音文件（默认False）
+        camera_effect: 运镜效果类型 ('zoom_in', 'zoom_out', 'pan_right', 'pan_left', None)
+        effect_duration: 运镜效果持续时间（秒），默认1.5秒
+        workers: 同时运行的 ffmpeg 数量，默认2
+        segment_cache: 片段缓存 FileCache（可选）
+        profile: 编码配置（'draft'、'balanced'、'archive' 或 EncoderProfile），默认 balanced
+        resume: 是否从上次中断的位置继续（默认False）
+        stream_audio: 流式合成语音并编码为 AAC，添加音频时直接流复制（默认False，见 create_video）
+        incremental: 增量生成（默认False，见 create_video）
+        storage: 中间文件存储位置（'output'、'local'、'tmpfs' 或目录路径，见 create_video）
+        motion_engine: 运镜渲染引擎（'zoompan' 或 'numpy'，见 create_video）
+    
+    Returns:
+        Path: 输出视频路径
+    """
+    text_file = Path(text_file)
+    image_files = [Path(img) for img in image_files]
+    output_video = Path(output_video)
+    workers = int(workers)
+    profile = get_profile(profile)
+    if workers < 1:
+        raise ValueError(f"workers 必须大于等于 1: {workers}")
+    check_motion_engine(motion_engine, camera_effect, 'segments')
+    
+    # 读取旁白文本
+    with open(text_file, 'r', encoding='utf-8') as f:
+        text = f.read().strip()
+    
+    if not text:
+        raise ValueError(f"文本文件为空: {text_file}")
+    
+    manifest = None
+    if incremental:
+        manifest, fingerprint = await _in_thread(
+            build_dependencies, output_video, text_file, image_files, text, tts_service, audio_file,
+            camera_effect, effect_duration, 'segments', profile, stream_audio, motion_engine
+        )
+        if manifest.is_current(fingerprint):
+            print(f"⊙ 输入和参数均未变化，跳过生成: {output_video}")
+            metrics.add('outputs_up_to_date')
+            return output_video
+        print(f"增量生成: {'，'.join(manifest.changes())}")
+    
+    # 创建临时目录（增量生成时每个输出使用单独的目录，中间文件在两次生成之间保留）
+    if temp_dir is None:
+        temp_dir = intermediate_dir(output_video, storage, output_video.stem if incremental else None)
+    else:
+        temp_dir = Path(temp_dir)
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    print(f"中间文件目录: {temp_dir}")
+    journal = JobJournal(temp_dir, resume=resume or incremental)
+    
+    # 旁白中有换片标记时逐段合成，每张图片的时长等于对应旁白的语音时长
+    sections = split_sections(text, len(image_files))
+    if sections is not None:
+        print(f"旁白按换片标记分为 {len(sections)} 段，图片时长与旁白对齐")
+    
+    loop = asyncio.get_running_loop()
+    num_images = len(image_files)
+    semaphore = asyncio.Semaphore(workers)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    
+    # 图片预处理和片段编码任务立即创建：预处理马上开始，编码等待各自的时长确定
+    print(f"\n步骤 1/3: 处理语音文件，同时预处理 {num_images} 张图片")
+    durations = [loop.create_future() for _ in image_files]
+    
+    async def prepare(image_file, effect):
+        async with semaphore:
+            return await prepare_image_async(image_file, temp_dir, effect, profile)
+    
+    # numpy 引擎逐帧裁切原始比例的图片，预处理时不加运镜余量
+    prepare_camera_effect = None if motion_engine == 'numpy' else camera_effect
+    prepared = [
+        # 只在第一张图片上应用运镜效果
+        asyncio.ensure_future(prepare(image_file, prepare_camera_effect if i == 1 else None))
+        for i, image_file in enumerate(image_files, 1)
+    ]
+    segment_tasks = []
+    for i, image_file in enumerate(image_files, 1):
+        task = {
+            'image_path': image_file,
+            'output_path': temp_dir / f"segment_{i:03d}.mp4",
+            # 只在第一张图片上应用运镜效果
+            'camera_effect': camera_effect if i == 1 else None,
+            'effect_duration': effect_duration,
+            'threads': threads,
+            'profile': profile,
+            'motion_engine': motion_engine,
+        }
+        segment_tasks.append(asyncio.ensure_future(
+            _render_segment_async(task, prepared[i - 1], durations[i - 1], semaphore, segment_cache, journal)
+        ))
+    
+    should_cleanup_audio = False
+    copy_audio = False
+    pending = prepared + segment_tasks
+    try:
+        audio_duration = None
+        section_durations = None
+        if audio_file:
+            audio_file = Path(audio_file)
+            if audio_file.exists():
+                print(f"✅ 使用已有语音文件: {audio_file}")
+                audio_path = audio_file
+            else:
+                print(f"语音文件不存在，生成到: {audio_file}")
+                audio_file.parent.mkdir(parents=True, exist_ok=True)
+                with metrics.stage('tts', chars=len(text)):
+                    if sections is not None:
+                        section_durations = await _synthesize_sections_async(
+                            tts_service, sections, audio_file, durations=durations
+                        )
+                        audio_path, audio_duration = audio_file, sum(section_durations)
+                    else:
+                        tts_result = await tts_service.synthesize_async(text, audio_file,
+                                                                        _equal_split_on_chunk(durations))
+                        audio_path, audio_duration = tts_result.path, tts_result.duration
+        else:
+            tts_key = tts_service.cache_key(text) if sections is None else sections_key(tts_service, sections)
+            if stream_audio:
+                tts_key = make_key('tts_stream', tts_key, profile.audio_bitrate)
+                copy_audio = True
+            audio_path = temp_dir / f"audio_{tts_key[:16]}{'.m4a' if stream_audio else '.mp3'}"
+            resumed = await _in_thread(journal.completed, 'tts', tts_key, audio_path)
+            if resumed is not None:
+                print(f"✅ 恢复任务，复用已生成的语音文件: {audio_path}")
+                audio_duration = resumed.get('duration')
+                section_durations = resumed.get('section_durations')
+                should_cleanup_audio = True
+            elif audio_path.exists() and sections is None:
+                print(f"✅ 发现已有语音文件，跳过生成: {audio_path}")
+            else:
+                print(f"生成新语音文件...")
+                with metrics.stage('tts', chars=len(text), stream=stream_audio):
+                    if sections is not None:
+                        # 每段语音完成时对应的片段就开始编码
+                        section_durations = await _synthesize_sections_async(
+                            tts_service, sections, audio_path, profile.audio_bitrate if stream_audio else None,
+                            durations
+                        )
+                        audio_duration = sum(section_durations)
+                    else:
+                        # 各文本片段的时长确定后片段即开始编码，不等待语音拼接和编码完成
+                        on_chunk = _equal_split_on_chunk(durations)
+                        if stream_audio:
+                            tts_result = await tts_service.synthesize_stream_async(
+                                text, audio_path, profile.audio_bitrate, on_chunk
+                            )
+                        else:
+                            tts_result = await tts_service.synthesize_async(text, audio_path, on_chunk)
+                        audio_path, audio_duration = tts_result.path, tts_result.duration
+                should_cleanup_audio = True
+                await _in_thread(journal.record, 'tts', tts_key, audio_path, duration=audio_duration,
+                                 section_durations=section_durations)
+        
+        if audio_duration is None:
+            audio_duration = await get_audio_duration_async(audio_path)
+        print(f"音频时长: {audio_duration:.2f} 秒")
+        
+        # 时长确定后各片段立即开始编码：分段合成时取各段语音时长，否则平均分配
+        if sections is not None and section_durations is None:
+            print("已有的语音文件无法按段计时，按各段旁白的估算时长比例分配")
+            section_durations = estimate_section_durations(tts_service, sections, audio_duration)
+        if section_durations is not None:
+            timing = "时长与旁白分段对齐"
+        else:
+            section_durations = [audio_duration / num_images] * num_images
+            timing = f"每张 {section_durations[0]:.2f} 秒"
+        print(f"\n步骤 2/3: 生成 {num_images} 个图片视频片段（{timing}，同时运行 {workers} 个 ffmpeg）")
+        for future, duration in zip(durations, section_durations):
+            if not future.done():
+                future.set_result(duration)
+        
+        video_segments = await asyncio.gather(*segment_tasks)
+    except BaseException:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # 保留任务日志中已记录的片段，供恢复时复用
+        for path in list(temp_dir.glob('prepared_*.bmp')) + [
+            temp_dir / f"segment_{i:03d}.mp4" for i in range(1, num_images + 1)
+        ]:
+            if path.exists() and not journal.is_recorded(path):
+                path.unlink()
+        raise
+    
+    # 拼接片段并添加音频（一次 ffmpeg 调用，不写出合并后的中间视频）
+    print(f"\n步骤 3/3: 拼接视频片段并添加音频")
+    size = await _in_thread(mux_reencode_size, video_segments)
+    if size is not None:
+        # 片段的参数集不一致，不能流复制拼接（与 mux_segments 相同）
+        print(f"  片段的参数集（SPS/PPS）不一致，重新编码拼接 {len(video_segments)} 个片段")
+        with metrics.stage('mux_reencode', inputs=len(video_segments)), atomic_output(output_video) as tmp_path:
+            await run_ffmpeg_async(build_mux_reencode_command(video_segments, audio_path, tmp_path, size, profile,
+                                                              copy_audio))
+    else:
+        list_file = write_concat_list(video_segments, temp_dir / output_video.name)
+        try:
+            with metrics.stage('mux_segments', inputs=len(video_segments)), atomic_output(output_video) as tmp_path:
+                await run_ffmpeg_async(build_mux_command(list_file, audio_path, tmp_path, profile, copy_audio))
+        finally:
+            list_file.unlink()
+        metrics.add('intermediate_bytes_saved', merge_bytes_saved(video_segments))
+    
+    print(f"\n✅ 视频生成完成: {output_video}")
+    metrics.add('temp_dir_bytes', metrics.directory_size(temp_dir))
+    
+    if manifest is not None:
+        # 保留任务日志、语音和片段，下次只重新生成变化的部分
+        await _in_thread(manifest.record, fingerprint)
+        prune_intermediates(temp_dir, list(video_segments) + [audio_path])
+        print(f"中间文件保留在 {temp_dir}，依赖清单: {manifest.path}")
+        return output_video
+    
+    # 清理临时文件
+    print(f"清理临时文件...")
+    journal.remove()
+    for path in list(temp_dir.glob('prepared_*.bmp')) + list(video_segments):
+        if path.exists():
+            path.unlink()
+    # 只清理我们生成的音频文件，保留已有的或用户要求保留的
+    if should_cleanup_audio and not keep_audio and audio_path.exists():
+        audio_path.unlink()
+    elif keep_audio and audio_path.exists():
+        print(f"✅ 语音文件已保留: {audio_path}")
+    
+    # 如果临时目录为空，删除它
+    try:
+        temp_dir.rmdir()
+    except OSError:
+        pass  # 目录不为空，不删除
+    
+    return output_video
@@ -0,0 +1,106 @@
+"""
+编码配置模块
+预设的编码配置（draft/balanced/archive）统一控制片段编码、单次渲染和添加音频时的速度与质量
+"""
+
+from typing import NamedTuple, Optional, Tuple
+
+
+# 未指定 gop 时的 GOP 长度（帧，与 x264 的默认值相同）
+DEFAULT_GOP = 250
+
+class EncoderProfile(NamedTuple):
+    """
+    编码配置
+    
+    值为 None 的参数使用 ffmpeg 的默认值或渲染流程原有的取值：
+    preset 默认 medium，crf 默认 23，gop 默认 DEFAULT_GOP，fps 对运镜/静态片段为 30，
+    size 对运镜片段为 1920x1080、对无运镜片段为图片原尺寸（取偶数）。
+    """
+    name: str
+    preset: Optional[str] = None
+    crf: Optional[int] = None
+    gop: Optional[int] = None
+    fps: Optional[int] = None
+    size: Optional[Tuple[int, int]] = None
+    threads: Optional[int] = None
+    audio_bitrate: str = "192k"
+    
+    def video_args(self, threads=None):
+        """
+        视频编码参数
+        
+        Args:
+            threads: 编码线程数（可选），配置中设置了 threads 时以配置为准
+        
+        Returns:
+            list: ffmpeg 参数列表
+        """
+        args = ['-c:v', 'libx264']
+        if self.preset:
+            args += ['-preset', self.preset]
+        args += ['-tune', 'stillimage']
+        if self.crf is not None:
+            args += ['-crf', str(self.crf)]
+        # 所有片段使用相同的 GOP 长度且不使用 B 帧：两者决定参数集（SPS）中的帧号位数和重排序深度，
+        # 静态短片段、运镜片段的参数集一致，流复制拼接后才能正确解码
+        gop = self.gop or DEFAULT_GOP
+        args += ['-g', str(gop), '-keyint_min', str(gop), '-bf', '0']
+        args += ['-pix_fmt', 'yuv420p']
+        threads = self.threads or threads
+        if threads:
+            args += ['-threads', str(threads)]
+        return args
+    
+    def cache_parts(self):
+        """
+        影响输出画面但不包含在编码参数中的字段，用于片段缓存键（默认配置返回空列表，保持原有缓存键不变）
+        """
+        parts = []
+        if self.fps is not None:
+            parts.append(['fps', self.fps])
+        if self.size is not None:
+            parts.append(['size', list(self.size)])
+        return parts
+
+
+# 预设的编码配置；balanced 使用 x264 默认的速度和质量参数
+PROFILES = {
+    'draft': EncoderProfile(
+        name='draft',
+        preset='ultrafast',
+        crf=30,
+        gop=150,
+        fps=15,
+        size=(1280, 720),
+        audio_bitrate='96k',
+    ),
+    'balanced': EncoderProfile(name='balanced'),
+    'archive': EncoderProfile(
+        name='archive',
+        preset='slow',
+        crf=18,
+        audio_bitrate='256k',
+    ),
+}
+
+DEFAULT_PROFILE = 'balanced'
+
+
+def get_profile(profile=None):
+    """
+    获取编码配置
+    
+    Args:
+        profile: 配置名称（draft/balanced/archive）、EncoderProfile 实例或 None（使用 balanced）
+    
+    Returns:
+        EncoderProfile: 编码配置
+    """
+    if profile is None:
+        return PROFILES[DEFAULT_PROFILE]
+    if isinstance(profile, EncoderProfile):
+        return profile
+    if profile not in PROFILES:
+        raise ValueError(f"不支持的编码配置: {profile}，可选: {', '.join(PROFILES)}")
+    return PROFILES[profile]
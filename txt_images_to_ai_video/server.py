@@ -0,0 +1,384 @@
+"""
+渲染服务模块
+常驻进程提供本地 HTTP 接口（提交任务、查询状态、下载输出），任务进入进程内队列，
+由固定数量的渲染 worker 调用 create_video 处理，所有任务共用一个 TTS 客户端和片段渲染线程池
+"""
+
+import itertools
+import json
+import queue
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from . import metrics
+from .batch import CHAPTER_OPTIONS
+from .profiles import get_profile
+from .storage import intermediate_dir
+from .video import ENGINES, create_video
+
+
+# 任务状态
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# 下载输出时每次读取的字节数
+_CHUNK_SIZE = 1024 * 1024
+
+
+class QueueFullError(Exception):
+    """等待队列已满，客户端应稍后重试"""
+
+
+class Job:
+    """一个渲染任务"""
+    
+    def __init__(self, job_id, text_file, image_files, output, options, stream_audio=False):
+        self.id = job_id
+        self.text_file = text_file
+        self.image_files = image_files
+        self.output = output
+        self.options = options
+        self.stream_audio = stream_audio
+        self.status = QUEUED
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.report = None
+    
+    def to_dict(self):
+        """任务状态（可序列化为 JSON）"""
+        data = {
+            'id': self.id,
+            'status': self.status,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'output': str(self.output),
+            'options': self.options,
+        }
+        if self.error is not None:
+            data['error'] = self.error
+        if self.report is not None:
+            summary = self.report.summary()
+            data['wall_seconds'] = summary['wall_seconds']
+            data['stage_totals'] = summary['stage_totals']
+            data['counters'] = summary['counters']
+        return data
+
+
+class RenderServer:
+    """
+    渲染任务队列
+    
+    提交的任务进入有界队列，队列已满时拒绝提交（HTTP 503），由调用方稍后重试。
+    同时渲染的任务数由 workers 限制，片段编码的 ffmpeg 进程数由共享线程池的大小限制，
+    TTS 并发请求数由 TTSService 的 max_requests 限制。
+    """
+    
+    def __init__(self, tts_service, jobs_dir="jobs", workers=2, ffmpeg_workers=2, max_queue=100,
+                 segment_cache=None, max_history=1000, storage=None):
+        """
+        初始化渲染服务
+        
+        Args:
+            tts_service: 所有任务共用的 TTS 服务实例（任务的语音参数通过 with_options 派生）
+            jobs_dir: 任务目录，每个任务的旁白、临时文件和默认输出位于其中的 <任务 ID> 子目录
+            workers: 同时渲染的任务数
+            ffmpeg_workers: 片段渲染线程池大小（所有任务共用），即同时编码片段的 ffmpeg 进程数上限
+            max_queue: 等待队列长度上限
+            segment_cache: 片段缓存 FileCache（可选）
+            max_history: 内存中保留的已结束任务数，超出时丢弃最早结束的任务记录（不删除文件）
+            storage: 中间文件存储位置（'output'：任务目录下的 temp 文件夹，默认；'local'、'tmpfs' 或目录路径）
+        """
+        self.tts_service = tts_service
+        self.jobs_dir = Path(jobs_dir).resolve()
+        self.workers = max(1, workers)
+        self.ffmpeg_workers = max(1, ffmpeg_workers)
+        self.segment_cache = segment_cache
+        self.max_history = max_history
+        self.storage = storage
+        self.jobs = OrderedDict()
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._threads = []
+        self._segment_pool = None
+        self._counter = itertools.count(1)
+    
+    def start(self):
+        """启动渲染 worker"""
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._segment_pool = ThreadPoolExecutor(max_workers=self.ffmpeg_workers)
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"render-worker-{i + 1}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+    
+    def stop(self):
+        """停止 worker：已进入队列的任务全部渲染完成后退出"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        if self._segment_pool is not None:
+            self._segment_pool.shutdown()
+            self._segment_pool = None
+    
+    def submit(self, request):
+        """
+        提交渲染任务
+        
+        Args:
+            request: 任务参数字典：
+                text / script: 旁白文本或旁白文件路径（二选一）
+                images: 图片路径列表（或逗号分隔的字符串）
+                output: 输出视频路径（可选，默认为任务目录下的 output.mp4）
+                stream_audio: 是否流式合成语音（可选）
+                voice、speed、model、camera_effect、effect_duration、engine、profile（可选）
+        
+        Returns:
+            Job: 已进入队列的任务
+        """
+        if not isinstance(request, dict):
+            raise ValueError("任务参数必须是 JSON 对象")
+        unknown = set(request) - {'text', 'script', 'images', 'output', 'stream_audio'} - set(CHAPTER_OPTIONS)
+        if unknown:
+            raise ValueError(f"不支持的任务参数: {', '.join(sorted(unknown))}")
+        
+        text = request.get('text')
+        script = request.get('script')
+        if (text is None) == (script is None):
+            raise ValueError("需要提供 text 或 script 其中之一")
+        if text is not None and not str(text).strip():
+            raise ValueError("旁白文本为空")
+        if script is not None and not Path(script).exists():
+            raise FileNotFoundError(f"旁白文件不存在: {script}")
+        
+        images = request.get('images')
+        if isinstance(images, str):
+            images = [img.strip() for img in images.split(',') if img.strip()]
+        if not images:
+            raise ValueError("需要提供 images")
+        image_files = [Path(img) for img in images]
+        for img in image_files:
+            if not img.exists():
+                raise FileNotFoundError(f"图片文件不存在: {img}")
+        
+        options = {name: request[name] for name in CHAPTER_OPTIONS if request.get(name) is not None}
+        if options.get('engine', 'segments') not in ENGINES:
+            raise ValueError(f"不支持的渲染引擎: {options['engine']}，可选: {', '.join(ENGINES)}")
+        get_profile(options.get('profile'))
+        
+        job_id = f"{next(self._counter):06d}-{uuid.uuid4().hex[:8]}"
+        job_dir = self.jobs_dir / job_id
+        job_dir.mkdir(parents=True)
+        if text is not None:
+            text_file = job_dir / "script.txt"
+            text_file.write_text(str(text), encoding='utf-8')
+        else:
+            text_file = Path(script)
+        output = Path(request['output']) if request.get('output') else job_dir / "output.mp4"
+        
+        job = Job(job_id, text_file, image_files, output, options, bool(request.get('stream_audio')))
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full:
+                shutil.rmtree(job_dir, ignore_errors=True)
+                raise QueueFullError(f"等待队列已满（{self._queue.maxsize} 个任务），请稍后重试")
+            self.jobs[job_id] = job
+        print(f"→ 任务 {job_id} 已提交（排队 {self._queue.qsize()} 个）")
+        return job
+    
+    def get(self, job_id):
+        """按 ID 查询任务，不存在时返回 None"""
+        with self._lock:
+            return self.jobs.get(job_id)
+    
+    def status(self):
+        """服务整体状态"""
+        with self._lock:
+            counts = {state: 0 for state in (QUEUED, RUNNING, DONE, FAILED)}
+            for job in self.jobs.values():
+                counts[job.status] += 1
+        return {
+            'workers': self.workers,
+            'ffmpeg_workers': self.ffmpeg_workers,
+            'queue_size': self._queue.qsize(),
+            'queue_limit': self._queue.maxsize,
+            'jobs': counts,
+        }
+    
+    def _worker(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+    
+    def _temp_dir(self, job):
+        """任务的中间文件目录"""
+        if self.storage in (None, 'output'):
+            return self.jobs_dir / job.id / "temp"
+        return intermediate_dir(job.output, self.storage, job.id)
+    
+    def _run(self, job):
+        options = dict(job.options)
+        service = self.tts_service.with_options(
+            voice=options.pop('voice', None),
+            speed=options.pop('speed', None),
+            model=options.pop('model', None),
+        )
+        job.report = metrics.RunReport("serve", labels={'job': job.id})
+        job.started_at = time.time()
+        job.status = RUNNING
+        print(f"▶ 任务 {job.id} 开始渲染")
+        try:
+            with metrics.activate(job.report):
+                job.output.parent.mkdir(parents=True, exist_ok=True)
+                create_video(
+                    text_file=job.text_file,
+                    image_files=job.image_files,
+                    output_video=job.output,
+                    tts_service=service,
+                    temp_dir=self._temp_dir(job),
+                    workers=self.ffmpeg_workers,
+                    segment_cache=self.segment_cache,
+                    executor=self._segment_pool,
+                    stream_audio=job.stream_audio,
+                    **options
+                )
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            job.report.finish("failed")
+            print(f"✗ 任务 {job.id} 渲染失败: {e}")
+        else:
+            job.status = DONE
+            job.report.finish("ok")
+            print(f"✓ 任务 {job.id} 渲染完成: {job.output}")
+        job.finished_at = time.time()
+        self._trim_history()
+    
+    def _trim_history(self):
+        with self._lock:
+            finished = [job_id for job_id, job in self.jobs.items() if job.status in (DONE, FAILED)]
+            for job_id in finished[:max(0, len(finished) - self.max_history)]:
+                del self.jobs[job_id]
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP 接口:
+        POST /jobs               提交任务（JSON），返回 202 和任务状态
+        GET  /jobs/<id>          查询任务状态
+        GET  /jobs/<id>/output   下载输出视频（任务完成后）
+        GET  /health             服务状态（队列长度、各状态任务数）
+    """
+    
+    server_version = "txt_images_to_ai_video"
+    
+    @property
+    def render_server(self):
+        return self.server.render_server
+    
+    def _send_json(self, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _send_error(self, status, message, headers=None):
+        self._send_json(status, {'error': message}, headers)
+    
+    def do_POST(self):
+        if self.path.rstrip('/') != '/jobs':
+            self._send_error(404, f"未知路径: {self.path}")
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length).decode('utf-8') or 'null')
+            job = self.render_server.submit(request)
+        except QueueFullError as e:
+            self._send_error(503, str(e), {'Retry-After': '5'})
+        except (ValueError, FileNotFoundError) as e:
+            self._send_error(400, str(e))
+        else:
+            self._send_json(202, job.to_dict(), {'Location': f"/jobs/{job.id}"})
+    
+    def do_GET(self):
+        parts = [part for part in self.path.split('?', 1)[0].split('/') if part]
+        if parts == ['health']:
+            self._send_json(200, self.render_server.status())
+            return
+        if len(parts) not in (2, 3) or parts[0] != 'jobs' or (len(parts) == 3 and parts[2] != 'output'):
+            self._send_error(404, f"未知路径: {self.path}")
+            return
+        
+        job = self.render_server.get(parts[1])
+        if job is None:
+            self._send_error(404, f"任务不存在: {parts[1]}")
+        elif len(parts) == 2:
+            self._send_json(200, job.to_dict())
+        elif job.status != DONE:
+            self._send_error(409, f"任务尚未完成（{job.status}）")
+        else:
+            self._send_file(job.output)
+    
+    def _send_file(self, path):
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            self._send_error(410, f"输出文件已不存在: {path}")
+            return
+        with f:
+            size = Path(path).stat().st_size
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp4')
+            self.send_header('Content-Length', str(size))
+            self.send_header('Content-Disposition', f'attachment; filename="{Path(path).name}"')
+            self.end_headers()
+            shutil.copyfileobj(f, self.wfile, _CHUNK_SIZE)
+    
+    def log_message(self, format, *args):
+        """只记录错误请求，轮询状态的请求不输出日志"""
+        if len(args) > 1 and str(args[1]).startswith(('4', '5')):
+            super().log_message(format, *args)
+
+
+def serve(render_server, host="127.0.0.1", port=8000):
+    """
+    启动 HTTP 服务并阻塞运行，Ctrl+C 时停止接收请求，等待已提交的任务渲染完成
+    
+    Args:
+        render_server: RenderServer 实例
+        host: 监听地址
+        port: 监听端口
+    """
+    httpd = ThreadingHTTPServer((host, port), _RequestHandler)
+    httpd.daemon_threads = True
+    httpd.render_server = render_server
+    render_server.start()
+    print(f"渲染服务已启动: http://{host}:{httpd.server_address[1]}")
+    try:
+        httpd.serve_forever()
+    finally:
+        httpd.server_close()
+        print("等待已提交的任务渲染完成...")
+        render_server.stop()
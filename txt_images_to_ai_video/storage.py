@@ -0,0 +1,88 @@
+"""
+中间文件存储模块
+选择片段、语音、预处理图片等中间文件的存放位置：输出目录、本机临时目录或内存文件系统（tmpfs）
+"""
+
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from .cache import make_key
+
+
+# 可选的中间文件存储位置，其他值视为目录路径
+#   output: 输出视频所在目录下的 temp 文件夹（默认）
+#   local:  本机临时目录（输出目录在网络存储上时避免中间文件往返网络）
+#   tmpfs:  内存文件系统 /dev/shm，不可用或剩余空间不足时改用 local
+STORAGE_BACKENDS = ('output', 'local', 'tmpfs')
+
+TMPFS_ROOT = Path("/dev/shm")
+
+# tmpfs 剩余空间低于该值时改用本机临时目录（MB）
+TMPFS_MIN_FREE_MB = 512
+
+# 本工具在 local/tmpfs/自定义目录下使用的子目录
+SCRATCH_DIRNAME = "txt_images_to_ai_video"
+
+# 已提示过的 tmpfs 不可用原因（批量渲染时每个章节都会解析存储位置，同一原因只提示一次）
+_warned = set()
+
+
+def storage_root(storage=None):
+    """
+    中间文件存储的根目录
+    
+    Args:
+        storage: 'output'、'local'、'tmpfs' 或目录路径，None 等同于 'output'
+    
+    Returns:
+        Path: 根目录，'output' 时返回 None（由调用方使用输出目录下的 temp 文件夹）
+    """
+    if storage in (None, 'output'):
+        return None
+    if storage == 'tmpfs':
+        reason = _tmpfs_unavailable()
+        if reason is None:
+            return TMPFS_ROOT / SCRATCH_DIRNAME
+        if reason not in _warned:
+            _warned.add(reason)
+            print(f"⚠️  {reason}，中间文件改存本机临时目录")
+        storage = 'local'
+    if storage == 'local':
+        return Path(tempfile.gettempdir()) / SCRATCH_DIRNAME
+    return Path(storage).expanduser() / SCRATCH_DIRNAME
+
+
+def _tmpfs_unavailable():
+    """tmpfs 不可用的原因，可用时返回 None"""
+    if not TMPFS_ROOT.is_dir() or not os.access(TMPFS_ROOT, os.W_OK):
+        return f"{TMPFS_ROOT} 不存在或不可写"
+    free_mb = shutil.disk_usage(TMPFS_ROOT).free / 1024 / 1024
+    if free_mb < TMPFS_MIN_FREE_MB:
+        return f"{TMPFS_ROOT} 剩余空间不足 {TMPFS_MIN_FREE_MB} MB"
+    return None
+
+
+def intermediate_dir(output_video, storage=None, name=None):
+    """
+    输出视频的中间文件目录
+    
+    storage 为 'output' 时为输出目录下的 temp 文件夹（指定 name 时为其子目录）；
+    其他存储位置由多个输出共用，子目录名包含输出文件绝对路径的哈希，不同目录下的同名输出不会冲突。
+    
+    Args:
+        output_video: 输出视频路径
+        storage: 存储位置（见 STORAGE_BACKENDS），默认 'output'
+        name: 子目录名（可选），默认为输出文件名
+    
+    Returns:
+        Path: 中间文件目录（未创建）
+    """
+    output_video = Path(output_video)
+    root = storage_root(storage)
+    if root is None:
+        root = output_video.parent / "temp"
+        return root / name if name else root
+    key = make_key('scratch', str(output_video.resolve()))[:8]
+    return root / f"{name or output_video.stem}-{key}"
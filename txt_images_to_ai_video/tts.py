@@ -1,17 +1,320 @@
 """
 TTS (Text-to-Speech) 模块
-使用 OpenAI TTS API 将文本转换为语音
+定义 TTS 后端接口，提供 OpenAI TTS API、本地 espeak 引擎和离线占位音频三种实现，
+以及合并多个章节请求的批处理层
 """
 
+import abc
+import asyncio
+import contextlib
+import contextvars
+import copy
 import os
+import re
+import shutil
+import threading
+import time
+import uuid
+import wave
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from openai import OpenAI
+from typing import NamedTuple, Tuple
 
+from . import metrics
+from .cache import DEFAULT_CACHE_ROOT, FileCache, make_key
+from .journal import atomic_output
+from .mp3 import MP3DurationCounter
+from .video import (
+    AsyncFFmpegPipe,
+    FFmpegPipe,
+    build_concat_command,
+    build_encode_audio_command,
+    get_audio_duration,
+    get_audio_duration_async,
+    merge_videos,
+    run_ffmpeg,
+    run_ffmpeg_async,
+    write_concat_list,
+)
 
-class TTSService:
+
+class TTSResult(NamedTuple):
+    """语音合成结果"""
+    path: Path
+    duration: float
+    chunks: Tuple[str, ...] = ()
+    chunk_durations: Tuple[float, ...] = ()
+
+
+# 句末标点（中英文），英文句点需后接空白才视为句末
+_SENTENCE_END = re.compile(r'((?:[。！？!?；;…]|\.(?=\s))+[”’」』）)"\']*)')
+# 句内停顿标点，用于拆分超长句子
+_CLAUSE_END = re.compile(r'([，,、：:]+)')
+
+
+def normalize_text(text):
+    """
+    规范化旁白文本（统一换行、去除多余空白），用于计算缓存键
+    
+    Args:
+        text: 输入文本
+    
+    Returns:
+        str: 规范化后的文本
+    """
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = [re.sub(r'[ \t\u3000]+', ' ', line).strip() for line in text.split('\n')]
+    text = '\n'.join(lines).strip()
+    return re.sub(r'\n{3,}', '\n\n', text)
+
+
+def _split_by(pattern, text):
+    """按分隔符正则拆分文本，分隔符保留在前一段末尾"""
+    parts = pattern.split(text)
+    pieces = []
+    for i in range(0, len(parts), 2):
+        piece = parts[i] + (parts[i + 1] if i + 1 < len(parts) else '')
+        if piece.strip():
+            pieces.append(piece)
+    return pieces
+
+
+def _pack(pieces, max_chars, separator=''):
+    """将多个片段按顺序合并，每段不超过 max_chars 个字符（单个超长片段按长度截断）"""
+    chunks = []
+    current = ''
+    for piece in pieces:
+        while len(piece) > max_chars:
+            if current.strip():
+                chunks.append(current.strip())
+                current = ''
+            chunks.append(piece[:max_chars].strip())
+            piece = piece[max_chars:]
+        candidate = f"{current}{separator}{piece}" if current else piece
+        if current.strip() and len(candidate) > max_chars:
+            chunks.append(current.strip())
+            current = piece
+        else:
+            current = candidate
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+
+def split_text(text, max_chars=800):
+    """
+    按段落和句子边界（支持中文标点 。！？）将文本拆分为不超过 max_chars 个字符的片段
+    
+    相邻的短句/短段落会合并到同一个片段中；超长句子先按逗号等停顿标点拆分，
+    仍然超长时按长度截断。
+    
+    Args:
+        text: 输入文本
+        max_chars: 每个片段的最大字符数
+    
+    Returns:
+        List[str]: 文本片段列表
+    """
+    sentences = []
+    for paragraph in normalize_text(text).split('\n'):
+        if not paragraph.strip():
+            continue
+        for sentence in _split_by(_SENTENCE_END, paragraph):
+            if len(sentence) > max_chars:
+                sentences.extend(_pack(_split_by(_CLAUSE_END, sentence), max_chars))
+            else:
+                sentences.append(sentence)
+        # 段落结尾保留换行，合并时作为段落分隔
+        sentences[-1] = sentences[-1].rstrip() + '\n'
+    return _pack(sentences, max_chars)
+
+
+def _record_first_byte(info, start):
+    """记录 TTS 请求收到第一块音频数据的耗时"""
+    if 'first_byte_seconds' not in info:
+        info['first_byte_seconds'] = round(time.perf_counter() - start, 6)
+
+
+class TTSCache(FileCache):
+    """TTS 语音缓存，条目包含音频文件及其时长"""
+    
+    def __init__(self, directory=None, max_size_mb=512):
+        """
+        初始化 TTS 缓存
+        
+        Args:
+            directory: 缓存目录，默认 ~/.cache/txt_images_to_ai_video/tts
+            max_size_mb: 缓存总大小上限（MB）
+        """
+        super().__init__(directory or DEFAULT_CACHE_ROOT / "tts", max_size_mb=max_size_mb, suffix=".mp3",
+                         name="tts")
+
+
+class TTSBackend(abc.ABC):
+    """
+    TTS 后端接口
+    
+    渲染流程（create_video、create_video_async、批量渲染和渲染服务）只通过这里定义的方法使用 TTS。
+    子类必须实现 synthesize 和 cache_key，其余方法基于 synthesize 提供默认实现，后端可以按自身能力覆盖。
+    """
+    
+    # synthesize_many 同时合成的文本数
+    concurrency = 1
+    # duration_hint 估算时长时的朗读速度（字符/秒，语速 1.0）
+    chars_per_second = 5.0
+    speed = 1.0
+    # with_options 不允许覆盖的属性
+    _fixed_options = ()
+    
+    @abc.abstractmethod
+    def synthesize(self, text, output_path):
+        """
+        将文本转换为语音文件（MP3）
+        
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径
+        
+        Returns:
+            TTSResult: 输出文件路径、音频总时长（秒）、文本片段及每个片段的时长
+        """
+    
+    @abc.abstractmethod
+    def cache_key(self, text):
+        """计算文本对应的缓存键，相同的键必须得到相同的音频"""
+    
+    def with_options(self, **options):
+        """
+        派生一个修改了语音参数的后端实例，共享客户端、缓存等资源
+        
+        Args:
+            **options: 要覆盖的属性（voice、speed、model 等），值为 None 的参数忽略
+        
+        Returns:
+            TTSBackend: 新的后端实例
+        """
+        service = copy.copy(self)
+        for name, value in options.items():
+            if value is None:
+                continue
+            if not hasattr(self, name) or name.startswith('_') or name in self._fixed_options:
+                raise ValueError(f"不支持覆盖的 TTS 参数: {name}")
+            setattr(service, name, value)
+        return service
+    
+    def duration_hint(self, text):
+        """
+        合成前估算文本对应的音频时长（用于调度，不要求精确）
+        
+        Returns:
+            float: 估算时长（秒）
+        """
+        chars = len(normalize_text(text))
+        return max(0.5, chars / (self.chars_per_second * float(self.speed)))
+    
+    def synthesize_many(self, items, return_exceptions=False):
+        """
+        合成多段文本，最多同时进行 concurrency 个
+        
+        Args:
+            items: (文本, 输出路径) 列表
+            return_exceptions: 为 True 时失败的文本在结果中对应其异常，其余文本照常返回结果；
+                               默认任一文本失败时抛出异常
+        
+        Returns:
+            List[TTSResult]: 与 items 顺序一致的合成结果
+        """
+        items = list(items)
+        if self.concurrency <= 1 or len(items) <= 1:
+            results = []
+            for text, output_path in items:
+                try:
+                    results.append(self.synthesize(text, output_path))
+                except Exception as e:
+                    if not return_exceptions:
+                        raise
+                    results.append(e)
+            return results
+        with ThreadPoolExecutor(max_workers=min(self.concurrency, len(items))) as executor:
+            futures = [metrics.submit(executor, self.synthesize, text, output_path) for text, output_path in items]
+            return _future_results(futures, return_exceptions)
+    
+    async def synthesize_async(self, text, output_path, on_chunk=None):
+        """
+        synthesize 的异步版本，默认在线程池中执行 synthesize
+        
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径
+            on_chunk: 回调函数 on_chunk(index, duration, count)（可选），每个片段完成时调用，count 为片段总数
+        
+        Returns:
+            TTSResult: 输出文件路径、音频总时长（秒）、文本片段及每个片段的时长
+        """
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(None, contextvars.copy_context().run, self.synthesize, text, output_path)
+        if on_chunk is not None:
+            for i, chunk_duration in enumerate(result.chunk_durations):
+                on_chunk(i, chunk_duration, len(result.chunk_durations))
+        return result
+    
+    def synthesize_stream(self, text, output_path, audio_bitrate="192k"):
+        """
+        合成语音并编码为 AAC（.m4a），添加音频时可以流复制；默认先合成 MP3 再编码
+        
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径（.m4a）
+            audio_bitrate: AAC 码率
+        
+        Returns:
+            TTSResult: 输出文件路径、音频总时长（秒）、文本片段及每个片段的时长
+        """
+        return self._encode_synthesized(text, Path(output_path), audio_bitrate)
+    
+    async def synthesize_stream_async(self, text, output_path, audio_bitrate="192k", on_chunk=None):
+        """
+        synthesize_stream 的异步版本，默认在线程池中执行 synthesize_stream
+        
+        on_chunk 与 synthesize_async 相同，在各片段的时长确定时调用（默认实现在合成完成后调用）。
+        """
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None, contextvars.copy_context().run, self.synthesize_stream, text, output_path, audio_bitrate
+        )
+        if on_chunk is not None:
+            for i, chunk_duration in enumerate(result.chunk_durations):
+                on_chunk(i, chunk_duration, len(result.chunk_durations))
+        return result
+    
+    def close(self):
+        """释放后端占用的资源（线程等），默认无需处理"""
+    
+    def _source_path(self, output_path):
+        """编码为 AAC 前临时保存 MP3 的路径"""
+        return output_path.with_name(f"{output_path.stem}.{uuid.uuid4().hex}.tmp.mp3")
+    
+    def _encode_synthesized(self, text, output_path, audio_bitrate):
+        """先用 synthesize 得到完整的 MP3，再编码为 AAC"""
+        mp3_path = self._source_path(output_path)
+        try:
+            result = self.synthesize(text, mp3_path)
+            with atomic_output(output_path) as tmp_path:
+                run_ffmpeg(build_encode_audio_command(mp3_path, tmp_path, audio_bitrate))
+        finally:
+            if mp3_path.exists():
+                mp3_path.unlink()
+        return result._replace(path=output_path)
+
+
+class TTSService(TTSBackend):
     """OpenAI TTS 服务封装"""
     
-    def __init__(self, api_key=None, base_url=None, voice="alloy", speed=1.0, model="tts-1"):
+    _fixed_options = ('client', 'api_key', 'base_url')
+    
+    def __init__(self, api_key=None, base_url=None, voice="alloy", speed=1.0, model="tts-1", cache=None,
+                 max_chars=800, concurrency=4, max_retries=3, retry_backoff=1.0, max_requests=None):
         """
         初始化 TTS 服务
         
@@ -21,26 +324,292 @@ class TTSService:
             voice: 语音类型，可选: alloy, echo, fable, onyx, nova, shimmer
             speed: 语速 (0.25 - 4.0)
             model: TTS 模型，默认 tts-1
+            cache: TTS 缓存 TTSCache（可选），命中时不调用 API
+            max_chars: 长文本按句子拆分时每个片段的最大字符数
+            concurrency: 并发合成的片段数
+            max_retries: 单个片段请求失败后的最大重试次数
+            retry_backoff: 重试的初始等待时间（秒），每次重试翻倍
+            max_requests: 同时进行的 API 请求数上限（可选），由 with_options 派生的实例共享
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
         self.voice = voice
         self.speed = speed
         self.model = model
+        self.cache = cache
+        self.max_chars = max_chars
+        self.concurrency = max(1, int(concurrency))
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._request_slots = threading.BoundedSemaphore(max_requests) if max_requests else None
         
         if not self.api_key:
             raise ValueError("未设置 OPENAI_API_KEY 环境变量")
         
-        # 初始化 OpenAI 客户端
+        # 初始化 OpenAI 客户端（openai 及其依赖导入较慢，只在创建服务时导入）
+        from openai import OpenAI
+        
         client_kwargs = {"api_key": self.api_key}
         if self.base_url:
             client_kwargs["base_url"] = self.base_url
         
         self.client = OpenAI(**client_kwargs)
+        self._client_kwargs = client_kwargs
+        # 异步客户端按事件循环创建，由 with_options 派生的实例共享
+        self._async_clients = weakref.WeakKeyDictionary()
+    
+    def cache_key(self, text):
+        """
+        计算文本对应的缓存键：规范化文本 + 语音类型 + 语速 + 模型 + API 地址
+        
+        Args:
+            text: 输入文本
+        
+        Returns:
+            str: 缓存键
+        """
+        return make_key('tts', normalize_text(text), self.voice, float(self.speed), self.model, self.base_url or '')
+    
+    def synthesize(self, text, output_path):
+        """
+        将文本转换为语音文件并返回时长，启用缓存时优先使用缓存
+        
+        超过 max_chars 的文本按句子拆分成多个片段并发合成（失败自动重试），
+        再按顺序拼接成一个音频文件；每个片段单独缓存，修改部分句子后只需重新合成变化的片段。
+        
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径
+        
+        Returns:
+            TTSResult: 输出文件路径、音频总时长（秒）、文本片段及每个片段的时长
+        """
+        output_path = Path(output_path)
+        chunks = tuple(split_text(text, self.max_chars))
+        
+        key = self.cache_key(text)
+        if self.cache is not None and self.cache.get(key, output_path) is not None:
+            print(f"✅ 语音缓存命中: {output_path.name}")
+            meta = self.cache.get_meta(key) or {}
+            duration = float(meta['duration']) if 'duration' in meta else get_audio_duration(output_path)
+            chunk_durations = tuple(meta.get('chunk_durations') or (duration,))
+            if len(chunk_durations) != len(chunks):
+                chunks = (normalize_text(text),)
+                chunk_durations = (duration,)
+            return TTSResult(output_path, duration, chunks, chunk_durations)
+        
+        if len(chunks) <= 1:
+            duration = self._request_with_retries(self._download, text, output_path)
+            chunk_durations = (duration if duration is not None else get_audio_duration(output_path),)
+        else:
+            print(f"文本拆分为 {len(chunks)} 个片段，并发数 {self.concurrency}")
+            part_paths = self._part_paths(output_path, len(chunks))
+            try:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(chunks))) as executor:
+                    futures = [
+                        metrics.submit(executor, self._synthesize_chunk, chunk, part_path)
+                        for chunk, part_path in zip(chunks, part_paths)
+                    ]
+                    chunk_durations = tuple(future.result() for future in futures)
+                merge_videos(part_paths, output_path)
+            finally:
+                for part_path in part_paths:
+                    if part_path.exists():
+                        part_path.unlink()
+        
+        duration = sum(chunk_durations)
+        if self.cache is not None:
+            self.cache.put(key, output_path, meta={'duration': duration, 'chunk_durations': list(chunk_durations)})
+        return TTSResult(output_path, duration, chunks, chunk_durations)
+    
+    def _synthesize_chunk(self, text, output_path):
+        """
+        合成单个文本片段（使用片段级缓存）
+        
+        Returns:
+            float: 片段音频时长（秒）
+        """
+        key = self.cache_key(text)
+        if self.cache is not None and self.cache.get(key, output_path) is not None:
+            meta = self.cache.get_meta(key) or {}
+            if 'duration' in meta:
+                return float(meta['duration'])
+            return get_audio_duration(output_path)
+        
+        duration = self._request_with_retries(self._download, text, output_path)
+        if duration is None:
+            duration = get_audio_duration(output_path)
+        if self.cache is not None:
+            self.cache.put(key, output_path, meta={'duration': duration})
+        return duration
+    
+    def _request_with_retries(self, request, *args):
+        """
+        调用 request(*args)（一次 TTS API 请求），失败时按指数退避重试
+        
+        Returns:
+            request 的返回值
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                if self._request_slots is None:
+                    return request(*args)
+                with self._request_slots:
+                    return request(*args)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"⚠️  语音生成失败（{e}），{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
+    
+    def _part_paths(self, output_path, count):
+        """拆分合成时各片段的临时文件路径"""
+        return [
+            output_path.with_name(f"{output_path.stem}.part{i:03d}{output_path.suffix}")
+            for i in range(1, count + 1)
+        ]
+    
+    @property
+    def async_client(self):
+        """当前事件循环使用的 AsyncOpenAI 客户端"""
+        from openai import AsyncOpenAI
+        
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncOpenAI(**self._client_kwargs)
+            self._async_clients[loop] = client
+        return client
+    
+    async def synthesize_async(self, text, output_path, on_chunk=None):
+        """
+        synthesize 的异步版本：使用 AsyncOpenAI 并发合成各片段
+        
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径
+            on_chunk: 回调函数 on_chunk(index, duration, count)（可选），每个片段完成时调用，count 为片段总数
+        
+        Returns:
+            TTSResult: 输出文件路径、音频总时长（秒）、文本片段及每个片段的时长
+        """
+        output_path = Path(output_path)
+        chunks = tuple(split_text(text, self.max_chars))
+        
+        key = self.cache_key(text)
+        if self.cache is not None and self.cache.get(key, output_path) is not None:
+            print(f"✅ 语音缓存命中: {output_path.name}")
+            meta = self.cache.get_meta(key) or {}
+            if 'duration' in meta:
+                duration = float(meta['duration'])
+            else:
+                duration = await get_audio_duration_async(output_path)
+            chunk_durations = tuple(meta.get('chunk_durations') or (duration,))
+            if len(chunk_durations) != len(chunks):
+                chunks = (normalize_text(text),)
+                chunk_durations = (duration,)
+            if on_chunk is not None:
+                for i, chunk_duration in enumerate(chunk_durations):
+                    on_chunk(i, chunk_duration, len(chunk_durations))
+            return TTSResult(output_path, duration, chunks, chunk_durations)
+        
+        semaphore = asyncio.Semaphore(self.concurrency)
+        
+        async def run_chunk(index, chunk, path):
+            async with semaphore:
+                chunk_duration = await self._synthesize_chunk_async(chunk, path)
+            if on_chunk is not None:
+                on_chunk(index, chunk_duration, len(chunks))
+            return chunk_duration
+        
+        if len(chunks) <= 1:
+            chunk_durations = (await run_chunk(0, text, output_path),)
+        else:
+            print(f"文本拆分为 {len(chunks)} 个片段，并发数 {self.concurrency}")
+            part_paths = self._part_paths(output_path, len(chunks))
+            tasks = [
+                asyncio.ensure_future(run_chunk(i, chunk, path))
+                for i, (chunk, path) in enumerate(zip(chunks, part_paths))
+            ]
+            try:
+                try:
+                    chunk_durations = tuple(await asyncio.gather(*tasks))
+                except BaseException:
+                    # 任一片段失败时取消其余请求
+                    for task in tasks:
+                        task.cancel()
+                    await asyncio.gather(*tasks, return_exceptions=True)
+                    raise
+                list_file = write_concat_list(part_paths, output_path)
+                try:
+                    with atomic_output(output_path) as tmp_path:
+                        await run_ffmpeg_async(build_concat_command(list_file, tmp_path))
+                finally:
+                    list_file.unlink()
+            finally:
+                for part_path in part_paths:
+                    if part_path.exists():
+                        part_path.unlink()
+        
+        duration = sum(chunk_durations)
+        # 单个片段时 _synthesize_chunk_async 已按相同的键写入缓存
+        if self.cache is not None and len(chunks) > 1:
+            self.cache.put(key, output_path, meta={'duration': duration, 'chunk_durations': list(chunk_durations)})
+        return TTSResult(output_path, duration, chunks, chunk_durations)
+    
+    async def _synthesize_chunk_async(self, text, output_path):
+        """
+        异步合成单个文本片段（使用片段级缓存）
+        
+        Returns:
+            float: 片段音频时长（秒）
+        """
+        key = self.cache_key(text)
+        if self.cache is not None and self.cache.get(key, output_path) is not None:
+            meta = self.cache.get_meta(key) or {}
+            if 'duration' in meta:
+                return float(meta['duration'])
+            return await get_audio_duration_async(output_path)
+        
+        duration = await self._request_with_retries_async(self._download_async, text, output_path)
+        if duration is None:
+            duration = await get_audio_duration_async(output_path)
+        if self.cache is not None:
+            self.cache.put(key, output_path, meta={'duration': duration})
+        return duration
+    
+    async def _request_with_retries_async(self, request, *args):
+        """_request_with_retries 的异步版本，request 为协程函数"""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return await request(*args)
+            except Exception as e:
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.retry_backoff * (2 ** attempt)
+                print(f"⚠️  语音生成失败（{e}），{delay:.1f} 秒后重试 ({attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+    
+    async def text_to_speech_async(self, text, output_path):
+        """
+        text_to_speech 的异步版本（直接调用 API，不使用缓存，原子写入）
+        
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径
+        
+        Returns:
+            Path: 输出文件路径
+        """
+        await self._download_async(text, output_path)
+        return Path(output_path)
     
     def text_to_speech(self, text, output_path):
         """
-        将文本转换为语音文件
+        将文本转换为语音文件（直接调用 API，不使用缓存）
+        
+        响应流先写入临时文件，接收完整后才重命名为 output_path，请求超时或中断时不会留下不完整的音频。
         
         Args:
             text: 输入文本
@@ -49,18 +618,596 @@ class TTSService:
         Returns:
             Path: 输出文件路径
         """
-        output_path = Path(output_path)
+        self._download(text, output_path)
+        return Path(output_path)
+    
+    def _stream_speech(self, text, write):
+        """
+        请求 TTS API，将响应流逐块交给 write，同时按 MP3 帧头累计音频时长
+        
+        Returns:
+            float: 音频时长（秒），无法从数据流中识别 MP3 帧时为 None
+        """
+        counter = MP3DurationCounter()
+        with metrics.stage('tts_request', chars=len(text)) as info:
+            start = time.perf_counter()
+            with self.client.audio.speech.with_streaming_response.create(
+                model=self.model,
+                voice=self.voice,
+                input=text,
+                speed=self.speed
+            ) as response:
+                for data in response.iter_bytes():
+                    _record_first_byte(info, start)
+                    counter.feed(data)
+                    write(data)
+                    info['bytes'] = info.get('bytes', 0) + len(data)
+            info['duration'] = counter.duration
+        metrics.add('tts_bytes', info.get('bytes', 0))
+        return counter.duration
+    
+    async def _stream_speech_async(self, text, write):
+        """_stream_speech 的异步版本，write 为协程函数"""
+        counter = MP3DurationCounter()
+        with metrics.stage('tts_request', chars=len(text)) as info:
+            start = time.perf_counter()
+            async with self.async_client.audio.speech.with_streaming_response.create(
+                model=self.model,
+                voice=self.voice,
+                input=text,
+                speed=self.speed
+            ) as response:
+                async for data in response.iter_bytes():
+                    _record_first_byte(info, start)
+                    counter.feed(data)
+                    await write(data)
+                    info['bytes'] = info.get('bytes', 0) + len(data)
+            info['duration'] = counter.duration
+        metrics.add('tts_bytes', info.get('bytes', 0))
+        return counter.duration
+    
+    def _download(self, text, output_path):
+        """
+        请求 TTS API 并原子写入 MP3 文件
         
+        Returns:
+            float: 音频时长（秒），无法从数据流中识别时为 None
+        """
+        output_path = Path(output_path)
+        print(f"正在生成语音: {output_path.name}")
+        with atomic_output(output_path) as tmp_path, open(tmp_path, 'wb') as f:
+            duration = self._stream_speech(text, f.write)
+        print(f"语音生成完成: {output_path}")
+        return duration
+    
+    async def _download_async(self, text, output_path):
+        """_download 的异步版本"""
+        output_path = Path(output_path)
         print(f"正在生成语音: {output_path.name}")
+        with atomic_output(output_path) as tmp_path, open(tmp_path, 'wb') as f:
+            async def write(data):
+                f.write(data)
+            duration = await self._stream_speech_async(text, write)
+        print(f"语音生成完成: {output_path}")
+        return duration
+    
+    def synthesize_stream(self, text, output_path, audio_bitrate="192k"):
+        """
+        合成语音并直接编码为 AAC（.m4a），添加音频时可以流复制
+        
+        旁白只有一个片段时，TTS 响应流边接收边通过管道送入 ffmpeg 编码，音频时长由 MP3 帧头累计，
+        不再先写完整的 MP3 文件再调用 ffprobe；只有启用缓存时才同时写入 MP3 供缓存使用。
+        缓存命中或长旁白需要拆分合成时，先得到完整的 MP3 再编码。
         
-        with self.client.audio.speech.with_streaming_response.create(
-            model=self.model,
-            voice=self.voice,
-            input=text,
-            speed=self.speed
-        ) as response:
-            response.stream_to_file(output_path)
+        Args:
+            text: 输入文本
+            output_path: 输出音频文件路径（.m4a）
+            audio_bitrate: AAC 码率
+        
+        Returns:
+            TTSResult: 输出文件路径、音频总时长（秒）、文本片段及每个片段的时长
+        """
+        output_path = Path(output_path)
+        chunks = tuple(split_text(text, self.max_chars))
+        if len(chunks) > 1:
+            return self._encode_synthesized(text, output_path, audio_bitrate)
         
+        key = self.cache_key(text)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            print(f"✅ 语音缓存命中: {output_path.name}")
+            meta = self.cache.get_meta(key) or {}
+            duration = float(meta['duration']) if 'duration' in meta else get_audio_duration(cached)
+            with atomic_output(output_path) as tmp_path:
+                run_ffmpeg(build_encode_audio_command(cached, tmp_path, audio_bitrate))
+        else:
+            duration = self._request_with_retries(self._stream_encode, text, output_path, audio_bitrate)
+        return TTSResult(output_path, duration, chunks, (duration,))
+    
+    async def synthesize_stream_async(self, text, output_path, audio_bitrate="192k", on_chunk=None):
+        """synthesize_stream 的异步版本（on_chunk 见 synthesize_async）"""
+        output_path = Path(output_path)
+        chunks = tuple(split_text(text, self.max_chars))
+        if len(chunks) > 1:
+            mp3_path = self._source_path(output_path)
+            try:
+                # 各片段完成时即调用 on_chunk，调用方不必等待拼接和 AAC 编码
+                result = await self.synthesize_async(text, mp3_path, on_chunk)
+                with atomic_output(output_path) as tmp_path:
+                    await run_ffmpeg_async(build_encode_audio_command(mp3_path, tmp_path, audio_bitrate))
+            finally:
+                if mp3_path.exists():
+                    mp3_path.unlink()
+            return result._replace(path=output_path)
+        
+        key = self.cache_key(text)
+        cached = self.cache.get(key) if self.cache is not None else None
+        if cached is not None:
+            print(f"✅ 语音缓存命中: {output_path.name}")
+            meta = self.cache.get_meta(key) or {}
+            if 'duration' in meta:
+                duration = float(meta['duration'])
+            else:
+                duration = await get_audio_duration_async(cached)
+            with atomic_output(output_path) as tmp_path:
+                await run_ffmpeg_async(build_encode_audio_command(cached, tmp_path, audio_bitrate))
+        else:
+            duration = await self._request_with_retries_async(
+                self._stream_encode_async, text, output_path, audio_bitrate
+            )
+        if on_chunk is not None:
+            on_chunk(0, duration, 1)
+        return TTSResult(output_path, duration, chunks, (duration,))
+    
+    def _stream_encode(self, text, output_path, audio_bitrate):
+        """
+        请求 TTS API，响应流通过管道送入 ffmpeg 编码为 AAC；启用缓存时同时写入 MP3 并存入缓存
+        
+        Returns:
+            float: 音频时长（秒）
+        """
+        print(f"正在生成语音（流式编码）: {output_path.name}")
+        mp3_path = self._source_path(output_path) if self.cache is not None else None
+        try:
+            with atomic_output(output_path) as tmp_path, \
+                    FFmpegPipe(build_encode_audio_command('pipe:0', tmp_path, audio_bitrate, 'mp3')) as pipe, \
+                    (open(mp3_path, 'wb') if mp3_path else contextlib.nullcontext()) as mp3_file:
+                def write(data):
+                    pipe.write(data)
+                    if mp3_file is not None:
+                        mp3_file.write(data)
+                duration = self._stream_speech(text, write)
+            
+            if duration is None:
+                duration = get_audio_duration(output_path)
+            if mp3_path is not None:
+                self.cache.put(self.cache_key(text), mp3_path, meta={'duration': duration})
+        finally:
+            if mp3_path is not None and mp3_path.exists():
+                mp3_path.unlink()
         print(f"语音生成完成: {output_path}")
-        return output_path
+        return duration
+    
+    async def _stream_encode_async(self, text, output_path, audio_bitrate):
+        """_stream_encode 的异步版本"""
+        print(f"正在生成语音（流式编码）: {output_path.name}")
+        mp3_path = self._source_path(output_path) if self.cache is not None else None
+        try:
+            with atomic_output(output_path) as tmp_path, \
+                    (open(mp3_path, 'wb') if mp3_path else contextlib.nullcontext()) as mp3_file:
+                async with AsyncFFmpegPipe(build_encode_audio_command('pipe:0', tmp_path, audio_bitrate, 'mp3')) as pipe:
+                    async def write(data):
+                        if mp3_file is not None:
+                            mp3_file.write(data)
+                        await pipe.write(data)
+                    duration = await self._stream_speech_async(text, write)
+            
+            if duration is None:
+                duration = await get_audio_duration_async(output_path)
+            if mp3_path is not None:
+                self.cache.put(self.cache_key(text), mp3_path, meta={'duration': duration})
+        finally:
+            if mp3_path is not None and mp3_path.exists():
+                mp3_path.unlink()
+        print(f"语音生成完成: {output_path}")
+        return duration
+
 
+class ToneTTSService(TTSBackend):
+    """
+    离线的占位 TTS 服务：不调用 API，用 ffmpeg 生成指定时长的正弦音或静音
+    
+    接口与 TTSService 相同，用于基准测试、CI 和没有网络/API Key 的环境。设置 latency 和
+    realtime_factor 后每次请求按 API 的典型耗时等待，吞吐测试可以得到接近真实的时序。
+    """
+    
+    def __init__(self, duration=None, chars_per_second=5.0, frequency=440, voice="tone", speed=1.0,
+                 model="tone", sample_rate=24000, latency=0.0, realtime_factor=0.0, concurrency=4):
+        """
+        初始化占位 TTS 服务
+        
+        Args:
+            duration: 生成音频的固定时长（秒），默认按文本长度估算
+            chars_per_second: 按文本长度估算时长时的朗读速度（字符/秒）
+            frequency: 正弦音频率（Hz），0 表示静音
+            voice: 语音类型（仅用于缓存键，与 TTSService 保持一致）
+            speed: 语速，估算时长时生效
+            model: 模型名称（仅用于缓存键）
+            sample_rate: 采样率
+            latency: 模拟的每次请求固定延迟（秒）
+            realtime_factor: 模拟的合成耗时与音频时长之比（例如 0.1 表示 10 秒音频需要 1 秒）
+            concurrency: synthesize_many 同时合成的文本数
+        """
+        self.duration = duration
+        self.chars_per_second = chars_per_second
+        self.frequency = frequency
+        self.voice = voice
+        self.speed = speed
+        self.model = model
+        self.sample_rate = sample_rate
+        self.latency = latency
+        self.realtime_factor = realtime_factor
+        self.concurrency = max(1, int(concurrency))
+    
+    def cache_key(self, text):
+        """计算文本对应的缓存键"""
+        return make_key('tone', normalize_text(text), self.duration, self.chars_per_second, self.frequency,
+                        float(self.speed), self.sample_rate)
+    
+    def duration_hint(self, text):
+        """
+        计算文本对应的音频时长（即实际生成的时长）
+        
+        Returns:
+            float: 时长（秒）
+        """
+        if self.duration is not None:
+            return float(self.duration)
+        return super().duration_hint(text)
+    
+    def _delay(self, duration):
+        """模拟的请求耗时（秒）"""
+        return self.latency + duration * self.realtime_factor
+    
+    def build_command(self, duration, output_path, audio_bitrate=None):
+        """生成音频的 ffmpeg 命令，指定 audio_bitrate 时输出 AAC，否则输出 MP3"""
+        if self.frequency:
+            source = f"sine=frequency={self.frequency}:sample_rate={self.sample_rate}:duration={duration}"
+        else:
+            source = f"anullsrc=r={self.sample_rate}:cl=mono"
+        codec = ['-c:a', 'aac', '-b:a', audio_bitrate] if audio_bitrate else ['-c:a', 'libmp3lame', '-b:a', '64k']
+        return [
+            'ffmpeg',
+            '-f', 'lavfi',
+            '-i', source,
+            '-t', str(duration),
+        ] + codec + [
+            '-y',
+            str(output_path)
+        ]
+    
+    def synthesize(self, text, output_path):
+        """
+        生成占位语音文件
+        
+        Returns:
+            TTSResult: 输出文件路径、音频时长（秒）、文本片段及每个片段的时长
+        """
+        return self._generate(text, Path(output_path))
+    
+    async def synthesize_async(self, text, output_path, on_chunk=None):
+        """synthesize 的异步版本"""
+        result = await self._generate_async(text, Path(output_path))
+        if on_chunk is not None:
+            on_chunk(0, result.duration, 1)
+        return result
+    
+    def synthesize_stream(self, text, output_path, audio_bitrate="192k"):
+        """直接生成 AAC 格式（.m4a）的占位语音，接口与 TTSService.synthesize_stream 相同"""
+        return self._generate(text, Path(output_path), audio_bitrate)
+    
+    async def synthesize_stream_async(self, text, output_path, audio_bitrate="192k", on_chunk=None):
+        """synthesize_stream 的异步版本"""
+        result = await self._generate_async(text, Path(output_path), audio_bitrate)
+        if on_chunk is not None:
+            on_chunk(0, result.duration, 1)
+        return result
+    
+    def _generate(self, text, output_path, audio_bitrate=None):
+        duration = self.duration_hint(text)
+        with metrics.stage('tts_request', chars=len(text)), atomic_output(output_path) as tmp_path:
+            delay = self._delay(duration)
+            if delay > 0:
+                time.sleep(delay)
+            run_ffmpeg(self.build_command(duration, tmp_path, audio_bitrate))
+        return TTSResult(output_path, duration, (normalize_text(text),), (duration,))
+    
+    async def _generate_async(self, text, output_path, audio_bitrate=None):
+        duration = self.duration_hint(text)
+        with metrics.stage('tts_request', chars=len(text)), atomic_output(output_path) as tmp_path:
+            delay = self._delay(duration)
+            if delay > 0:
+                await asyncio.sleep(delay)
+            await run_ffmpeg_async(self.build_command(duration, tmp_path, audio_bitrate))
+        return TTSResult(output_path, duration, (normalize_text(text),), (duration,))
+
+
+class EspeakTTSService(TTSBackend):
+    """
+    本地离线 TTS 引擎：调用 espeak-ng（或 espeak）合成语音，不需要网络和 API Key
+    
+    音质不及云端服务，但时长随文本真实变化，适合草稿渲染、吞吐测试和 CI。
+    """
+    
+    _fixed_options = ('executable',)
+    
+    def __init__(self, language="zh", voice="espeak", speed=1.0, model="espeak", words_per_minute=175,
+                 executable=None, concurrency=None):
+        """
+        初始化 espeak 引擎
+        
+        Args:
+            language: espeak 的语音/语言（-v 参数，例如 zh、en-us）
+            voice: 语音类型（仅用于缓存键，与 TTSService 保持一致）
+            speed: 语速，乘以 words_per_minute 作为 espeak 的 -s 参数
+            model: 模型名称（仅用于缓存键）
+            words_per_minute: 语速为 1.0 时每分钟的词数
+            executable: espeak 可执行文件路径，默认在 PATH 中查找 espeak-ng 或 espeak
+            concurrency: synthesize_many 同时合成的文本数，默认 CPU 核数
+        """
+        self.executable = executable or shutil.which('espeak-ng') or shutil.which('espeak')
+        if not self.executable:
+            raise ValueError("未找到 espeak-ng 或 espeak，请先安装（例如: apt install espeak-ng）")
+        self.language = language
+        self.voice = voice
+        self.speed = speed
+        self.model = model
+        self.words_per_minute = words_per_minute
+        self.concurrency = max(1, int(concurrency or os.cpu_count() or 1))
+    
+    def cache_key(self, text):
+        """计算文本对应的缓存键"""
+        return make_key('espeak', normalize_text(text), self.language, float(self.speed), self.words_per_minute)
+    
+    def synthesize(self, text, output_path):
+        """
+        合成语音文件（MP3）
+        
+        Returns:
+            TTSResult: 输出文件路径、音频时长（秒）、文本片段及每个片段的时长
+        """
+        return self._render(text, Path(output_path), ['-c:a', 'libmp3lame', '-b:a', '64k'])
+    
+    def synthesize_stream(self, text, output_path, audio_bitrate="192k"):
+        """直接将 espeak 输出编码为 AAC（.m4a），不经过 MP3"""
+        return self._render(text, Path(output_path), ['-c:a', 'aac', '-b:a', audio_bitrate])
+    
+    def _render(self, text, output_path, codec):
+        """espeak 生成 WAV（时长直接从 WAV 头读取），再用 ffmpeg 编码为目标格式"""
+        text = normalize_text(text)
+        work = output_path.with_name(f"{output_path.stem}.{uuid.uuid4().hex}.espeak")
+        text_path = work.with_suffix('.txt')
+        wav_path = work.with_suffix('.wav')
+        try:
+            text_path.write_text(text, encoding='utf-8')
+            with metrics.stage('tts_request', chars=len(text)) as info:
+                run_ffmpeg([
+                    self.executable,
+                    '-v', self.language,
+                    '-s', str(int(self.words_per_minute * float(self.speed))),
+                    '-w', str(wav_path),
+                    '-f', str(text_path),
+                ])
+                with contextlib.closing(wave.open(str(wav_path), 'rb')) as wav:
+                    duration = wav.getnframes() / float(wav.getframerate())
+                info['duration'] = duration
+            with atomic_output(output_path) as tmp_path:
+                run_ffmpeg(['ffmpeg', '-i', str(wav_path), '-vn'] + codec + ['-y', str(tmp_path)])
+        finally:
+            for path in (text_path, wav_path):
+                if path.exists():
+                    path.unlink()
+        return TTSResult(output_path, duration, (text,), (duration,))
+
+
+class BatchingTTS(TTSBackend):
+    """
+    TTS 批处理层：合并多个章节（线程）同时发出的合成请求，批量交给后端的 synthesize_many
+    
+    在 max_wait 时间内到达的请求组成一批（最多 max_batch 个）：文本和参数相同（缓存键相同）的
+    请求只合成一次，其余直接复制结果；后端参数相同的请求按 duration_hint 从长到短调用一次
+    synthesize_many，长旁白先开始，整批完成得更早。with_options 派生的实例共享同一个批处理队列。
+    
+    示例:
+        tts_service = BatchingTTS(TTSService(max_requests=8))
+        try:
+            run_batch(manifest, tts_service)
+        finally:
+            tts_service.close()
+    """
+    
+    def __init__(self, backend, max_batch=16, max_wait=0.05, workers=4):
+        """
+        初始化批处理层
+        
+        Args:
+            backend: 实际执行合成的 TTS 后端
+            max_batch: 每批最多合并的请求数
+            max_wait: 收到第一个请求后等待后续请求的最长时间（秒）
+            workers: 同时执行的 synthesize_many 调用数（每批内每组后端参数调用一次）
+        """
+        self.backend = backend
+        self._queue = _BatchQueue(max_batch, max_wait, workers)
+    
+    @property
+    def speed(self):
+        return self.backend.speed
+    
+    @property
+    def concurrency(self):
+        return self.backend.concurrency
+    
+    def with_options(self, **options):
+        """派生一个修改了后端参数的实例，与原实例共享批处理队列"""
+        service = copy.copy(self)
+        service.backend = self.backend.with_options(**options)
+        return service
+    
+    def cache_key(self, text):
+        return self.backend.cache_key(text)
+    
+    def duration_hint(self, text):
+        return self.backend.duration_hint(text)
+    
+    def synthesize(self, text, output_path):
+        """提交到批处理队列并等待结果"""
+        return self._queue.submit(self.backend, text, Path(output_path)).result()
+    
+    def synthesize_many(self, items, return_exceptions=False):
+        futures = [self._queue.submit(self.backend, text, Path(output_path)) for text, output_path in items]
+        return _future_results(futures, return_exceptions)
+    
+    async def synthesize_async(self, text, output_path, on_chunk=None):
+        """synthesize 的异步版本，等待时不占用线程"""
+        result = await asyncio.wrap_future(self._queue.submit(self.backend, text, Path(output_path)))
+        if on_chunk is not None:
+            for i, chunk_duration in enumerate(result.chunk_durations):
+                on_chunk(i, chunk_duration, len(result.chunk_durations))
+        return result
+    
+    def synthesize_stream(self, text, output_path, audio_bitrate="192k"):
+        """流式合成追求单个请求的延迟，不经过批处理，直接交给后端"""
+        return self.backend.synthesize_stream(text, output_path, audio_bitrate)
+    
+    async def synthesize_stream_async(self, text, output_path, audio_bitrate="192k", on_chunk=None):
+        return await self.backend.synthesize_stream_async(text, output_path, audio_bitrate, on_chunk)
+    
+    def close(self):
+        """停止批处理线程（等待已提交的请求完成）"""
+        self._queue.close()
+        self.backend.close()
+
+
+def _future_results(futures, return_exceptions=False):
+    """按顺序等待 Future 的结果，return_exceptions 为 True 时失败的 Future 返回其异常而不是抛出"""
+    results = []
+    for future in futures:
+        error = future.exception()
+        if error is not None and not return_exceptions:
+            raise error
+        results.append(error if error is not None else future.result())
+    return results
+
+
+class _BatchRequest(NamedTuple):
+    backend: TTSBackend
+    text: str
+    output_path: Path
+    future: Future
+    context: contextvars.Context
+
+
+class _BatchQueue:
+    """BatchingTTS 的请求队列和调度线程"""
+    
+    def __init__(self, max_batch, max_wait, workers):
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max_wait
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = None
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='tts-batch')
+    
+    def submit(self, backend, text, output_path):
+        """提交一个合成请求，返回 concurrent.futures.Future"""
+        future = Future()
+        request = _BatchRequest(backend, text, output_path, future, contextvars.copy_context())
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("TTS 批处理队列已关闭")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._dispatch, name='tts-batch-dispatch', daemon=True)
+                self._thread.start()
+            self._pending.append(request)
+            self._condition.notify()
+        return future
+    
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+        self._executor.shutdown()
+    
+    def _dispatch(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if not self._pending:
+                    return
+                deadline = time.monotonic() + self.max_wait
+                while len(self._pending) < self.max_batch and not self._closed:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            self._schedule(batch)
+    
+    def _schedule(self, batch):
+        """合并相同的请求，按后端参数分组提交"""
+        leaders = {}
+        followers = {}
+        for request in batch:
+            key = request.backend.cache_key(request.text)
+            if key in leaders:
+                followers.setdefault(key, []).append(request)
+            else:
+                leaders[key] = request
+        
+        # 参数相同的后端实例（各章节通过 with_options 派生）归为一组，空文本的缓存键只包含参数
+        groups = {}
+        for key, request in leaders.items():
+            group_key = (type(request.backend), request.backend.cache_key(''))
+            groups.setdefault(group_key, []).append((request, followers.get(key, ())))
+        for group in groups.values():
+            group.sort(key=lambda item: item[0].backend.duration_hint(item[0].text), reverse=True)
+            self._executor.submit(group[0][0].context.run, self._run_group, group)
+    
+    def _run_group(self, group):
+        backend = group[0][0].backend
+        metrics.add('tts_batches')
+        duplicates = sum(len(duplicates) for _, duplicates in group)
+        if duplicates:
+            metrics.add('tts_batch_deduplicated', duplicates)
+        try:
+            # 每个请求取自己的结果，失败的请求只让它自己报错（synthesize 内部已经重试过，不再重新合成）
+            results = backend.synthesize_many([(request.text, request.output_path) for request, _ in group],
+                                              return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(group)
+        
+        for (request, duplicates), result in zip(group, results):
+            # 先复制给相同的请求，再通知原请求（原请求的输出文件之后可能被删除）
+            for duplicate in duplicates:
+                self._resolve(duplicate, result)
+            self._resolve(request, result)
+    
+    @staticmethod
+    def _resolve(request, result):
+        """设置请求的结果，结果文件不在请求的输出路径时复制过去"""
+        if isinstance(result, Exception):
+            request.future.set_exception(result)
+            return
+        try:
+            if Path(result.path) != request.output_path:
+                with atomic_output(request.output_path) as tmp_path:
+                    shutil.copyfile(result.path, tmp_path)
+        except Exception as e:
+            request.future.set_exception(e)
+        else:
+            request.future.set_result(result._replace(path=request.output_path))
@@ -3,157 +3,1636 @@
 将图片和音频合成视频
 """
 
+import os
+import re
 import subprocess
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, FIRST_EXCEPTION, wait
 from pathlib import Path
 from typing import List
 
+from . import metrics
+from .cache import file_sha256, make_key
+from .deps import BuildManifest
+from .journal import JobJournal, atomic_output
+from .media import keyframe_times, media_info, media_info_async, read_encoder_options
+from .motion import (MOTION_ENGINES, MotionRenderer, final_rect, get_motion, load_image, motion_available,
+                     motion_rects, write_ppm)
+from .profiles import get_profile
+from .storage import intermediate_dir
+
+
+class RenderCancelled(RuntimeError):
+    """渲染任务被取消（通常因为并行的其他片段渲染失败）"""
+
+
+def _wait_process(proc, cancel_event=None):
+    """
+    等待子进程结束，cancel_event 被设置时终止子进程
+    
+    支持 os.wait4 的平台上由它回收子进程，从而拿到该子进程自己的 CPU 时间和峰值内存。
+    
+    Returns:
+        tuple: (退出码, resource.struct_rusage 或 None)
+    """
+    delay = 0.005
+    killed = False
+    while True:
+        if cancel_event is not None and cancel_event.is_set() and not killed:
+            proc.kill()
+            killed = True
+        
+        if hasattr(os, 'wait4'):
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG)
+            if pid:
+                if os.WIFSIGNALED(status):
+                    proc.returncode = -os.WTERMSIG(status)
+                else:
+                    proc.returncode = os.WEXITSTATUS(status)
+                return proc.returncode, rusage
+        else:
+            try:
+                return proc.wait(timeout=delay), None
+            except subprocess.TimeoutExpired:
+                continue
+        
+        time.sleep(delay)
+        delay = min(delay * 2, 0.1)
+
+
+def run_ffmpeg(cmd, cancel_event=None):
+    """
+    运行 ffmpeg/ffprobe 命令，行为与 subprocess.run(check=True, capture_output=True, text=True) 一致
+    
+    子进程的耗时、CPU 时间和峰值内存会记录到当前的运行报告（如果已启用）。
+    
+    Args:
+        cmd: 命令参数列表
+        cancel_event: threading.Event（可选），被设置时终止子进程并抛出 RenderCancelled
+    
+    Returns:
+        subprocess.CompletedProcess: 执行结果
+    """
+    cmd = [str(arg) for arg in cmd]
+    start = time.perf_counter()
+    
+    # 输出写入临时文件而不是管道，避免读取管道时无法用 wait4 回收子进程
+    with tempfile.TemporaryFile() as stdout_file, tempfile.TemporaryFile() as stderr_file:
+        proc = subprocess.Popen(cmd, stdout=stdout_file, stderr=stderr_file)
+        returncode, rusage = _wait_process(proc, cancel_event)
+        metrics.record_process(cmd, time.perf_counter() - start, returncode, rusage)
+        
+        if returncode != 0 and cancel_event is not None and cancel_event.is_set():
+            raise RenderCancelled(f"已取消: {' '.join(cmd)}")
+        
+        stdout_file.seek(0)
+        stderr_file.seek(0)
+        stdout = stdout_file.read().decode('utf-8', errors='replace')
+        stderr = stderr_file.read().decode('utf-8', errors='replace')
+    
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, returncode, stdout, stderr)
+
+
+async def run_ffmpeg_async(cmd):
+    """
+    使用 asyncio 子进程运行 ffmpeg/ffprobe 命令，失败时抛出 CalledProcessError
+    
+    协程被取消时会终止子进程。
+    
+    Args:
+        cmd: 命令参数列表
+    
+    Returns:
+        subprocess.CompletedProcess: 执行结果（stdout/stderr 为文本）
+    """
+    # asyncio 只在协程中使用（此时事件循环已导入 asyncio），不在模块导入时加载
+    import asyncio
+    
+    cmd = [str(arg) for arg in cmd]
+    start = time.perf_counter()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        stdout, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+    # asyncio 子进程由事件循环回收，只能记录耗时
+    metrics.record_process(cmd, time.perf_counter() - start, proc.returncode)
+    
+    stdout = stdout.decode('utf-8', errors='replace')
+    stderr = stderr.decode('utf-8', errors='replace')
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd, stdout, stderr)
+    return subprocess.CompletedProcess(cmd, proc.returncode, stdout, stderr)
+
+
+class FFmpegPipe:
+    """
+    从标准输入读取数据的 ffmpeg 子进程，用于边接收数据边编码
+    
+    正常退出 with 块时关闭标准输入并等待 ffmpeg 结束（失败时抛出 CalledProcessError），
+    块内出现异常时终止子进程。
+    
+    示例:
+        with FFmpegPipe(['ffmpeg', '-f', 'mp3', '-i', 'pipe:0', ..., 'out.m4a']) as pipe:
+            for data in chunks:
+                pipe.write(data)
+    """
+    
+    def __init__(self, cmd):
+        self.cmd = [str(arg) for arg in cmd]
+        self._start = time.perf_counter()
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(self.cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+                                     stderr=self._stderr)
+    
+    def write(self, data):
+        """写入数据；ffmpeg 已提前退出时忽略，退出码在 close 时检查"""
+        try:
+            self.proc.stdin.write(data)
+        except BrokenPipeError:
+            pass
+    
+    def close(self):
+        """关闭标准输入并等待 ffmpeg 结束"""
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        returncode, rusage = _wait_process(self.proc)
+        metrics.record_process(self.cmd, time.perf_counter() - self._start, returncode, rusage)
+        self._stderr.seek(0)
+        stderr = self._stderr.read().decode('utf-8', errors='replace')
+        self._stderr.close()
+        if returncode != 0:
+            raise subprocess.CalledProcessError(returncode, self.cmd, None, stderr)
+    
+    def kill(self):
+        """终止 ffmpeg"""
+        self.proc.kill()
+        try:
+            self.proc.stdin.close()
+        except BrokenPipeError:
+            pass
+        self.proc.wait()
+        self._stderr.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.kill()
+        return False
+
+
+class AsyncFFmpegPipe:
+    """FFmpegPipe 的异步版本：async with AsyncFFmpegPipe(cmd) as pipe: await pipe.write(data)"""
+    
+    def __init__(self, cmd):
+        self.cmd = [str(arg) for arg in cmd]
+        self.proc = None
+    
+    async def __aenter__(self):
+        import asyncio
+        
+        self._start = time.perf_counter()
+        # stderr 写入临时文件，避免 ffmpeg 的进度输出填满管道导致阻塞
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = await asyncio.create_subprocess_exec(
+            *self.cmd,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=self._stderr
+        )
+        return self
+    
+    async def write(self, data):
+        """写入数据并等待管道可写；ffmpeg 已提前退出时忽略"""
+        try:
+            self.proc.stdin.write(data)
+            await self.proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is not None:
+                if self.proc.returncode is None:
+                    self.proc.kill()
+                await self.proc.wait()
+                return False
+            self.proc.stdin.close()
+            returncode = await self.proc.wait()
+            metrics.record_process(self.cmd, time.perf_counter() - self._start, returncode)
+            if returncode != 0:
+                self._stderr.seek(0)
+                stderr = self._stderr.read().decode('utf-8', errors='replace')
+                raise subprocess.CalledProcessError(returncode, self.cmd, None, stderr)
+            return False
+        finally:
+            self._stderr.close()
+
+
+def build_encode_audio_command(input_path, output_path, audio_bitrate="192k", input_format=None):
+    """
+    构建将音频编码为 AAC 的 ffmpeg 命令，输出可以在添加音频时直接流复制
+    
+    Args:
+        input_path: 输入音频路径，'pipe:0' 表示从标准输入读取
+        output_path: 输出路径（.m4a）
+        audio_bitrate: AAC 码率
+        input_format: 输入格式（例如 'mp3'），从标准输入读取时需要指定
+    
+    Returns:
+        list: 命令参数列表
+    """
+    cmd = ['ffmpeg']
+    if input_format:
+        cmd += ['-f', input_format]
+    return cmd + [
+        '-i', str(input_path),
+        '-vn',
+        '-c:a', 'aac',
+        '-b:a', audio_bitrate,
+        '-y',
+        str(output_path)
+    ]
+
+
+def _checked_duration(info, audio_path):
+    """媒体信息中的时长，无法得到时长时抛出 ValueError"""
+    if info.duration is None:
+        raise ValueError(f"无法读取音频时长: {audio_path}")
+    return info.duration
+
 
 def get_audio_duration(audio_path):
     """
-    获取音频时长
+    获取音频时长（MP3/WAV/M4A 直接解析文件头，其他格式调用 ffprobe，见 media.media_info）
+    
+    Args:
+        audio_path: 音频文件路径
+    
+    Returns:
+        float: 音频时长（秒）
+    """
+    return _checked_duration(media_info(audio_path), audio_path)
+
+
+async def get_audio_duration_async(audio_path):
+    """
+    获取音频时长（异步版本）
+    
+    Args:
+        audio_path: 音频文件路径
+    
+    Returns:
+        float: 音频时长（秒）
+    """
+    return _checked_duration(await media_info_async(audio_path), audio_path)
+
+
+# 运镜效果使用的帧率与输出分辨率（zoompan 固定输出该分辨率）
+EFFECT_FPS = 30
+EFFECT_SIZE = (1920, 1080)
+
+# 支持的运镜效果（numpy 运镜引擎另外支持 motion.register_motion 注册的效果和 kenburns:... 写法）
+CAMERA_EFFECTS = ('zoom_in', 'zoom_out', 'pan_right', 'pan_left')
+
+# 运镜效果的最大缩放倍数，预处理图片时保留该倍数的分辨率余量
+EFFECT_MAX_ZOOM = 1.2
+
+# 静态片段（无运镜）只编码这么长的一段（一个 GOP），再通过流复制循环到所需时长
+STATIC_CLIP_SECONDS = 2.0
+
+
+def get_image_size(image_path):
+    """
+    获取图片尺寸
+    
+    Args:
+        image_path: 图片路径
+    
+    Returns:
+        tuple: (宽, 高)
+    """
+    result = run_ffmpeg(
+        ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+         '-show_entries', 'stream=width,height', '-of', 'csv=s=x:p=0', str(image_path)]
+    )
+    width, height = result.stdout.strip().split('x')[:2]
+    return int(width), int(height)
+
+
+def has_camera_effect(camera_effect, duration, effect_duration=1.5):
+    """
+    判断片段是否会实际应用运镜效果（效果类型有效且片段时长大于效果时长）
+    """
+    is_effect = camera_effect in CAMERA_EFFECTS or get_motion(camera_effect) is not None
+    return is_effect and duration > effect_duration
+
+
+def check_motion_engine(motion_engine, camera_effect=None, engine='segments'):
+    """
+    检查运镜引擎参数：引擎名称有效、numpy 引擎已安装 NumPy 且只用于 segments 引擎，
+    自定义运镜效果只能由 numpy 引擎渲染
+    """
+    if motion_engine not in MOTION_ENGINES:
+        raise ValueError(f"不支持的运镜引擎: {motion_engine}，可选: {', '.join(MOTION_ENGINES)}")
+    if motion_engine == 'numpy':
+        if not motion_available():
+            raise ImportError("numpy 运镜引擎需要安装 NumPy: pip install 'txt_images_to_ai_video[numpy]'")
+        if engine != 'segments':
+            raise ValueError("numpy 运镜引擎只支持 segments 渲染引擎")
+    elif camera_effect not in CAMERA_EFFECTS and get_motion(camera_effect) is not None:
+        raise ValueError(f"运镜效果 {camera_effect} 需要 numpy 运镜引擎（motion_engine=numpy）")
+
+
+def uses_motion_engine(camera_effect, duration, effect_duration=1.5, motion_engine='zoompan'):
+    """片段的运镜部分是否由 numpy 运镜引擎逐帧生成"""
+    return motion_engine == 'numpy' and has_camera_effect(camera_effect, duration, effect_duration)
+
+
+def segment_filter(duration, camera_effect=None, effect_duration=1.5, profile=None, motion_engine='zoompan'):
+    """
+    片段画面的描述，用于片段缓存键：numpy 运镜引擎渲染时为运镜路径和帧数，否则为 ffmpeg 滤镜
+    """
+    if not uses_motion_engine(camera_effect, duration, effect_duration, motion_engine):
+        return build_video_filter(duration, camera_effect, effect_duration, profile)
+    profile = get_profile(profile)
+    fps = profile.fps or EFFECT_FPS
+    frames = int(effect_duration * fps)
+    return f"{get_motion(camera_effect).describe()}:{frames}@{fps}:{build_prepare_filter(None, profile)}"
+
+
+def prepare_effect(camera_effect, duration, effect_duration=1.5, motion_engine='zoompan'):
+    """
+    预处理图片时使用的运镜效果：zoompan 需要带缩放余量的图片；numpy 引擎与静态片段共用同一张预处理图片
+    （保持原始宽高比和分辨率），运镜结束后的画面与静态片段一致
+    """
+    if motion_engine == 'numpy' or not has_camera_effect(camera_effect, duration, effect_duration):
+        return None
+    return camera_effect
+
+
+def _fit_filter(size):
+    """等比缩放到指定分辨率以内并居中填充"""
+    width, height = size
+    return (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1")
+
+
+def build_video_filter(duration, camera_effect=None, effect_duration=1.5, profile=None):
+    """
+    构建单张图片片段的视频滤镜
+    
+    Args:
+        duration: 视频时长（秒）
+        camera_effect: 运镜效果类型 ('zoom_in', 'zoom_out', 'pan_right', 'pan_left', None)
+        effect_duration: 运镜效果持续时间（秒），默认1.5秒
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        str: ffmpeg 滤镜字符串
+    """
+    profile = get_profile(profile)
+    
+    # 基础滤镜：确保宽高是偶数
+    base_filter = 'scale=trunc(iw/2)*2:trunc(ih/2)*2'
+    
+    if not has_camera_effect(camera_effect, duration, effect_duration):
+        # 编码配置指定了分辨率时统一输出分辨率
+        return _fit_filter(profile.size) if profile.size else base_filter
+    if camera_effect not in CAMERA_EFFECTS:
+        raise ValueError(f"运镜效果 {camera_effect} 需要 numpy 运镜引擎（motion_engine=numpy）")
+    
+    fps = profile.fps or EFFECT_FPS
+    effect_frames = int(effect_duration * fps)
+    total_frames = int(duration * fps)
+    width, height = profile.size or EFFECT_SIZE
+    size = f"{width}x{height}"
+    
+    if camera_effect == 'zoom_in':
+        # 缩放进入效果：从1.2倍缩放到1倍（正常大小）
+        zoom_filter = f"zoompan=z='if(lte(on,{effect_frames}),1.2-0.2*on/{effect_frames},1)'"
+    elif camera_effect == 'zoom_out':
+        # 缩放退出效果：从1倍缩放到1.2倍
+        zoom_filter = f"zoompan=z='if(lte(on,{effect_frames}),1+0.2*on/{effect_frames},1.2)'"
+    elif camera_effect == 'pan_right':
+        # 向右平移效果
+        zoom_filter = (
+            f"zoompan=z=1.2"
+            f":x='if(lte(on,{effect_frames}),iw/2-(iw/2)*on/{effect_frames},iw/2)'"
+        )
+    else:
+        # 向左平移效果
+        zoom_filter = (
+            f"zoompan=z=1.2"
+            f":x='if(lte(on,{effect_frames}),iw/2+(iw/2)*on/{effect_frames},iw)'"
+        )
+    
+    return f"{base_filter},{zoom_filter}:d={total_frames}:s={size}:fps={fps}"
+
+
+def _video_codec_args(threads=None, profile=None):
+    """
+    视频编码参数（分段渲染与单次渲染共用），由编码配置决定
+    """
+    return get_profile(profile).video_args(threads)
+
+
+def build_prepare_filter(camera_effect=None, profile=None):
+    """
+    构建图片预处理滤镜
+    
+    有运镜效果时缩放到运镜输出分辨率乘以最大缩放倍数（zoompan 放大到最大时源像素与输出像素一一对应，
+    与直接使用高分辨率原图的画面一致）；否则缩放到编码配置的输出分辨率，未指定时只将宽高取偶数。
+    
+    Args:
+        camera_effect: 片段实际使用的运镜效果（None 表示无运镜）
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        str: ffmpeg 滤镜字符串
+    """
+    profile = get_profile(profile)
+    if camera_effect:
+        effect_size = profile.size or EFFECT_SIZE
+        width = int(effect_size[0] * EFFECT_MAX_ZOOM) // 2 * 2
+        height = int(effect_size[1] * EFFECT_MAX_ZOOM) // 2 * 2
+        return f"scale={width}:{height}"
+    if profile.size:
+        return _fit_filter(profile.size)
+    return 'scale=trunc(iw/2)*2:trunc(ih/2)*2'
+
+
+def build_prepare_image_command(image_path, output_path, camera_effect=None, profile=None):
+    """
+    构建图片预处理的 ffmpeg 命令（同步与异步渲染共用）
+    
+    Returns:
+        list: 命令参数列表
+    """
+    return [
+        'ffmpeg',
+        '-i', str(image_path),
+        '-vf', build_prepare_filter(camera_effect, profile),
+        '-frames:v', '1',
+        '-y',
+        str(output_path)
+    ]
+
+
+def prepared_image_path(image_path, directory, camera_effect=None, profile=None):
+    """
+    预处理后图片的路径，文件名由图片内容和预处理参数决定，相同图片只需处理一次
+    
+    Returns:
+        Path: 预处理后的图片路径（.bmp）
+    """
+    key = make_key('prepared_image', file_sha256(image_path), build_prepare_filter(camera_effect, profile))
+    return Path(directory) / f"prepared_{key[:16]}.bmp"
+
+
+def prepare_image(image_path, directory, camera_effect=None, cancel_event=None, profile=None):
+    """
+    预处理图片：解码一次源图片，缩放到渲染所需的尺寸并保存为 BMP
+    
+    编码片段时 -loop 1 会逐帧重新读取输入图片，BMP 无需解压缩且已是目标尺寸，
+    避免每帧解码和缩放大尺寸 PNG（例如 4K 图片）。目录中已有相同的预处理结果时直接复用。
+    
+    Args:
+        image_path: 源图片路径
+        directory: 预处理图片的存放目录
+        camera_effect: 片段实际使用的运镜效果（None 表示无运镜）
+        cancel_event: threading.Event（可选），被设置时终止预处理
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        Path: 预处理后的图片路径
+    """
+    output_path = prepared_image_path(image_path, directory, camera_effect, profile)
+    with metrics.stage('prepare_image', image=Path(image_path).name) as info:
+        info['cache_hit'] = output_path.exists()
+        if not info['cache_hit']:
+            # 原子写入，并行渲染同一张图片时不会读到不完整的文件
+            with atomic_output(output_path) as tmp_path:
+                run_ffmpeg(build_prepare_image_command(image_path, tmp_path, camera_effect, profile),
+                           cancel_event=cancel_event)
+    return output_path
+
+
+def segment_cache_key(image_path, duration, video_filter, static_clip=False, profile=None):
+    """
+    计算图片片段的缓存键：图片内容哈希 + 时长 + 分辨率/帧率 + 滤镜 + 编码参数
+    
+    Args:
+        image_path: 图片路径
+        duration: 视频时长（秒）
+        video_filter: 视频滤镜字符串
+        static_clip: 片段是否由静态短片段循环生成（见 use_static_clip）
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        str: 缓存键
+    """
+    profile = get_profile(profile)
+    parts = [
+        'segment',
+        file_sha256(image_path),
+        repr(float(duration)),
+        EFFECT_SIZE,
+        EFFECT_FPS,
+        ['framerate', profile.fps or EFFECT_FPS],
+        video_filter,
+        _video_codec_args(profile=profile),
+    ]
+    parts += profile.cache_parts()
+    if static_clip:
+        parts.append(['static_clip', STATIC_CLIP_SECONDS, _static_clip_args()])
+    return make_key(*parts)
+
+
+def use_static_clip(duration, camera_effect=None, effect_duration=1.5):
+    """
+    判断片段是否使用静态快速路径：没有运镜且时长超过两个静态短片段时，
+    先编码 STATIC_CLIP_SECONDS 秒的短片段再循环复制，而不是逐帧编码整个片段
+    """
+    return not has_camera_effect(camera_effect, duration, effect_duration) and duration > STATIC_CLIP_SECONDS * 2
+
+
+def _static_clip_args():
+    """
+    静态短片段的额外编码参数：关闭场景切换检测，短片段（不超过一个 GOP）只有第一帧是关键帧，
+    循环复制后每次重复都从关键帧开始；GOP 长度和 B 帧设置来自编码配置，与其他片段的参数集一致
+    """
+    return ['-sc_threshold', '0']
+
+
+def build_static_clip_command(image_path, output_path, threads=None, profile=None):
+    """
+    构建静态短片段的 ffmpeg 命令：帧率与运镜片段相同，便于与运镜片段直接拼接
+    
+    Returns:
+        list: 命令参数列表
+    """
+    fps = get_profile(profile).fps or EFFECT_FPS
+    frames = int(STATIC_CLIP_SECONDS * fps)
+    cmd = [
+        'ffmpeg',
+        '-framerate', str(fps),
+        '-loop', '1',
+        '-i', str(image_path),
+        '-vf', build_video_filter(STATIC_CLIP_SECONDS, profile=profile),
+    ]
+    cmd += _video_codec_args(threads, profile)
+    cmd += _static_clip_args()
+    cmd += [
+        '-frames:v', str(frames),
+        '-y',
+        str(output_path)
+    ]
+    return cmd
+
+
+def build_loop_command(clip_path, duration, output_path):
+    """
+    构建将短片段循环（流复制，不重新编码）到指定时长的 ffmpeg 命令
+    
+    Returns:
+        list: 命令参数列表
+    """
+    return [
+        'ffmpeg',
+        '-stream_loop', '-1',
+        '-i', str(clip_path),
+        '-c', 'copy',
+        '-t', str(duration),
+        '-y',
+        str(output_path)
+    ]
+
+
+def build_segment_commands(image_path, duration, output_path, camera_effect=None, effect_duration=1.5,
+                           threads=None, profile=None):
+    """
+    构建生成单个图片片段需要依次执行的 ffmpeg 命令（同步与异步渲染共用）
+    
+    静态片段（见 use_static_clip）先编码短片段再循环复制，否则逐帧编码整个片段。
+    
+    Returns:
+        tuple: (命令列表, 需要在完成后删除的中间文件列表)
+    """
+    if not use_static_clip(duration, camera_effect, effect_duration):
+        return [build_image_video_command(image_path, duration, output_path, camera_effect, effect_duration,
+                                          threads, profile)], []
+    
+    output_path = Path(output_path)
+    clip_path = output_path.with_name(f"{output_path.stem}_clip{output_path.suffix}")
+    return [
+        build_static_clip_command(image_path, clip_path, threads, profile),
+        build_loop_command(clip_path, duration, output_path),
+    ], [clip_path]
+
+
+def build_image_video_command(image_path, duration, output_path, camera_effect=None, effect_duration=1.5,
+                              threads=None, profile=None):
+    """
+    构建将单张图片编码为视频片段的 ffmpeg 命令（同步与异步渲染共用）
+    
+    Returns:
+        list: 命令参数列表
+    """
+    profile = get_profile(profile)
+    cmd = ['ffmpeg']
+    if not has_camera_effect(camera_effect, duration, effect_duration):
+        # 运镜片段的帧率由 zoompan 决定；静态片段显式指定相同的帧率（否则为 ffmpeg 默认的 25 fps），
+        # 与运镜片段和静态短片段流复制拼接时帧率一致
+        cmd += ['-framerate', str(profile.fps or EFFECT_FPS)]
+    cmd += [
+        '-loop', '1',
+        '-i', str(image_path),
+        '-vf', build_video_filter(duration, camera_effect, effect_duration, profile),
+    ]
+    cmd += _video_codec_args(threads, profile)
+    cmd += [
+        '-t', str(duration),
+        '-y',  # 覆盖输出文件
+        str(output_path)
+    ]
+    return cmd
+
+
+def build_rawvideo_command(size, fps, output_path, threads=None, profile=None):
+    """
+    构建从标准输入读取 RGB 原始帧并编码的 ffmpeg 命令（numpy 运镜引擎使用）
+    
+    Args:
+        size: 帧尺寸 (宽, 高)
+        fps: 帧率
+        output_path: 输出路径
+        threads: 编码线程数（可选）
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        list: 命令参数列表
+    """
+    width, height = size
+    cmd = [
+        'ffmpeg',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-s', f"{width}x{height}",
+        '-framerate', str(fps),
+        '-i', 'pipe:0',
+    ]
+    cmd += _video_codec_args(threads, profile)
+    return cmd + [
+        '-y',
+        str(output_path)
+    ]
+
+
+def render_motion_segment(image_path, duration, output_path, camera_effect, effect_duration=1.5, threads=None,
+                          cancel_event=None, profile=None):
+    """
+    用 numpy 运镜引擎生成带运镜效果的片段
+    
+    图片只读取一次；运镜部分（effect_duration）逐帧计算裁剪窗口并双线性缩放，原始帧通过管道送入 ffmpeg 编码；
+    运镜结束后的画面保存为一张图片，其余时长按静态片段编码（超过两个静态短片段时循环复制），
+    最后流复制拼接两部分。输出分辨率与图片（预处理后）一致，不强制 16:9。
+    
+    Args:
+        image_path: 图片路径（通常为预处理后的 BMP，其他格式先用 ffmpeg 转换）
+        duration: 片段时长（秒）
+        output_path: 输出视频路径
+        camera_effect: 运镜效果（内置效果、register_motion 注册的效果或 kenburns:... 写法）
+        effect_duration: 运镜效果持续时间（秒）
+        threads: 编码线程数（可选）
+        cancel_event: threading.Event（可选），被设置时停止生成并抛出 RenderCancelled
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+    
+    Returns:
+        Path: 输出视频路径
+    """
+    output_path = Path(output_path)
+    profile = get_profile(profile)
+    fps = profile.fps or EFFECT_FPS
+    path = get_motion(camera_effect)
+    
+    def part(name, suffix=output_path.suffix):
+        return output_path.with_name(f"{output_path.stem}_{name}{suffix}")
+    
+    converted = part('source', '.ppm')
+    motion_clip = part('motion')
+    hold_image = part('hold', '.ppm')
+    hold_clip = part('hold')
+    intermediates = [converted, motion_clip, hold_image, hold_clip]
+    try:
+        image = load_image(image_path)
+        if image is None:
+            # 不是可以直接读取的格式，先解码为 PPM（与静态片段的预处理滤镜相同）
+            run_ffmpeg(build_prepare_image_command(image_path, converted, profile=profile), cancel_event=cancel_event)
+            image = load_image(converted)
+        canvas_size = (image.shape[1], image.shape[0])
+        size = (canvas_size[0] // 2 * 2, canvas_size[1] // 2 * 2)
+        frames = int(effect_duration * fps)
+        
+        with metrics.stage('motion_frames', image=Path(image_path).name, frames=frames, size=f"{size[0]}x{size[1]}"):
+            renderer = MotionRenderer(image, size)
+            with FFmpegPipe(build_rawvideo_command(size, fps, motion_clip, threads, profile)) as pipe:
+                for rect in motion_rects(path, frames, canvas_size, size):
+                    if cancel_event is not None and cancel_event.is_set():
+                        raise RenderCancelled(f"已取消: {output_path.name}")
+                    pipe.write(renderer.render(rect))
+            write_ppm(renderer.render(final_rect(path, canvas_size, size)), hold_image)
+        metrics.add('motion_frames', frames)
+        
+        parts = [motion_clip]
+        hold_duration = duration - frames / fps
+        if hold_duration * fps >= 1:
+            # 静态部分的帧率必须与运镜部分一致才能流复制拼接
+            commands, extra = build_segment_commands(hold_image, hold_duration, hold_clip, threads=threads,
+                                                     profile=profile._replace(fps=fps))
+            intermediates += extra
+            for cmd in commands:
+                run_ffmpeg(cmd, cancel_event=cancel_event)
+            parts.append(hold_clip)
+        
+        list_file = write_concat_list(parts, output_path)
+        try:
+            run_ffmpeg(build_concat_command(list_file, output_path), cancel_event=cancel_event)
+        finally:
+            list_file.unlink()
+    finally:
+        for intermediate in intermediates:
+            if intermediate.exists():
+                intermediate.unlink()
+    return output_path
+
+
+def create_image_video(image_path, duration, output_path, camera_effect=None, effect_duration=1.5,
+                       threads=None, cancel_event=None, cache=None, prepare_dir=None, profile=None,
+                       journal=None, motion_engine='zoompan'):
+    """
+    将单张图片转换为指定时长的视频
+    
+    输出先写入临时文件，编码完成后才重命名为 output_path，中断时不会留下不完整的片段。
+    
+    Args:
+        image_path: 图片路径
+        duration: 视频时长（秒）
+        output_path: 输出视频路径
+        camera_effect: 运镜效果类型 ('zoom_in', 'zoom_out', 'pan_right', 'pan_left', None)
+        effect_duration: 运镜效果持续时间（秒），默认1.5秒
+        threads: 编码线程数（可选），默认由 ffmpeg 自动决定
+        cancel_event: threading.Event（可选），被设置时终止本次编码
+        cache: 片段缓存 FileCache（可选），命中时直接复制缓存结果，跳过 ffmpeg
+        prepare_dir: 预处理图片目录（可选），提供时先用 prepare_image 预处理图片再编码
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+        journal: 任务日志 JobJournal（可选），日志中有有效记录时直接复用已有片段，完成后写入记录
+        motion_engine: 运镜引擎，'zoompan'（ffmpeg 滤镜，默认）或 'numpy'（见 render_motion_segment）
+    
+    Returns:
+        Path: 输出视频路径
+    """
+    output_path = Path(output_path)
+    profile = get_profile(profile)
+    video_filter = segment_filter(duration, camera_effect, effect_duration, profile, motion_engine)
+    use_motion = uses_motion_engine(camera_effect, duration, effect_duration, motion_engine)
+    
+    static_clip = use_static_clip(duration, camera_effect, effect_duration)
+    
+    with metrics.stage('create_image_video', image=Path(image_path).name, duration=duration,
+                       static_clip=static_clip) as info:
+        if cache is not None or journal is not None:
+            cache_key = segment_cache_key(image_path, duration, video_filter, static_clip, profile)
+        if journal is not None:
+            info['resumed'] = journal.completed(output_path.name, cache_key, output_path) is not None
+            if info['resumed']:
+                print(f"  ✅ 复用已完成的片段: {output_path.name}")
+                metrics.add('segments_resumed')
+                return output_path
+        if cache is not None:
+            info['cache_hit'] = cache.get(cache_key, output_path) is not None
+            if info['cache_hit']:
+                if journal is not None:
+                    journal.record(output_path.name, cache_key, output_path)
+                return output_path
+        
+        source_path = image_path
+        if prepare_dir is not None:
+            effect = prepare_effect(camera_effect, duration, effect_duration, motion_engine)
+            source_path = prepare_image(image_path, prepare_dir, effect, cancel_event=cancel_event, profile=profile)
+        
+        with atomic_output(output_path) as tmp_path:
+            if use_motion:
+                render_motion_segment(source_path, duration, tmp_path, camera_effect, effect_duration, threads,
+                                      cancel_event, profile)
+                commands, intermediates = [], []
+            else:
+                commands, intermediates = build_segment_commands(
+                    source_path, duration, tmp_path, camera_effect, effect_duration, threads, profile
+                )
+            try:
+                for cmd in commands:
+                    run_ffmpeg(cmd, cancel_event=cancel_event)
+            finally:
+                for path in intermediates:
+                    if path.exists():
+                        path.unlink()
+    
+    if journal is not None:
+        journal.record(output_path.name, cache_key, output_path)
+    if cache is not None:
+        cache.put(cache_key, output_path)
+    return output_path
+
+
+def render_segments(tasks, workers=1, cache=None, executor=None, journal=None):
+    """
+    渲染多个图片视频片段，workers 大于 1 时使用有界线程池并行编码
+    
+    每个任务是传给 create_image_video 的参数字典（至少包含 image_path、duration、
+    output_path）。并行时编码线程数按 CPU 核数在 worker 之间平均分配；
+    任一片段失败时取消尚未开始的任务、终止正在运行的 ffmpeg，并删除片段输出
+    （提供任务日志时保留已记录的片段，供恢复时复用）。
+    
+    Args:
+        tasks: 片段任务列表
+        workers: 并行渲染的片段数，默认1（串行）；使用共享线程池时为该线程池的大小
+        cache: 片段缓存 FileCache（可选）
+        executor: 共享的 ThreadPoolExecutor（可选），提供时片段提交到该线程池
+        journal: 任务日志 JobJournal（可选）
+    
+    Returns:
+        List[Path]: 片段输出路径列表，顺序与 tasks 一致
+    """
+    workers = int(workers)
+    if workers < 1:
+        raise ValueError(f"workers 必须大于等于 1: {workers}")
+    
+    total = len(tasks)
+    if executor is None and (workers == 1 or total <= 1):
+        outputs = []
+        for i, task in enumerate(tasks, 1):
+            print(f"  处理图片 {i}/{total}: {Path(task['image_path']).name}")
+            outputs.append(create_image_video(cache=cache, journal=journal, **task))
+        return outputs
+    
+    if executor is not None:
+        return _submit_segments(executor, tasks, cache, max(1, (os.cpu_count() or 1) // workers), journal)
+    
+    workers = min(workers, total)
+    threads = max(1, (os.cpu_count() or 1) // workers)
+    print(f"  并行渲染: {workers} 个 worker，每个 {threads} 个编码线程")
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return _submit_segments(executor, tasks, cache, threads, journal)
+
+
+def _submit_segments(executor, tasks, cache, threads, journal=None):
+    """
+    将片段任务提交到线程池并等待完成，失败时取消其余片段并清理输出
+    """
+    total = len(tasks)
+    cancel_event = threading.Event()
+    futures = []
+    for i, task in enumerate(tasks, 1):
+        print(f"  处理图片 {i}/{total}: {Path(task['image_path']).name}")
+        kwargs = dict(task)
+        kwargs.setdefault('threads', threads)
+        kwargs['cancel_event'] = cancel_event
+        kwargs['cache'] = cache
+        kwargs['journal'] = journal
+        futures.append(metrics.submit(executor, create_image_video, **kwargs))
+    
+    _, not_done = wait(futures, return_when=FIRST_EXCEPTION)
+    error = next((f.exception() for f in futures if f.done() and f.exception()), None)
+    if error is not None:
+        cancel_event.set()
+        for future in not_done:
+            future.cancel()
+        wait(not_done)
+        for task in tasks:
+            output_path = Path(task['output_path'])
+            if output_path.exists() and not (journal is not None and journal.is_recorded(output_path)):
+                output_path.unlink()
+        raise error
+    
+    return [future.result() for future in futures]
+
+
+def merge_videos(video_list, output_path):
+    """
+    合并多个视频（内部使用），同样适用于编码参数一致的音频文件
+    
+    Args:
+        video_list: 视频文件路径列表
+        output_path: 输出视频路径
+    
+    Returns:
+        Path: 输出视频路径
+    """
+    output_path = Path(output_path)
+    list_file = write_concat_list(video_list, output_path)
+    
+    # 使用 ffmpeg concat
+    with metrics.stage('merge_videos', inputs=len(video_list)), atomic_output(output_path) as tmp_path:
+        run_ffmpeg(build_concat_command(list_file, tmp_path))
+    
+    # 清理临时文件
+    list_file.unlink()
+    
+    return output_path
+
+
+def write_concat_list(video_list, output_path):
+    """
+    在输出文件所在目录写入 concat demuxer 使用的文件列表
+    
+    列表项也可以是 (路径, 起点, 终点)，只拼接该时间范围（秒，为 None 时不裁剪）；
+    流复制时起点应为关键帧。
+    
+    Returns:
+        Path: 文件列表路径
+    """
+    output_path = Path(output_path)
+    list_file = output_path.parent / f"{output_path.stem}_concat_list.txt"
+    
+    with open(list_file, 'w') as f:
+        for video in video_list:
+            video, inpoint, outpoint = video if isinstance(video, tuple) else (video, None, None)
+            f.write(f"file '{Path(video).absolute()}'\n")
+            if inpoint:
+                f.write(f"inpoint {inpoint:.6f}\n")
+            if outpoint is not None:
+                f.write(f"outpoint {outpoint:.6f}\n")
+    return list_file
+
+
+def build_concat_command(list_file, output_path, audio_bitrate=None):
+    """
+    构建使用 concat demuxer 拼接的 ffmpeg 命令
+    
+    Args:
+        list_file: write_concat_list 生成的文件列表
+        output_path: 输出路径
+        audio_bitrate: AAC 码率（可选），指定时将拼接后的音频编码为 AAC，否则无损流复制
+    
+    Returns:
+        list: 命令参数列表
+    """
+    codec = ['-vn', '-c:a', 'aac', '-b:a', audio_bitrate] if audio_bitrate else ['-c', 'copy']
+    return [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', str(list_file),
+    ] + codec + [
+        '-y',
+        str(output_path)
+    ]
+
+
+# 流复制拼接要求一致的流参数；extradata_hash 为参数集（SPS/PPS）的哈希，输出文件只保存第一个输入的参数集，
+# ID 相同而内容不同的参数集会导致解码错误
+VIDEO_PARAMS = ('codec_name', 'profile', 'width', 'height', 'pix_fmt', 'sample_aspect_ratio', 'r_frame_rate',
+                'time_base', 'extradata_hash')
+AUDIO_PARAMS = ('codec_name', 'sample_rate', 'channels', 'channel_layout')
+
+# 重新编码时使用的编码器（参考参数的编码格式不在其中时统一转为 H.264/AAC）
+VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265'}
+AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus'}
+
+
+def probe_stream_params(video_path):
+    """
+    读取视频的流参数（第一个视频流和第一个音频流）
+    
+    MP4 直接解析 moov 中的流描述，其他格式或无法确定的参数调用 ffprobe（见 media.media_info）。
+    
+    Args:
+        video_path: 视频文件路径
+    
+    Returns:
+        dict: {'video': 视频参数字典, 'audio': 音频参数字典或 None}
+    """
+    info = media_info(video_path)
+    params = {'video': None, 'audio': None}
+    for kind, names in (('video', VIDEO_PARAMS), ('audio', AUDIO_PARAMS)):
+        stream = getattr(info, kind)
+        if stream is not None:
+            params[kind] = {name: str(stream.get(name, '')) for name in names}
+    if params['video'] is None:
+        raise ValueError(f"文件中没有视频流: {video_path}")
+    # 未标注像素宽高比时按 1:1 处理
+    if params['video']['sample_aspect_ratio'] in ('', 'N/A', '0:1'):
+        params['video']['sample_aspect_ratio'] = '1:1'
+    return params
+
+
+def _params_signature(params):
+    """流参数的可比较表示"""
+    video = tuple(params['video'][name] for name in VIDEO_PARAMS)
+    audio = tuple(params['audio'][name] for name in AUDIO_PARAMS) if params['audio'] else None
+    return video, audio
+
+
+def _params_diff(params, reference):
+    """列出与参考参数不一致的字段"""
+    diff = [
+        "参数集(SPS/PPS)不同" if name == 'extradata_hash' else f"{name} {params['video'][name]}≠{reference['video'][name]}"
+        for name in VIDEO_PARAMS if params['video'][name] != reference['video'][name]
+    ]
+    if (params['audio'] is None) != (reference['audio'] is None):
+        diff.append('无音频' if params['audio'] is None else '多余音频')
+    elif params['audio'] is not None:
+        diff += [
+            f"audio {name} {params['audio'][name]}≠{reference['audio'][name]}"
+            for name in AUDIO_PARAMS if params['audio'][name] != reference['audio'][name]
+        ]
+    return diff
+
+
+def reference_params(params_list):
+    """
+    选择拼接的参考参数：出现次数最多的参数组合，使尽可能多的输入可以直接流复制
+    
+    参考参数的编码格式无法重新编码时改为 H.264/AAC（此时所有输入都需要重新编码）。
+    
+    Args:
+        params_list: probe_stream_params 结果列表
+    
+    Returns:
+        dict: 参考参数
+    """
+    signature, _ = Counter(_params_signature(params) for params in params_list).most_common(1)[0]
+    reference = next(params for params in params_list if _params_signature(params) == signature)
+    reference = {
+        'video': dict(reference['video']),
+        'audio': dict(reference['audio']) if reference['audio'] else None,
+    }
+    if reference['video']['codec_name'] not in VIDEO_ENCODERS:
+        reference['video'].update(codec_name='h264', profile='High', pix_fmt='yuv420p', extradata_hash='')
+    if reference['audio'] is not None and reference['audio']['codec_name'] not in AUDIO_ENCODERS:
+        reference['audio']['codec_name'] = 'aac'
+    return reference
+
+
+def build_normalize_video_command(video_path, output_path, reference, input_has_audio=True, threads=None):
+    """
+    构建将视频重新编码为参考参数（分辨率、帧率、像素格式、SAR、时间基、音频参数）的 ffmpeg 命令
+    
+    宽高比不同时等比缩放并居中填充；参考参数有音频而输入没有时补静音。
+    
+    Returns:
+        list: 命令参数列表
+    """
+    video = reference['video']
+    audio = reference['audio']
+    width, height = video['width'], video['height']
+    
+    cmd = ['ffmpeg', '-i', str(video_path)]
+    if audio is not None and not input_has_audio:
+        layout = audio['channel_layout'] or ('mono' if audio['channels'] == '1' else 'stereo')
+        cmd += ['-f', 'lavfi', '-i', f"anullsrc=r={audio['sample_rate']}:cl={layout}"]
+    
+    cmd += [
+        '-map', '0:v:0',
+        '-vf', (
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,"
+            f"setsar={video['sample_aspect_ratio'].replace(':', '/')},"
+            f"fps={video['r_frame_rate']},format={video['pix_fmt']}"
+        ),
+    ] + _reference_video_args(video, threads)
+    
+    if audio is None:
+        cmd += ['-an']
+    else:
+        cmd += ['-map', '0:a:0' if input_has_audio else '1:a:0'] + _reference_audio_args(audio)
+        if not input_has_audio:
+            cmd += ['-shortest']
+    
+    cmd += ['-y', str(output_path)]
+    return cmd
+
+
+def build_reencode_concat_command(video_list, output_path, reference, threads=None):
+    """
+    构建用 concat 滤镜重新编码拼接视频的 ffmpeg 命令（各输入的流参数均与参考参数一致），
+    输出只有一组参数集
+    
+    Returns:
+        list: 命令参数列表
+    """
+    audio = reference['audio']
+    cmd = ['ffmpeg']
+    inputs = []
+    for k, path in enumerate(video_list):
+        cmd += ['-i', str(path)]
+        inputs.append(f"[{k}:v:0]" if audio is None else f"[{k}:v:0][{k}:a:0]")
+    outputs = '[v]' if audio is None else '[v][a]'
+    graph = f"{''.join(inputs)}concat=n={len(video_list)}:v=1:a={0 if audio is None else 1}{outputs}"
+    cmd += ['-filter_complex', graph, '-map', '[v]'] + _reference_video_args(reference['video'], threads)
+    if audio is None:
+        cmd += ['-an']
+    else:
+        cmd += ['-map', '[a]'] + _reference_audio_args(audio)
+    cmd += ['-y', str(output_path)]
+    return cmd
+
+
+# x264 版本信息 SEI 中决定参数集（SPS/PPS）的编码参数 → -x264-params 参数名（取值原样传递）
+X264_PARAMETER_SET_OPTIONS = {
+    'cabac': 'cabac',
+    'ref': 'ref',
+    'bframes': 'bframes',
+    'weightb': 'weightb',
+    'weightp': 'weightp',
+    '8x8dct': '8x8dct',
+    'constrained_intra': 'constrained-intra',
+    'bluray_compat': 'bluray-compat',
+    'keyint': 'keyint',
+    'keyint_min': 'min-keyint',
+    'psy': 'psy',
+    'subme': 'subme',
+    'trellis': 'trellis',
+    'vbv_maxrate': 'vbv-maxrate',
+    'vbv_bufsize': 'vbv-bufsize',
+}
+X264_PYRAMIDS = ('none', 'strict', 'normal')
+X264_CQMS = ('flat', 'jvt')
+
+
+def x264_params(options):
+    """
+    由 x264 写入的编码参数（media.read_encoder_options 的结果）生成 -x264-params 参数值，
+    重新编码的片段与原视频的参数集（SPS/PPS）一致，可以与原视频流复制拼接
+    
+    只还原参数集相关的参数：参考帧数、B 帧、熵编码、8x8 变换、加权预测、GOP 长度（决定 frame_num 的位数）、
+    量化矩阵、码率控制（决定 PPS 的初始 QP）和色度 QP 偏移。SEI 中的色度 QP 偏移已按 psy-rd 调整过，
+    传给 x264 前先加回调整量。
+    
+    Args:
+        options: 编码参数字典，None 表示未知
+    
+    Returns:
+        str: -x264-params 参数值，参数未知或无法还原（隔行扫描、自定义量化矩阵、多遍编码）时返回 None
+    """
+    if not options or options.get('interlaced', '0') != '0':
+        return None
+    try:
+        params = [f"{name}={options[key]}" for key, name in X264_PARAMETER_SET_OPTIONS.items() if key in options]
+        params.append(f"b-pyramid={X264_PYRAMIDS[int(options.get('b_pyramid', 0))]}")
+        params.append(f"cqm={X264_CQMS[int(options.get('cqm', 0))]}")
+        rc = options.get('rc')
+        if rc == 'crf':
+            params.append(f"crf={options['crf']}")
+        elif rc == 'cqp':
+            params.append(f"qp={options['qp']}")
+        elif rc in ('abr', 'cbr'):
+            params.append(f"bitrate={options['bitrate']}")
+        else:
+            return None
+        
+        psy_rd, _, psy_trellis = options.get('psy_rd', '0:0').partition(':')
+        psy_rd, psy_trellis = float(psy_rd), float(psy_trellis or 0)
+        chroma_qp_offset = int(options.get('chroma_qp_offset', 0))
+        if int(options.get('subme', 0)) >= 6 and psy_rd > 0:
+            chroma_qp_offset += 1 if psy_rd < 0.25 else 2
+        if int(options.get('trellis', 0)) and psy_trellis > 0:
+            chroma_qp_offset += 1 if psy_trellis < 0.25 else 2
+    except (KeyError, ValueError, IndexError):
+        return None
+    params += [f"psy-rd={psy_rd:.2f},{psy_trellis:.2f}", f"chroma-qp-offset={chroma_qp_offset}"]
+    return ':'.join(params)
+
+
+def _reference_video_args(video, threads=None):
+    """
+    按参考视频参数编码的 ffmpeg 参数（编码器、像素格式、profile、时间基）；
+    参考参数带有 x264_params（见 x264_params）时按参考视频的 x264 参数编码
+    """
+    encoder = VIDEO_ENCODERS[video['codec_name']]
+    args = ['-c:v', encoder, '-pix_fmt', video['pix_fmt']]
+    if encoder == 'libx264':
+        args += ['-tune', 'stillimage']
+        profile = video['profile'].lower().replace('constrained ', '')
+        if profile in ('baseline', 'main', 'high'):
+            args += ['-profile:v', profile]
+        if video.get('x264_params'):
+            args += ['-x264-params', video['x264_params']]
+    if threads:
+        args += ['-threads', str(threads)]
+    time_base = video['time_base'].split('/')
+    if len(time_base) == 2:
+        args += ['-video_track_timescale', time_base[1]]
+    return args
+
+
+def _reference_audio_args(audio):
+    """按参考音频参数编码的 ffmpeg 参数"""
+    return [
+        '-c:a', AUDIO_ENCODERS[audio['codec_name']],
+        '-ar', audio['sample_rate'],
+        '-ac', audio['channels'],
+    ]
+
+
+# 转场效果对应的 ffmpeg xfade 效果（需要 ffmpeg 4.3 及以上）
+TRANSITIONS = {
+    'crossfade': 'fade',
+    'fadeblack': 'fadeblack',
+    'fadewhite': 'fadewhite',
+    'wipeleft': 'wipeleft',
+    'wiperight': 'wiperight',
+    'slideleft': 'slideleft',
+    'slideright': 'slideright',
+}
+
+# 未指定时长时的转场时长（秒）
+DEFAULT_TRANSITION_DURATION = 0.5
+
+# 比较关键帧时间时允许的误差（秒）
+KEYFRAME_TOLERANCE = 1e-3
+
+
+def parse_transition(transition):
+    """
+    解析转场参数 '效果[:时长]'（如 'crossfade:0.5'）
     
     Args:
-        audio_path: 音频文件路径
+        transition: 转场参数，效果见 TRANSITIONS，时长默认 DEFAULT_TRANSITION_DURATION 秒
     
     Returns:
-        float: 音频时长（秒）
+        tuple: (xfade 效果, 时长)，transition 为空时返回 None
     """
-    result = subprocess.run(
-        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-         '-of', 'default=noprint_wrappers=1:nokey=1', str(audio_path)],
-        capture_output=True,
-        text=True,
-        check=True
-    )
-    return float(result.stdout.strip())
+    if not transition:
+        return None
+    name, _, seconds = str(transition).partition(':')
+    name = name.strip()
+    if name not in TRANSITIONS:
+        raise ValueError(f"不支持的转场效果: {name}（可选: {', '.join(TRANSITIONS)}）")
+    try:
+        duration = float(seconds) if seconds.strip() else DEFAULT_TRANSITION_DURATION
+    except ValueError:
+        raise ValueError(f"转场时长无效: {seconds}")
+    if not duration > 0:
+        raise ValueError(f"转场时长必须大于 0: {seconds}")
+    return TRANSITIONS[name], duration
 
 
-def create_image_video(image_path, duration, output_path, camera_effect=None, effect_duration=1.5):
+def plan_transitions(durations, keyframes, duration):
     """
-    将单张图片转换为指定时长的视频
+    规划带转场的拼接：每个交界处在前一个视频中取转场开始前最近的关键帧，在后一个视频中取转场结束后最近的关键帧，
+    两个关键帧之间重新编码为转场窗口，其余部分直接流复制
+    
+    视频较短、两端的转场之间没有关键帧时，整个视频并入转场窗口（一个窗口可以包含多个转场）。
     
     Args:
-        image_path: 图片路径
-        duration: 视频时长（秒）
+        durations: 各视频时长（秒）
+        keyframes: 各视频的关键帧时间列表（秒，升序）
+        duration: 转场时长（秒）
+    
+    Returns:
+        list: 按顺序的拼接项：('copy', (序号, 起点, 终点或 None)) 为流复制的范围（终点为 None 时到文件末尾），
+        ('window', [(序号, 起点, 终点), ...]) 为需要重新编码的转场窗口
+    """
+    count = len(durations)
+    for i, length in enumerate(durations):
+        if length <= duration * ((i > 0) + (i < count - 1)):
+            raise ValueError(f"第 {i + 1} 个视频时长 {length:.2f} 秒，不足以放入 {duration} 秒的转场")
+    
+    plan = []
+    window = []
+    for i, length in enumerate(durations):
+        keys = keyframes[i]
+        # 转场结束后的第一个关键帧（第一个视频从头开始）
+        head = 0.0 if i == 0 else next((k for k in keys if k >= duration - KEYFRAME_TOLERANCE), None)
+        if i == count - 1 or head is None:
+            tail = length
+        else:
+            # 下一个转场开始前的最后一个关键帧
+            tail = next((k for k in reversed(keys)
+                         if head - KEYFRAME_TOLERANCE <= k <= length - duration + KEYFRAME_TOLERANCE), None)
+        if head is None or tail is None:
+            window.append((i, 0.0, length))
+            continue
+        if window:
+            window.append((i, 0.0, head))
+            plan.append(('window', window))
+        if tail > head + KEYFRAME_TOLERANCE:
+            plan.append(('copy', (i, head, tail if i < count - 1 else None)))
+        window = [(i, tail, length)] if i < count - 1 else []
+    if window:
+        plan.append(('window', window))
+    return plan
+
+
+def build_transition_command(pieces, output_path, reference, effect, duration, threads=None):
+    """
+    构建渲染转场窗口的 ffmpeg 命令：依次用 xfade/acrossfade 连接各片段
+    
+    Args:
+        pieces: [(视频路径, 起点, 终点)]（秒），相邻片段之间各有一个转场
+        output_path: 输出路径
+        reference: 参考参数，窗口按该参数编码，与流复制的部分可以直接拼接
+        effect: xfade 效果
+        duration: 转场时长（秒）
+        threads: 编码线程数（可选）
+    
+    Returns:
+        list: 命令参数列表
+    """
+    video = reference['video']
+    audio = reference['audio']
+    cmd = ['ffmpeg']
+    filters = []
+    for k, (path, start, end) in enumerate(pieces):
+        if start:
+            cmd += ['-ss', f"{start:.6f}"]
+        cmd += ['-t', f"{end - start:.6f}", '-i', str(path)]
+        filters.append(f"[{k}:v]setpts=PTS-STARTPTS,fps={video['r_frame_rate']},format={video['pix_fmt']}[v{k}]")
+        if audio is not None:
+            filters.append(f"[{k}:a]asetpts=PTS-STARTPTS[a{k}]")
+    
+    video_label, audio_label = 'v0', 'a0'
+    offset = 0.0
+    for k in range(1, len(pieces)):
+        _, start, end = pieces[k - 1]
+        offset += end - start - duration
+        filters.append(f"[{video_label}][v{k}]xfade=transition={effect}:duration={duration}:offset={offset:.6f}[x{k}]")
+        video_label = f"x{k}"
+        if audio is not None:
+            filters.append(f"[{audio_label}][a{k}]acrossfade=d={duration}[y{k}]")
+            audio_label = f"y{k}"
+    
+    cmd += ['-filter_complex', ';'.join(filters), '-map', f"[{video_label}]"] + _reference_video_args(video, threads)
+    if audio is None:
+        cmd += ['-an']
+    else:
+        cmd += ['-map', f"[{audio_label}]"] + _reference_audio_args(audio)
+    cmd += ['-y', str(output_path)]
+    return cmd
+
+
+def _duration_and_keyframes(video_path):
+    """视频时长和关键帧时间"""
+    duration = media_info(video_path).duration
+    if duration is None:
+        raise ValueError(f"无法读取视频时长: {video_path}")
+    return duration, keyframe_times(video_path)
+
+
+def merge_with_transitions(video_list, output_path, reference, transition, workers=None):
+    """
+    拼接流参数一致的视频，相邻视频之间加入转场
+    
+    只有每个交界处两侧关键帧之间的短窗口重新编码（多个窗口并行），其余部分通过 concat 的
+    inpoint/outpoint 直接流复制，转场的长短与视频总时长无关。窗口按参考参数编码（参考视频由 x264 编码时
+    使用其 x264 参数）；窗口的参数集（SPS/PPS）与某个原视频不同时，该视频流复制的范围也按参考参数
+    重新编码，使拼接的所有部分参数集一致。
+    
+    Args:
+        video_list: 视频文件路径列表（流参数均与 reference 一致）
         output_path: 输出视频路径
-        camera_effect: 运镜效果类型 ('zoom_in', 'zoom_out', 'pan_right', 'pan_left', None)
-        effect_duration: 运镜效果持续时间（秒），默认1.5秒
+        reference: 参考参数（reference_params 的结果）
+        transition: parse_transition 的结果 (xfade 效果, 时长)
+        workers: 并行读取关键帧和编码转场窗口的数量（默认为 CPU 核数）
     
     Returns:
-        Path: 输出视频路径
+        dict: {'windows': 转场窗口数, 'ranges': 因参数集不同而重新编码的流复制范围数,
+        'reencoded_seconds': 重新编码的时长（秒）, 'full_reencode': 是否整体重新编码（窗口之间的参数集不一致时）}
     """
+    video_list = [Path(video) for video in video_list]
     output_path = Path(output_path)
+    effect, duration = transition
+    workers = max(1, int(workers or os.cpu_count() or 1))
     
-    # 基础滤镜：确保宽高是偶数
-    base_filter = 'scale=trunc(iw/2)*2:trunc(ih/2)*2'
+    with metrics.stage('probe_keyframes', inputs=len(video_list)):
+        with ThreadPoolExecutor(max_workers=min(workers, len(video_list))) as executor:
+            futures = [metrics.submit(executor, _duration_and_keyframes, video) for video in video_list]
+            probed = [future.result() for future in futures]
+    plan = plan_transitions([length for length, _ in probed], [keys for _, keys in probed], duration)
     
-    # 根据运镜效果类型构建滤镜
-    if camera_effect and duration > effect_duration:
-        fps = 30  # 帧率
-        effect_frames = int(effect_duration * fps)
-        total_frames = int(duration * fps)
-        
-        if camera_effect == 'zoom_in':
-            # 缩放进入效果：从1.2倍缩放到1倍（正常大小）
-            zoom_filter = (
-                f"zoompan=z='if(lte(on,{effect_frames}),1.2-0.2*on/{effect_frames},1)'"
-                f":d={total_frames}:s=1920x1080:fps={fps}"
-            )
-            video_filter = f"{base_filter},{zoom_filter}"
-            
-        elif camera_effect == 'zoom_out':
-            # 缩放退出效果：从1倍缩放到1.2倍
-            zoom_filter = (
-                f"zoompan=z='if(lte(on,{effect_frames}),1+0.2*on/{effect_frames},1.2)'"
-                f":d={total_frames}:s=1920x1080:fps={fps}"
-            )
-            video_filter = f"{base_filter},{zoom_filter}"
-            
-        elif camera_effect == 'pan_right':
-            # 向右平移效果
-            zoom_filter = (
-                f"zoompan=z=1.2"
-                f":x='if(lte(on,{effect_frames}),iw/2-(iw/2)*on/{effect_frames},iw/2)'"
-                f":d={total_frames}:s=1920x1080:fps={fps}"
-            )
-            video_filter = f"{base_filter},{zoom_filter}"
-            
-        elif camera_effect == 'pan_left':
-            # 向左平移效果
-            zoom_filter = (
-                f"zoompan=z=1.2"
-                f":x='if(lte(on,{effect_frames}),iw/2+(iw/2)*on/{effect_frames},iw)'"
-                f":d={total_frames}:s=1920x1080:fps={fps}"
-            )
-            video_filter = f"{base_filter},{zoom_filter}"
+    windows_dir = output_path.parent / f"{output_path.stem}_transitions"
+    windows = {}
+    entries = []
+    for kind, item in plan:
+        if kind == 'copy':
+            index, start, end = item
+            entries.append((video_list[index], start, end))
         else:
-            video_filter = base_filter
-    else:
-        video_filter = base_filter
+            window_path = windows_dir / f"{len(windows) + 1:03d}{output_path.suffix or '.mp4'}"
+            windows[window_path] = [(video_list[index], start, end) for index, start, end in item]
+            entries.append(window_path)
+    reencoded = sum(sum(end - start for _, start, end in pieces) - (len(pieces) - 1) * duration
+                    for pieces in windows.values())
     
-    cmd = [
-        'ffmpeg',
-        '-loop', '1',
-        '-i', str(image_path),
-        '-vf', video_filter,
-        '-c:v', 'libx264',
-        '-tune', 'stillimage',
-        '-pix_fmt', 'yuv420p',
-        '-t', str(duration),
-        '-y',  # 覆盖输出文件
-        str(output_path)
-    ]
+    windows_dir.mkdir(parents=True, exist_ok=True)
+    threads = max(1, (os.cpu_count() or 1) // min(workers, len(windows)))
+    ranges = {}
+    try:
+        with metrics.stage('transition_windows', windows=len(windows)):
+            _encode_pieces(windows, reference, effect, duration, workers, threads)
+        
+        # 窗口的参数集与某个原视频不同时（原视频由其他编码器或 x264 版本编码），该视频流复制的范围
+        # 也按参考参数重新编码，与窗口一起拼接；其余范围仍然直接流复制
+        window_sets = {probe_stream_params(path)['video']['extradata_hash'] for path in windows}
+        if len(window_sets) > 1:
+            merge_reencoded(video_list, output_path, reference, transition)
+            return {'windows': 0, 'ranges': 0, 'reencoded_seconds': sum(length for length, _ in probed),
+                    'full_reencode': True}
+        parameter_set = window_sets.pop()
+        for k, entry in enumerate(entries):
+            if isinstance(entry, tuple) and probe_stream_params(entry[0])['video']['extradata_hash'] != parameter_set:
+                path, start, end = entry
+                end = probed[video_list.index(path)][0] if end is None else end
+                range_path = windows_dir / f"range_{len(ranges) + 1:03d}{output_path.suffix or '.mp4'}"
+                ranges[range_path] = [(path, start, end)]
+                entries[k] = range_path
+                reencoded += end - start
+        if ranges:
+            with metrics.stage('transition_ranges', ranges=len(ranges)):
+                _encode_pieces(ranges, reference, effect, duration, workers, threads)
+        merge_videos(entries, output_path)
+    finally:
+        for window_path in list(windows) + list(ranges):
+            if window_path.exists():
+                window_path.unlink()
+        try:
+            windows_dir.rmdir()
+        except OSError:
+            pass
+    return {'windows': len(windows), 'ranges': len(ranges), 'reencoded_seconds': reencoded, 'full_reencode': False}
+
+
+def _encode_pieces(outputs, reference, effect, duration, workers, threads):
+    """
+    并行编码转场窗口（或单独重新编码的流复制范围，只有一个片段时不加转场）
+    
+    Args:
+        outputs: {输出路径: [(视频路径, 起点, 终点), ...]}
+    """
+    with ThreadPoolExecutor(max_workers=min(workers, len(outputs))) as executor:
+        futures = [
+            metrics.submit(executor, run_ffmpeg, build_transition_command(
+                pieces, path, reference, effect, duration, threads=threads
+            ))
+            for path, pieces in outputs.items()
+        ]
+        for future in futures:
+            future.result()
+
+
+def merge_reencoded(video_list, output_path, reference, transition=None):
+    """
+    重新编码拼接流参数一致的视频：各部分的参数集（SPS/PPS）不同、无法流复制拼接时使用，
+    一次 ffmpeg 调用解码所有输入，输出只有一组参数集
+    
+    Args:
+        video_list: 视频文件路径列表（流参数均与 reference 一致）
+        output_path: 输出视频路径
+        reference: 参考参数（reference_params 的结果）
+        transition: parse_transition 的结果 (xfade 效果, 时长)（可选），指定时相邻视频之间加入转场
     
-    subprocess.run(cmd, check=True, capture_output=True, text=True)
+    Returns:
+        Path: 输出视频路径
+    """
+    output_path = Path(output_path)
+    with metrics.stage('reencode_all', inputs=len(video_list)), atomic_output(output_path) as tmp_path:
+        if transition:
+            effect, duration = transition
+            pieces = [(video, 0.0, _duration_and_keyframes(video)[0]) for video in video_list]
+            cmd = build_transition_command(pieces, tmp_path, reference, effect, duration)
+        else:
+            cmd = build_reencode_concat_command(video_list, tmp_path, reference)
+        run_ffmpeg(cmd)
     return output_path
 
 
-def merge_videos(video_list, output_path):
+def merge_videos_checked(video_list, output_path, workers=None, transition=None):
     """
-    合并多个视频（内部使用）
+    合并任意来源的视频：先并行读取所有输入的流参数，参数一致的输入直接流复制，
+    只将参数不一致的输入（并行）重新编码为参考参数后再拼接
+    
+    参考视频由 x264 编码时按其 x264 参数重新编码（见 x264_params），重新编码的结果与直接流复制的输入
+    参数集（SPS/PPS）相同才流复制拼接，否则改为整体重新编码（见 merge_reencoded）。
     
     Args:
         video_list: 视频文件路径列表
         output_path: 输出视频路径
+        workers: 并行读取和重新编码的数量（默认为 CPU 核数）
+        transition: 相邻视频之间的转场（可选），如 'crossfade:0.5'，见 parse_transition
     
     Returns:
-        Path: 输出视频路径
+        dict: {'output': 输出路径, 'copied': 直接流复制的输入列表, 'reencoded': {输入: 不一致的参数列表},
+        'transitions': merge_with_transitions 的结果或 None, 'full_reencode': 是否整体重新编码}
     """
+    video_list = [Path(video) for video in video_list]
     output_path = Path(output_path)
-    temp_dir = output_path.parent
-    list_file = temp_dir / "concat_list.txt"
+    workers = max(1, int(workers or os.cpu_count() or 1))
+    transition = parse_transition(transition) if len(video_list) > 1 else None
     
-    # 创建文件列表
-    with open(list_file, 'w') as f:
-        for video in video_list:
-            f.write(f"file '{Path(video).absolute()}'\n")
+    with metrics.stage('probe_inputs', inputs=len(video_list)):
+        with ThreadPoolExecutor(max_workers=min(workers, len(video_list))) as executor:
+            futures = [metrics.submit(executor, probe_stream_params, video) for video in video_list]
+            params_list = [future.result() for future in futures]
     
-    # 使用 ffmpeg concat
-    cmd = [
-        'ffmpeg',
-        '-f', 'concat',
-        '-safe', '0',
-        '-i', str(list_file),
-        '-c', 'copy',
-        '-y',
-        str(output_path)
-    ]
+    reference = reference_params(params_list)
+    has_audio = {video: params['audio'] is not None for video, params in zip(video_list, params_list)}
+    mismatched = {}
+    for video, params in zip(video_list, params_list):
+        diff = _params_diff(params, reference)
+        if diff:
+            mismatched[video] = diff
     
-    subprocess.run(cmd, check=True, capture_output=True, text=True)
+    summary = {
+        'output': output_path,
+        'copied': [video for video in video_list if video not in mismatched],
+        'reencoded': mismatched,
+        'transitions': None,
+        'full_reencode': False,
+    }
+    if summary['copied'] and reference['video']['codec_name'] == 'h264':
+        reference['video']['x264_params'] = x264_params(read_encoder_options(summary['copied'][0]))
     
-    # 清理临时文件
-    list_file.unlink()
+    def concat(videos):
+        if transition:
+            summary['transitions'] = merge_with_transitions(videos, output_path, reference, transition, workers)
+        else:
+            merge_videos(videos, output_path)
     
-    return output_path
+    if not mismatched:
+        concat(video_list)
+        return summary
+    
+    normalized_dir = output_path.parent / f"{output_path.stem}_normalized"
+    normalized_dir.mkdir(parents=True, exist_ok=True)
+    normalized = {
+        video: normalized_dir / f"{i:03d}_{video.stem}{output_path.suffix or '.mp4'}"
+        for i, video in enumerate(video_list, 1) if video in mismatched
+    }
+    threads = max(1, (os.cpu_count() or 1) // min(workers, len(normalized)))
+    try:
+        with metrics.stage('normalize_inputs', inputs=len(normalized)):
+            with ThreadPoolExecutor(max_workers=min(workers, len(normalized))) as executor:
+                futures = [
+                    metrics.submit(executor, run_ffmpeg, build_normalize_video_command(
+                        video, target, reference, input_has_audio=has_audio[video], threads=threads
+                    ))
+                    for video, target in normalized.items()
+                ]
+                for future in futures:
+                    future.result()
+        parameter_sets = {probe_stream_params(target)['video']['extradata_hash'] for target in normalized.values()}
+        if summary['copied']:
+            parameter_sets.add(reference['video']['extradata_hash'])
+        if len(parameter_sets) > 1:
+            # 重新编码的输入与其余输入的参数集不同，流复制拼接后无法正确解码
+            summary['copied'] = []
+            summary['full_reencode'] = True
+            merge_reencoded([normalized.get(video, video) for video in video_list], output_path, reference, transition)
+        else:
+            concat([normalized.get(video, video) for video in video_list])
+    finally:
+        for target in normalized.values():
+            if target.exists():
+                target.unlink()
+        try:
+            normalized_dir.rmdir()
+        except OSError:
+            pass
+    return summary
 
 
-def merge_videos_simple(input_videos, output_video):
+def merge_videos_simple(input_videos, output_video, workers=None, transition=None):
     """
     合并多个视频文件为一个视频（命令行使用）
     
+    输入的编码参数（分辨率、帧率、时间基、SAR 等）不一致时，只重新编码不一致的输入，
+    其余输入直接流复制。
+    
     Args:
         input_videos: 视频文件路径，多个视频用逗号分隔（例如: a.mp4,b.mp4,c.mp4）
         output_video: 输出视频路径
+        workers: 并行读取和重新编码的数量（默认为 CPU 核数）
+        transition: 相邻视频之间的转场（可选），如 'crossfade:0.5'，只重新编码交界处的短窗口
     
     Returns:
         Path: 输出视频路径
@@ -165,6 +1644,7 @@ def merge_videos_simple(input_videos, output_video):
     for video_file in video_files:
         if not video_file.exists():
             raise FileNotFoundError(f"视频文件不存在: {video_file}")
+    parse_transition(transition)
     
     output_path = Path(output_video)
     output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -176,9 +1656,33 @@ def merge_videos_simple(input_videos, output_video):
     for i, video in enumerate(video_files, 1):
         print(f"  {i}. {video}")
     print(f"输出视频: {output_path}")
+    if transition:
+        print(f"转场: {transition}")
     
     print(f"\n正在合并视频...")
-    result = merge_videos(video_files, output_path)
+    summary = merge_videos_checked(video_files, output_path, workers=workers, transition=transition)
+    result = summary['output']
+    
+    if summary['reencoded']:
+        print(f"\n参数不一致，已重新编码 {len(summary['reencoded'])} 个视频"
+              f"（其余 {len(summary['copied'])} 个直接流复制）:")
+        for video, diff in summary['reencoded'].items():
+            print(f"  {video}: {', '.join(diff)}")
+        if summary['full_reencode']:
+            print("重新编码的视频与其余视频的参数集（SPS/PPS）不同，无法直接流复制，已整体重新编码")
+    elif summary['transitions']:
+        print("所有视频参数一致")
+    else:
+        print(f"所有视频参数一致，直接流复制")
+    
+    if summary['transitions'] and summary['transitions']['full_reencode']:
+        print(f"已加入转场: 转场窗口之间的参数集（SPS/PPS）不同，无法直接流复制，"
+              f"已整体重新编码 {summary['transitions']['reencoded_seconds']:.1f} 秒")
+    elif summary['transitions']:
+        ranges = summary['transitions']['ranges']
+        print(f"已加入转场: 重新编码 {summary['transitions']['windows']} 个交界窗口"
+              + (f"和 {ranges} 段参数集（SPS/PPS）与窗口不同的片段" if ranges else "")
+              + f"，共 {summary['transitions']['reencoded_seconds']:.1f} 秒，其余部分直接流复制")
     
     print(f"\n✅ 视频合并完成: {result}")
     print("=" * 60)
@@ -186,7 +1690,7 @@ def merge_videos_simple(input_videos, output_video):
     return result
 
 
-def add_audio_to_video(video_path, audio_path, output_path):
+def add_audio_to_video(video_path, audio_path, output_path, profile=None, copy_audio=False):
     """
     将音频添加到视频
     
@@ -194,57 +1698,426 @@ def add_audio_to_video(video_path, audio_path, output_path):
         video_path: 视频文件路径
         audio_path: 音频文件路径
         output_path: 输出视频路径
+        profile: 编码配置（名称或 EncoderProfile），决定音频码率，默认 balanced
+        copy_audio: 音频已是 AAC（例如流式合成的 .m4a）时直接流复制，不重新编码
     
     Returns:
         Path: 输出视频路径
     """
     output_path = Path(output_path)
-    
+    with metrics.stage('add_audio_to_video'), atomic_output(output_path) as tmp_path:
+        run_ffmpeg(build_add_audio_command(video_path, audio_path, tmp_path, profile, copy_audio))
+    return output_path
+
+
+def _audio_codec_args(profile=None, copy_audio=False):
+    """输出音频的编码参数"""
+    if copy_audio:
+        return ['-c:a', 'copy']
+    return ['-c:a', 'aac', '-b:a', get_profile(profile).audio_bitrate]
+
+
+def build_add_audio_command(video_path, audio_path, output_path, profile=None, copy_audio=False):
+    """构建为视频添加音频的 ffmpeg 命令"""
     cmd = [
         'ffmpeg',
         '-i', str(video_path),
         '-i', str(audio_path),
         '-c:v', 'copy',
-        '-c:a', 'aac',
-        '-b:a', '192k',
+    ]
+    cmd += _audio_codec_args(profile, copy_audio)
+    return cmd + [
+        '-shortest',
+        '-y',
+        str(output_path)
+    ]
+
+
+def build_mux_command(list_file, audio_path, output_path, profile=None, copy_audio=False):
+    """
+    构建一次完成片段拼接和添加音频的 ffmpeg 命令：concat demuxer 读取片段列表，视频流复制，
+    不再先写出合并后的中间视频
+    
+    Args:
+        list_file: write_concat_list 生成的片段列表
+        audio_path: 音频文件路径
+        output_path: 输出视频路径
+        profile: 编码配置（名称或 EncoderProfile），决定音频码率，默认 balanced
+        copy_audio: 音频已是 AAC 时直接流复制
+    
+    Returns:
+        list: 命令参数列表
+    """
+    cmd = [
+        'ffmpeg',
+        '-f', 'concat',
+        '-safe', '0',
+        '-i', str(list_file),
+        '-i', str(audio_path),
+        '-map', '0:v:0',
+        '-map', '1:a:0',
+        '-c:v', 'copy',
+    ]
+    cmd += _audio_codec_args(profile, copy_audio)
+    return cmd + [
+        '-shortest',
+        '-y',
+        str(output_path)
+    ]
+
+
+def build_mux_reencode_command(video_segments, audio_path, output_path, size, profile=None, copy_audio=False,
+                               threads=None):
+    """
+    构建重新编码拼接片段并添加音频的 ffmpeg 命令（concat 滤镜）：片段的参数集不一致、不能流复制拼接时使用，
+    各片段缩放到 size 并居中填充
+    
+    Args:
+        video_segments: 视频片段路径列表
+        audio_path: 音频文件路径
+        output_path: 输出视频路径
+        size: 输出尺寸 (宽, 高)
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced
+        copy_audio: 音频已是 AAC 时直接流复制
+        threads: 编码线程数（可选）
+    
+    Returns:
+        list: 命令参数列表
+    """
+    width, height = size
+    count = len(video_segments)
+    cmd = ['ffmpeg']
+    filters = []
+    for k, segment in enumerate(video_segments):
+        cmd += ['-i', str(segment)]
+        filters.append(f"[{k}:v:0]scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                       f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1[v{k}]")
+    filters.append(f"{''.join(f'[v{k}]' for k in range(count))}concat=n={count}:v=1:a=0[v]")
+    cmd += [
+        '-i', str(audio_path),
+        '-filter_complex', ';'.join(filters),
+        '-map', '[v]',
+        '-map', f"{count}:a:0",
+    ]
+    cmd += _video_codec_args(threads, profile) + _audio_codec_args(profile, copy_audio)
+    return cmd + [
         '-shortest',
         '-y',
         str(output_path)
     ]
+
+
+def mux_reencode_size(video_segments):
+    """
+    流复制拼接的输出只保存第一个片段的参数集（SPS/PPS）；片段的参数集不一致时（例如复用了其他版本生成的
+    缓存片段）需要重新编码拼接
+    
+    Returns:
+        tuple: 需要重新编码时为输出尺寸（第一个片段的 (宽, 高)），参数集一致时为 None
+    """
+    parameter_sets = {probe_stream_params(segment)['video']['extradata_hash'] for segment in video_segments}
+    if len(parameter_sets) <= 1:
+        return None
+    first = media_info(video_segments[0]).video
+    return first['width'], first['height']
+
+
+def merge_bytes_saved(video_segments):
+    """
+    一次完成拼接和添加音频所节省的中间 I/O：合并后的中间视频（约等于所有片段的大小）的一次写入和一次读取
+    
+    Returns:
+        int: 字节数，只有一个片段时（原本也不需要合并）为 0
+    """
+    if len(video_segments) < 2:
+        return 0
+    return 2 * sum(Path(segment).stat().st_size for segment in video_segments)
+
+
+def mux_segments(video_segments, audio_path, output_path, profile=None, copy_audio=False, list_dir=None):
+    """
+    拼接视频片段并添加音频（一次 ffmpeg 调用）：视频流复制，片段的参数集（SPS/PPS）不一致时重新编码拼接
+    
+    Args:
+        video_segments: 视频片段路径列表
+        audio_path: 音频文件路径
+        output_path: 输出视频路径
+        profile: 编码配置（名称或 EncoderProfile），决定音频码率，默认 balanced
+        copy_audio: 音频已是 AAC 时直接流复制
+        list_dir: 片段列表文件的存放目录（可选），默认为输出目录；通常为中间文件目录，避免写入输出存储
+    
+    Returns:
+        Path: 输出视频路径
+    """
+    output_path = Path(output_path)
+    size = mux_reencode_size(video_segments)
+    if size is not None:
+        print(f"  片段的参数集（SPS/PPS）不一致，重新编码拼接 {len(video_segments)} 个片段")
+        with metrics.stage('mux_reencode', inputs=len(video_segments)), atomic_output(output_path) as tmp_path:
+            run_ffmpeg(build_mux_reencode_command(video_segments, audio_path, tmp_path, size, profile, copy_audio))
+        return output_path
+    
+    list_file = write_concat_list(video_segments, Path(list_dir or output_path.parent) / output_path.name)
+    try:
+        with metrics.stage('mux_segments', inputs=len(video_segments)), atomic_output(output_path) as tmp_path:
+            run_ffmpeg(build_mux_command(list_file, audio_path, tmp_path, profile, copy_audio))
+    finally:
+        list_file.unlink()
+    metrics.add('intermediate_bytes_saved', merge_bytes_saved(video_segments))
+    return output_path
+
+
+def render_single_pass(tasks, audio_path, output_path, threads=None, prepare_dir=None, profile=None,
+                       copy_audio=False):
+    """
+    单次 ffmpeg 调用完成渲染：所有图片作为输入，通过 filter_complex 逐张缩放/运镜后
+    用 concat 滤镜拼接，并直接映射音频，视频只编码一次、只写一次
+    
+    所有片段统一到同一分辨率：第一张图片带运镜效果时为运镜输出分辨率，
+    否则为第一张图片的尺寸（取偶数），其余图片等比缩放并居中填充。
+    
+    Args:
+        tasks: 片段任务列表，格式与 render_segments 相同（output_path 可省略）
+        audio_path: 音频文件路径
+        output_path: 输出视频路径
+        threads: 编码线程数（可选）
+        prepare_dir: 预处理图片目录（可选），提供时先用 prepare_image 预处理所有图片
+        profile: 编码配置（名称或 EncoderProfile），默认 balanced；指定了分辨率时所有片段统一到该分辨率
+        copy_audio: 音频已是 AAC 时直接流复制
+    
+    Returns:
+        Path: 输出视频路径
+    """
+    output_path = Path(output_path)
+    profile = get_profile(profile)
+    fps = profile.fps or EFFECT_FPS
+    
+    if prepare_dir is not None:
+        prepared_tasks = []
+        for task in tasks:
+            effect = task.get('camera_effect')
+            if not has_camera_effect(effect, task['duration'], task.get('effect_duration', 1.5)):
+                effect = None
+            prepared_tasks.append(dict(
+                task, image_path=prepare_image(task['image_path'], prepare_dir, effect, profile=profile)
+            ))
+        tasks = prepared_tasks
+    
+    first = tasks[0]
+    if profile.size:
+        width, height = profile.size
+    elif has_camera_effect(first.get('camera_effect'), first['duration'], first.get('effect_duration', 1.5)):
+        width, height = EFFECT_SIZE
+    else:
+        width, height = get_image_size(first['image_path'])
+        width, height = width // 2 * 2, height // 2 * 2
+    
+    inputs = []
+    filters = []
+    for i, task in enumerate(tasks):
+        duration = task['duration']
+        camera_effect = task.get('camera_effect')
+        effect_duration = task.get('effect_duration', 1.5)
+        
+        if has_camera_effect(camera_effect, duration, effect_duration):
+            # zoompan 由单帧输入生成全部输出帧，不需要循环输入
+            inputs += ['-i', str(task['image_path'])]
+        else:
+            inputs += ['-loop', '1', '-framerate', str(fps), '-t', str(duration),
+                       '-i', str(task['image_path'])]
+        
+        video_filter = build_video_filter(duration, camera_effect, effect_duration, profile)
+        filters.append(
+            f"[{i}:v]{video_filter},"
+            f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+            f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,fps={fps},"
+            f"trim=duration={duration},setpts=PTS-STARTPTS,format=yuv420p[v{i}]"
+        )
+    
+    labels = ''.join(f"[v{i}]" for i in range(len(tasks)))
+    filters.append(f"{labels}concat=n={len(tasks)}:v=1:a=0[v]")
+    
+    cmd = ['ffmpeg'] + inputs + [
+        '-i', str(audio_path),
+        '-filter_complex', ';'.join(filters),
+        '-map', '[v]',
+        '-map', f"{len(tasks)}:a",
+    ]
+    cmd += _video_codec_args(threads, profile)
+    cmd += _audio_codec_args(profile, copy_audio)
+    cmd += [
+        '-shortest',
+        '-y',
+    ]
     
-    subprocess.run(cmd, check=True, capture_output=True, text=True)
+    with metrics.stage('render_single_pass', inputs=len(tasks)), atomic_output(output_path) as tmp_path:
+        run_ffmpeg(cmd + [str(tmp_path)])
     return output_path
 
 
-def create_video(text_file, image_files, output_video, tts_service, temp_dir=None, audio_file=None, keep_audio=False, camera_effect=None, effect_duration=1.5):
+# 旁白中的换片标记：单独一行的 ---（三个或更多短横线），标记之间的旁白对应一张图片
+SLIDE_BREAK = re.compile(r'^[ \t]*-{3,}[ \t]*$', re.MULTILINE)
+
+
+def split_sections(text, num_images):
+    """
+    按换片标记将旁白拆分为与图片一一对应的段落
+    
+    Args:
+        text: 旁白文本
+        num_images: 图片数量
+    
+    Returns:
+        List[str]: 各图片对应的旁白，旁白中没有换片标记时返回 None
+    """
+    if not SLIDE_BREAK.search(text):
+        return None
+    sections = [section.strip() for section in SLIDE_BREAK.split(text)]
+    if len(sections) != num_images:
+        raise ValueError(f"旁白按换片标记分为 {len(sections)} 段，与图片数量 {num_images} 不一致")
+    for i, section in enumerate(sections, 1):
+        if not section:
+            raise ValueError(f"第 {i} 段旁白为空（两个换片标记之间没有文本）")
+    return sections
+
+
+def section_part_paths(output_path, count):
+    """分段合成时各段语音的临时文件路径"""
+    output_path = Path(output_path)
+    return [output_path.with_name(f"{output_path.stem}.section{i:03d}.mp3") for i in range(1, count + 1)]
+
+
+def synthesize_sections(tts_service, sections, output_path, audio_bitrate=None):
+    """
+    逐段合成旁白并按顺序拼接为一个音频文件，各段时长直接取自 TTS 结果，不调用 ffprobe
+    
+    Args:
+        tts_service: TTS 服务实例
+        sections: 各图片对应的旁白
+        output_path: 拼接后的音频路径
+        audio_bitrate: AAC 码率（可选），指定时输出 AAC（.m4a），否则流复制拼接 MP3
+    
+    Returns:
+        List[float]: 各段语音的时长（秒）
+    """
+    output_path = Path(output_path)
+    part_paths = section_part_paths(output_path, len(sections))
+    try:
+        results = tts_service.synthesize_many(list(zip(sections, part_paths)))
+        list_file = write_concat_list(part_paths, output_path)
+        try:
+            with metrics.stage('concat_sections', sections=len(sections)), atomic_output(output_path) as tmp_path:
+                run_ffmpeg(build_concat_command(list_file, tmp_path, audio_bitrate))
+        finally:
+            list_file.unlink()
+    finally:
+        for part_path in part_paths:
+            if part_path.exists():
+                part_path.unlink()
+    return [result.duration for result in results]
+
+
+def estimate_section_durations(tts_service, sections, audio_duration):
+    """已有的整段语音无法按段计时，按各段的估算时长比例分配总时长"""
+    hints = [tts_service.duration_hint(section) for section in sections]
+    scale = audio_duration / sum(hints)
+    return [hint * scale for hint in hints]
+
+
+def sections_key(tts_service, sections):
+    """分段合成的语音的指纹，由各段的缓存键组成"""
+    return make_key('tts_sections', *(tts_service.cache_key(section) for section in sections))
+
+
+def build_dependencies(output_video, text_file, image_files, text, tts_service, audio_file=None, camera_effect=None,
+                       effect_duration=1.5, engine='segments', profile=None, stream_audio=False, motion_engine='zoompan'):
+    """
+    计算视频输出的依赖清单和指纹：旁白、图片（和已有语音）的内容哈希 + 语音与渲染参数
+    
+    Returns:
+        tuple: (BuildManifest, 指纹)
+    """
+    inputs = [text_file] + list(image_files)
+    if audio_file and Path(audio_file).exists():
+        inputs.append(audio_file)
+    params = {
+        'tts': tts_service.cache_key(text),
+        'camera_effect': camera_effect,
+        'effect_duration': float(effect_duration),
+        'engine': engine,
+        'profile': get_profile(profile)._asdict(),
+        'stream_audio': bool(stream_audio),
+    }
+    if motion_engine != 'zoompan':
+        # 默认引擎不写入参数，升级前生成的依赖清单仍然有效
+        params['motion_engine'] = motion_engine
+    manifest = BuildManifest(output_video)
+    return manifest, manifest.fingerprint(inputs, params)
+
+
+def prune_intermediates(temp_dir, keep):
+    """增量生成完成后删除不再使用的中间文件（预处理图片、多余的片段、旧的语音），保留 keep 中的文件"""
+    keep = {Path(path) for path in keep if path is not None}
+    stale = list(temp_dir.glob('prepared_*.bmp')) + list(temp_dir.glob('segment_*.mp4')) + \
+        list(temp_dir.glob('audio_*.mp3')) + list(temp_dir.glob('audio_*.m4a'))
+    for path in stale:
+        if path not in keep and path.exists():
+            path.unlink()
+
+
+# 可选的渲染引擎
+ENGINES = ('segments', 'single_pass')
+
+
+def create_video(text_file, image_files, output_video, tts_service, temp_dir=None, audio_file=None, keep_audio=False, camera_effect=None, effect_duration=1.5, workers=1, engine='segments', segment_cache=None, executor=None, profile=None, resume=False, stream_audio=False, incremental=False, storage=None, motion_engine='zoompan'):
     """
     创建视频的主函数
     
+    已完成的阶段（语音、各图片片段）记录在临时目录的任务日志中，渲染中断后以 resume=True
+    重新运行时校验并复用这些中间文件，只重新执行未完成的阶段。
+    
     Args:
         text_file: 旁白文本文件路径
         image_files: 图片文件路径列表
         output_video: 输出视频路径
         tts_service: TTS 服务实例
-        temp_dir: 临时文件目录，默认为输出视频所在目录下的 temp 文件夹
+        temp_dir: 临时文件目录，默认由 storage 决定
         audio_file: 已有的语音文件路径（可选），如果提供则跳过TTS生成
         keep_audio: 是否保留生成的语音文件（默认False）
         camera_effect: 运镜效果类型 ('zoom_in', 'zoom_out', 'pan_right', 'pan_left', None)
         effect_duration: 运镜效果持续时间（秒），默认1.5秒
+        workers: 并行渲染图片片段的数量，默认1（串行）
+        engine: 渲染引擎，'segments'（逐片段编码 → 拼接片段并添加音频，默认）
+                或 'single_pass'（单次 ffmpeg 调用完成全部渲染）
+        segment_cache: 片段缓存 FileCache（可选），仅 segments 引擎使用
+        executor: 共享的片段渲染线程池（可选），批量渲染时多个视频共用，workers 为其大小；
+                  也可以是 farm.FarmExecutor，片段作为队列任务由各节点的 worker 渲染
+        profile: 编码配置（'draft'、'balanced'、'archive' 或 EncoderProfile），默认 balanced
+        resume: 是否从上次中断的位置继续（默认False，忽略之前的任务日志）
+        stream_audio: 流式合成语音（默认False）：TTS 响应流边接收边编码为 AAC，添加音频时直接流复制；
+                      需要 tts_service 提供 synthesize_stream，指定 audio_file 时不生效
+        incremental: 增量生成（默认False）：输出旁的 <输出>.deps.json 记录输入内容哈希和参数，均未变化时跳过；
+                     否则复用临时目录中未变化的语音和片段，完成后保留这些中间文件供下次使用
+        storage: 中间文件存储位置（未指定 temp_dir 时生效）：'output'（输出目录下的 temp 文件夹，默认）、
+                 'local'（本机临时目录）、'tmpfs'（/dev/shm）或目录路径，见 storage.intermediate_dir
+        motion_engine: 运镜引擎：'zoompan'（ffmpeg 滤镜，默认）或 'numpy'（NumPy 逐帧生成运镜部分，
+                       亚像素精度、缓动曲线、保持图片宽高比，支持自定义 Ken Burns 效果；需要安装 NumPy，仅 segments 引擎）
+    
+    旁白中单独一行的 --- 为换片标记：分段数必须与图片数量一致，各段分别合成后拼接，
+    每张图片的时长等于对应段落的语音时长；否则按总时长平均分配。
     
     Returns:
         Path: 输出视频路径
     """
+    if engine not in ENGINES:
+        raise ValueError(f"不支持的渲染引擎: {engine}，可选: {', '.join(ENGINES)}")
+    check_motion_engine(motion_engine, camera_effect, engine)
+    profile = get_profile(profile)
+    
     text_file = Path(text_file)
     image_files = [Path(img) for img in image_files]
     output_video = Path(output_video)
     
-    # 创建临时目录
-    if temp_dir is None:
-        temp_dir = output_video.parent / "temp"
-    else:
-        temp_dir = Path(temp_dir)
-    temp_dir.mkdir(parents=True, exist_ok=True)
-    
     # 读取旁白文本
     with open(text_file, 'r', encoding='utf-8') as f:
         text = f.read().strip()
@@ -252,11 +2125,39 @@ def create_video(text_file, image_files, output_video, tts_service, temp_dir=Non
     if not text:
         raise ValueError(f"文本文件为空: {text_file}")
     
+    manifest = None
+    if incremental:
+        manifest, fingerprint = build_dependencies(output_video, text_file, image_files, text, tts_service, audio_file,
+                                                   camera_effect, effect_duration, engine, profile, stream_audio,
+                                                   motion_engine)
+        if manifest.is_current(fingerprint):
+            print(f"⊙ 输入和参数均未变化，跳过生成: {output_video}")
+            metrics.add('outputs_up_to_date')
+            return output_video
+        print(f"增量生成: {'，'.join(manifest.changes())}")
+    
+    # 创建临时目录（增量生成时每个输出使用单独的目录，中间文件在两次生成之间保留）
+    if temp_dir is None:
+        temp_dir = intermediate_dir(output_video, storage, output_video.stem if incremental else None)
+    else:
+        temp_dir = Path(temp_dir)
+    temp_dir.mkdir(parents=True, exist_ok=True)
+    print(f"中间文件目录: {temp_dir}")
+    journal = JobJournal(temp_dir, resume=resume or incremental)
+    
+    # 旁白中有换片标记时逐段合成，每张图片的时长等于对应旁白的语音时长
+    sections = split_sections(text, len(image_files))
+    if sections is not None:
+        print(f"旁白按换片标记分为 {len(sections)} 段，图片时长与旁白对齐")
+    
     # 生成或使用现有语音
-    print(f"\n步骤 1/3: 处理语音文件")
+    print(f"\n步骤 1/{2 if engine == 'single_pass' else 3}: 处理语音文件")
     should_cleanup_audio = False  # 标记是否需要清理音频文件
+    copy_audio = False  # 语音已编码为 AAC 时添加音频不再重新编码
     
     # 检查是否提供了语音文件路径
+    audio_duration = None
+    section_durations = None
     if audio_file:
         audio_file = Path(audio_file)
         if audio_file.exists():
@@ -266,63 +2167,122 @@ def create_video(text_file, image_files, output_video, tts_service, temp_dir=Non
             print(f"语音文件不存在，生成到: {audio_file}")
             # 确保目录存在
             audio_file.parent.mkdir(parents=True, exist_ok=True)
-            tts_service.text_to_speech(text, audio_file)
-            audio_path = audio_file
+            with metrics.stage('tts', chars=len(text)):
+                if sections is not None:
+                    section_durations = synthesize_sections(tts_service, sections, audio_file)
+                    audio_path, audio_duration = audio_file, sum(section_durations)
+                else:
+                    tts_result = tts_service.synthesize(text, audio_file)
+                    audio_path, audio_duration = tts_result.path, tts_result.duration
     else:
-        # 没有指定 audio_file，使用默认临时路径
-        audio_path = temp_dir / "audio.mp3"
-        if audio_path.exists():
+        # 没有指定 audio_file，使用默认临时路径；文件名包含文本和语音参数的哈希，
+        # 旁白或语音参数变化后不会误用旧的语音文件
+        tts_key = tts_service.cache_key(text) if sections is None else sections_key(tts_service, sections)
+        if stream_audio:
+            # 流式合成的语音已按编码配置的码率编码为 AAC
+            tts_key = make_key('tts_stream', tts_key, profile.audio_bitrate)
+            copy_audio = True
+        audio_path = temp_dir / f"audio_{tts_key[:16]}{'.m4a' if stream_audio else '.mp3'}"
+        resumed = journal.completed('tts', tts_key, audio_path)
+        if resumed is not None:
+            print(f"✅ 恢复任务，复用已生成的语音文件: {audio_path}")
+            audio_duration = resumed.get('duration')
+            section_durations = resumed.get('section_durations')
+            should_cleanup_audio = True
+        elif audio_path.exists() and sections is None:
             print(f"✅ 发现已有语音文件，跳过生成: {audio_path}")
         else:
             print(f"生成新语音文件...")
-            tts_service.text_to_speech(text, audio_path)
+            with metrics.stage('tts', chars=len(text), stream=stream_audio):
+                if sections is not None:
+                    section_durations = synthesize_sections(tts_service, sections, audio_path,
+                                                            profile.audio_bitrate if stream_audio else None)
+                    audio_duration = sum(section_durations)
+                else:
+                    if stream_audio:
+                        tts_result = tts_service.synthesize_stream(text, audio_path, profile.audio_bitrate)
+                    else:
+                        tts_result = tts_service.synthesize(text, audio_path)
+                    audio_path, audio_duration = tts_result.path, tts_result.duration
             should_cleanup_audio = True
+            journal.record('tts', tts_key, audio_path, duration=audio_duration, section_durations=section_durations)
     
-    # 获取音频时长
-    audio_duration = get_audio_duration(audio_path)
+    # 获取音频时长（TTS 结果或任务日志已包含时长时不再调用 ffprobe）
+    if audio_duration is None:
+        audio_duration = get_audio_duration(audio_path)
     print(f"音频时长: {audio_duration:.2f} 秒")
     
-    # 计算每张图片的时长
+    # 计算每张图片的时长：分段合成时取各段语音时长，否则平均分配
     num_images = len(image_files)
-    duration_per_image = audio_duration / num_images
-    print(f"\n步骤 2/3: 生成 {num_images} 个图片视频片段（每个 {duration_per_image:.2f} 秒）")
+    if sections is not None and section_durations is None:
+        print("已有的语音文件无法按段计时，按各段旁白的估算时长比例分配")
+        section_durations = estimate_section_durations(tts_service, sections, audio_duration)
+    if section_durations is not None:
+        durations = list(section_durations)
+        timing = "时长与旁白分段对齐"
+    else:
+        durations = [audio_duration / num_images] * num_images
+        timing = f"每张 {durations[0]:.2f} 秒"
     
-    # 为每张图片生成视频片段
-    video_segments = []
+    # 为每张图片生成片段任务
+    tasks = []
     for i, image_file in enumerate(image_files, 1):
-        print(f"  处理图片 {i}/{num_images}: {image_file.name}")
-        segment_path = temp_dir / f"segment_{i:03d}.mp4"
-        # 只在第一张图片上应用运镜效果
-        effect = camera_effect if i == 1 else None
-        create_image_video(image_file, duration_per_image, segment_path, camera_effect=effect, effect_duration=effect_duration)
-        video_segments.append(segment_path)
-    
-    # 合并所有视频片段
-    print(f"\n步骤 3/3: 合并视频片段")
-    if len(video_segments) > 1:
-        merged_video = temp_dir / "merged_video.mp4"
-        merge_videos(video_segments, merged_video)
-    else:
-        merged_video = video_segments[0]
+        tasks.append({
+            'image_path': image_file,
+            'duration': durations[i - 1],
+            'output_path': temp_dir / f"segment_{i:03d}.mp4",
+            # 只在第一张图片上应用运镜效果
+            'camera_effect': camera_effect if i == 1 else None,
+            'effect_duration': effect_duration,
+            'prepare_dir': temp_dir,
+            'profile': profile,
+            'motion_engine': motion_engine,
+        })
     
-    # 添加音频
-    print(f"添加音频到视频")
-    add_audio_to_video(merged_video, audio_path, output_video)
+    video_segments = []
+    if engine == 'single_pass':
+        print(f"\n步骤 2/2: 单次渲染 {num_images} 张图片（{timing}）")
+        render_single_pass(tasks, audio_path, output_video, prepare_dir=temp_dir, profile=profile,
+                           copy_audio=copy_audio)
+    else:
+        print(f"\n步骤 2/3: 生成 {num_images} 个图片视频片段（{timing}）")
+        cache_before = segment_cache.stats() if segment_cache is not None else None
+        video_segments = render_segments(tasks, workers=workers, cache=segment_cache, executor=executor,
+                                         journal=journal)
+        if segment_cache is not None:
+            stats = segment_cache.stats()
+            print(f"  片段缓存: 命中 {stats['hits'] - cache_before['hits']}，"
+                  f"未命中 {stats['misses'] - cache_before['misses']}")
+        
+        # 拼接片段并添加音频（一次 ffmpeg 调用，不写出合并后的中间视频）
+        print(f"\n步骤 3/3: 拼接视频片段并添加音频")
+        mux_segments(video_segments, audio_path, output_video, profile=profile, copy_audio=copy_audio,
+                     list_dir=temp_dir)
     
     print(f"\n✅ 视频生成完成: {output_video}")
+    metrics.add('temp_dir_bytes', metrics.directory_size(temp_dir))
+    
+    if manifest is not None:
+        # 保留任务日志、语音和片段，下次只重新生成变化的部分
+        manifest.record(fingerprint)
+        prune_intermediates(temp_dir, list(video_segments) + [audio_path])
+        print(f"中间文件保留在 {temp_dir}，依赖清单: {manifest.path}")
+        return output_video
     
     # 清理临时文件
     print(f"清理临时文件...")
-    for segment in video_segments:
+    journal.remove()
+    # 包括之前中断的 segments 渲染留下的片段（例如改用 single_pass 后完成）
+    for segment in set(video_segments) | set(temp_dir.glob('segment_*.mp4')):
         if segment.exists():
             segment.unlink()
+    for prepared in temp_dir.glob('prepared_*.bmp'):
+        prepared.unlink()
     # 只清理我们生成的音频文件，保留已有的或用户要求保留的
     if should_cleanup_audio and not keep_audio and audio_path.exists():
         audio_path.unlink()
     elif keep_audio and audio_path.exists():
         print(f"✅ 语音文件已保留: {audio_path}")
-    if len(video_segments) > 1 and merged_video.exists():
-        merged_video.unlink()
     
     # 如果临时目录为空，删除它
     try: